@@ -0,0 +1,365 @@
+# aggregation_rewrite.py
+"""
+Aggregation Rewrite - Let GraphDB count and rank instead of the answer LLM
+"Combien ..." questions become COUNT queries and superlative questions
+("la plus élevée", "le plus de ...") keep only the top rows (ties included),
+so a few rows come back instead of every matching row
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+from typing import List, Optional, Set, Tuple
+from graph_scope import RDF_TYPE
+from sparql_ast import parse_query, iter_groups, Query, TriplePattern, GroupPattern, Optional_, SubSelect, Filter, Bind
+from sparql_tokenizer import tokenize, IRI, PNAME, NAME, VAR, SPARQLSyntaxError
+
+# Rewrites
+COUNT = "count"           # Combien de capteurs ... ?            -> COUNT(DISTINCT ?x)
+GROUPED_COUNT = "grouped_count"  # Combien de capteurs par cheval ? -> GROUP BY + COUNT
+TOP_VALUE = "top_value"   # Quel capteur a la fréquence la plus élevée ? -> FILTER(?v = MAX(?v))
+TOP_COUNT = "top_count"   # Quel cavalier a participé au plus d'événements ? -> GROUP BY + ORDER BY DESC(COUNT)
+
+Intent = namedtuple("Intent", ["kind", "descending", "limit", "grouped"])
+
+# Characters of the item list returned next to a count (names of the counted entities)
+ITEMS_MAX_LENGTH = 500
+
+XSD_NS = "http://www.w3.org/2001/XMLSchema#"
+
+_COUNT_RE = re.compile(r"\b(combien|nombre (de|d')|how many|number of)")
+# "par" groups only before a class noun ("par cheval", not "supervisés par le vétérinaire")
+_GROUPED_RE = re.compile(
+    r"\b(pour chaque|chaque|per|for each|by each)\b|\bpar (type|categorie|race|"
+    r"chevaux|cheval|cavaliers?|capteurs?|evenements?|entrainements?|saisons?|veterinaires?|soigneurs?|competitions?)\b"
+)
+_TOP_COUNT_RE = re.compile(
+    r"\b(le|la|les|au|du) (plus|moins) (grand |petit )?(nombre )?(de |d')|\bthe (most|fewest|least) \w"
+)
+_TOP_VALUE_RE = re.compile(
+    r"\b(le|la|les) (plus|moins) \w+|\b(maximum|maximale?|minimum|minimale?|meilleure?s?|pire|"
+    r"highest|largest|biggest|longest|latest|best|lowest|smallest|shortest|earliest|oldest|worst)\b"
+)
+_ASCENDING_WORDS = {
+    "bas", "basse", "petit", "petite", "petits", "petites", "faible", "faibles", "court", "courte",
+    "ancien", "ancienne", "minimum", "minimal", "minimale", "pire",
+    "lowest", "smallest", "shortest", "earliest", "oldest", "worst", "fewest", "least"
+}
+_LIMIT_RE = re.compile(
+    r"\btop (\d+)|\bles (\d+)\b|\b(\d+) (premiers|premieres|meilleurs|meilleures|first|best)\b"
+)
+# Words naming a property whose local name they do not contain ("taille" -> hasHeight)
+_PROPERTY_WORDS = {
+    "height": ("taille", "hauteur", "grand", "grande", "grands", "grandes", "tall", "tallest"),
+    "weight": ("poids", "lourd", "lourde", "leger", "legere", "heavy", "heaviest", "lightest"),
+    "sensortime": ("frequence", "echantillonnage", "frequency"),
+    "frequency": ("frequence", "frequent"),
+    "intensity": ("intensite", "intense"),
+    "volume": ("volume", "duree", "long", "longue", "court", "courte", "longest", "shortest"),
+    "date": ("date", "recent", "recente", "ancien", "ancienne", "dernier", "derniere", "premier", "premiere",
+             "latest", "earliest"),
+    "timestamp": ("date", "heure", "recent", "recente", "dernier", "derniere", "latest", "earliest"),
+    "filesize": ("taille", "volumineux", "volumineuse", "size"),
+    "rank": ("rang", "classement", "classe", "meilleur", "meilleure", "pire", "best", "worst"),
+}
+_SINGULAR_RE = re.compile(r"^\s*(quel|quelle|qui|lequel|laquelle|which|what|who)\b")
+
+
+def _fold(text: str) -> str:
+    """Lowercase without accents, apostrophes normalized"""
+    text = unicodedata.normalize("NFKD", text.lower().replace("’", "'"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def detect_intent(question: str) -> Optional[Intent]:
+    """
+    Aggregation asked for by a question
+
+    Args:
+        question: Question in natural language (French or English)
+
+    Returns:
+        Intent(kind, descending, limit, grouped), or None for a plain lookup
+    """
+    text = _fold(question)
+
+    limit = None
+    match = _LIMIT_RE.search(text)
+    if match:
+        limit = int(next(group for group in match.groups() if group and group.isdigit()))
+    elif _SINGULAR_RE.match(text):
+        limit = 1
+
+    match = _TOP_COUNT_RE.search(text)
+    if match:
+        fewest = match.group(2) == "moins" or match.group(3) == "petit " or match.group(6) in ("fewest", "least")
+        descending = not fewest
+        return Intent(TOP_COUNT, descending, limit, True)
+
+    if _COUNT_RE.search(text):
+        return Intent(COUNT, True, None, bool(_GROUPED_RE.search(text)))
+
+    match = _TOP_VALUE_RE.search(text)
+    if match:
+        words = match.group(0).split()
+        descending = words[-1] not in _ASCENDING_WORDS
+        if words[0] in ("le", "la", "les") and words[1] == "moins":
+            descending = not descending
+        return Intent(TOP_VALUE, descending, limit, False)
+    return None
+
+
+class _Shape:
+    """Where each variable of a query occurs"""
+
+    def __init__(self, query: Query):
+        self.triples: List[TriplePattern] = []
+        for group in iter_groups(query.where):
+            self.triples.extend(group.triples())
+
+        self.typed: Set[str] = set()     # ?x a ...
+        self.subjects: Set[str] = set()  # ?x p ...
+        self.pinned: Set[str] = set()    # ?x p <constant> (e.g. hasName "Dakota"): a single entity
+        for pattern in self.triples:
+            if pattern.subject[0].kind == VAR:
+                name = pattern.subject[0].value[1:]
+                self.subjects.add(name)
+                if _is_type(pattern):
+                    self.typed.add(name)
+                elif pattern.object[0].kind != VAR:
+                    self.pinned.add(name)
+
+    def is_entity(self, name: str) -> bool:
+        return name in self.subjects
+
+    def value_predicates(self, name: str) -> List[str]:
+        """Local names of the predicates whose object is ?name"""
+        return [
+            _local_name(pattern.predicate[0].value)
+            for pattern in self.triples
+            if len(pattern.object) == 1 and pattern.object[0].kind == VAR
+            and pattern.object[0].value[1:] == name and not pattern.is_path
+            and pattern.predicate[0].kind in (IRI, PNAME)
+        ]
+
+
+def _is_type(pattern: TriplePattern) -> bool:
+    predicate = pattern.predicate
+    if len(predicate) != 1:
+        return False
+    token = predicate[0]
+    return (token.kind == NAME and token.value == "a") or token.value in ("rdf:type", f"<{RDF_TYPE}>")
+
+
+def _local_name(value: str) -> str:
+    return re.split(r"[#/:]", value.strip("<>"))[-1]
+
+
+def _projected(query: Query) -> Optional[List[str]]:
+    """Projected variable names, or None if the query already aggregates"""
+    names = []
+    for item in query.projection:
+        if len(item) != 1:
+            return None
+        names.append(item[0].value[1:])
+    return names
+
+
+def _fresh(query: Query, base: str) -> str:
+    taken = query.where.variables() | query.projected_variables()
+    name, n = base, 1
+    while name in taken:
+        n += 1
+        name = f"{base}{n}"
+    return name
+
+
+def _mentioned(question: str, predicate: str) -> bool:
+    """Does the question name the property (word stems vs camelCase local name, or a known synonym)"""
+    local = _fold(predicate)
+    words = re.findall(r"\w+", _fold(question))
+    if any(len(word) >= 4 and word[:5] in local for word in words):
+        return True
+    return any(key in local and any(word in synonyms for word in words) for key, synonyms in _PROPERTY_WORDS.items())
+
+
+def _counted_variable(shape: _Shape, projected: List[str], grouped: bool) -> Optional[str]:
+    """
+    Variable whose distinct values are counted: a typed entity that is not
+    pinned to a constant, the first one projected (the last one when
+    counting per group, keys usually come first)
+    """
+    order = list(reversed(projected)) if grouped else projected
+    for candidates in (
+        [name for name in order if name in shape.typed and name not in shape.pinned],
+        [name for name in order if shape.is_entity(name) and name not in shape.pinned],
+        [name for name in order if shape.is_entity(name)]
+    ):
+        if candidates:
+            return candidates[0]
+    return None
+
+
+def push_down_aggregation(question: str, sparql_query: str) -> Tuple[str, Optional[str]]:
+    """
+    Rewrite a row-fetching query into the aggregate the question asks for
+
+    Args:
+        question: Question the query answers
+        sparql_query: Generated SPARQL query
+
+    Returns:
+        (query, rewrite) where rewrite is COUNT, GROUPED_COUNT, TOP_VALUE,
+        TOP_COUNT or None when the query is returned unchanged (no
+        aggregation intent, already aggregated, or ambiguous variables)
+    """
+    intent = detect_intent(question)
+    if intent is None:
+        return sparql_query, None
+    try:
+        query = parse_query(sparql_query)
+    except SPARQLSyntaxError:
+        return sparql_query, None
+
+    projected = _projected(query)
+    if query.form != "SELECT" or query.star or projected is None or query.group_by or query.having:
+        return sparql_query, None
+    shape = _Shape(query)
+
+    if intent.kind == COUNT:
+        rewrite = _rewrite_count(query, shape, projected, intent)
+    elif intent.kind == TOP_COUNT:
+        rewrite = _rewrite_top_count(query, shape, projected, intent)
+    else:
+        rewrite = _rewrite_top_value(query, shape, projected, intent, question)
+
+    if rewrite is None:
+        return sparql_query, None
+    return query.to_string(), rewrite
+
+
+def _order(query: Query, descending: bool, name: str):
+    query.order_by = tokenize(f"{'DESC' if descending else 'ASC'}(?{name})")
+
+
+def _renamed_copy(query: Query, suffix: str) -> Query:
+    """Unmodified copy of a query (no prologue or solution modifiers) whose variables end with _suffix"""
+    text = query.to_string()
+    parts, position = [], 0
+    for token in tokenize(text):
+        if token.kind == VAR:
+            parts.append(text[position:token.start] + f"{token.value}_{suffix}")
+            position = token.start + len(token.value)
+    copy = parse_query("".join(parts) + text[position:])
+    copy.prefixes, copy.base = [], ""
+    copy.modifier, copy.order_by, copy.limit, copy.offset = None, [], None, None
+    return copy
+
+
+def _rank_key(name: str) -> str:
+    """
+    Expression ranking the values of ?name by number: typed numbers and
+    dates as they are, the number of a string ("250Hz", "45min") cast to
+    decimal; other strings ("Élevée") get no key and are never ranked
+    """
+    return (
+        f"IF(isNumeric(?{name}) || DATATYPE(?{name}) IN (<{XSD_NS}date>, <{XSD_NS}dateTime>), ?{name}, "
+        f'<{XSD_NS}decimal>(REPLACE(STR(?{name}), "[^0-9.]", "")))'
+    )
+
+
+def _rewrite_count(query: Query, shape: _Shape, projected: List[str], intent: Intent) -> Optional[str]:
+    counted = _counted_variable(shape, projected, intent.grouped)
+    if counted is None:
+        return None  # Only literal values projected: the number may be stored as is
+    count = _fresh(query, "count")
+    keys = [name for name in projected if name != counted and shape.is_entity(name)] if intent.grouped else []
+    if intent.grouped and not keys:
+        return None  # Grouping asked for but no key to group by: leave the rows as they are
+
+    if keys:
+        query.projection = [tuple(tokenize(f"?{name}")) for name in keys]
+        query.projection.append(tuple(tokenize(f"(COUNT(DISTINCT ?{counted}) AS ?{count})")))
+        query.group_by = tokenize(" ".join(f"?{name}" for name in keys))
+        _order(query, True, count)
+        rewrite = GROUPED_COUNT
+    else:
+        items = _fresh(query, "items")
+        query.projection = [
+            tuple(tokenize(f"(COUNT(DISTINCT ?{counted}) AS ?{count})")),
+            tuple(tokenize(
+                f'(SUBSTR(GROUP_CONCAT(DISTINCT REPLACE(STR(?{counted}), "^.*[#/]", ""); separator=", "), '
+                f'1, {ITEMS_MAX_LENGTH}) AS ?{items})'
+            ))
+        ]
+        query.order_by = []
+        rewrite = COUNT
+    query.modifier = None
+    query.limit = None
+    query.offset = None
+    return rewrite
+
+
+def _rewrite_top_count(query: Query, shape: _Shape, projected: List[str], intent: Intent) -> Optional[str]:
+    if len(projected) != 2 or query.order_by:
+        return None
+    key, counted = projected
+    if not shape.is_entity(key):
+        return None
+    count = _fresh(query, "count")
+    query.projection = [
+        tuple(tokenize(f"?{key}")),
+        tuple(tokenize(f"(COUNT(DISTINCT ?{counted}) AS ?{count})"))
+    ]
+    query.group_by = tokenize(f"?{key}")
+    query.modifier = None
+    _order(query, intent.descending, count)
+    query.limit = intent.limit
+    query.offset = None
+    return TOP_COUNT
+
+
+def _rewrite_top_value(
+    query: Query,
+    shape: _Shape,
+    projected: List[str],
+    intent: Intent,
+    question: str
+) -> Optional[str]:
+    if query.order_by:
+        return None
+    values = [name for name in projected if not shape.is_entity(name) and shape.value_predicates(name)]
+    # Only rank a value the question names ("le plus âgé" never ranks hasName)
+    values = [name for name in values if any(_mentioned(question, p) for p in shape.value_predicates(name))]
+    if len(values) != 1:
+        return None  # No candidate, or cannot tell which value is ranked
+    value = values[0]
+
+    descending = intent.descending
+    if any("rank" in predicate.lower() for predicate in shape.value_predicates(value)) and re.search(
+        r"\b(meilleure?s?|best|pire|worst)\b", _fold(question)
+    ):
+        descending = not descending  # Best rank = smallest number
+    key = _rank_key(value)
+
+    if intent.limit is not None and intent.limit > 1:
+        # "top 3": the first rows by key (ties at the cut are dropped)
+        query.order_by = tokenize(f"{'DESC' if descending else 'ASC'}({key})")
+        query.limit = intent.limit
+        query.offset = None
+        return TOP_VALUE
+
+    # Keep every row holding the best key, not one of them. The best key is
+    # computed over a copy of the pattern with its own variables (no
+    # correlation with the outer rows) and only over values that have a
+    # key; when none has one (only words such as "Élevée"), ?best stays
+    # unbound and every row is kept, as before the rewrite
+    best = _fresh(query, "best")
+    ranked = _renamed_copy(query, best)
+    ranked_key = _fresh(ranked, "key")
+    ranked.where.elements.append(Bind(tokenize(f"({_rank_key(value + '_' + best)} AS ?{ranked_key})")))
+    ranked.where.elements.append(Filter(tokenize(f"(BOUND(?{ranked_key}))")))
+    ranked.projection = [tuple(tokenize(f"({'MAX' if descending else 'MIN'}(?{ranked_key}) AS ?{best})"))]
+    query.where.elements.append(Optional_(GroupPattern([GroupPattern([SubSelect(ranked)])])))
+    query.where.elements.append(Filter(tokenize(f"(!BOUND(?{best}) || {key} = ?{best})")))
+    return TOP_VALUE
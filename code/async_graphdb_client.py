@@ -0,0 +1,128 @@
+# async_graphdb_client.py
+"""
+Async GraphDB Client - asyncio counterpart of GraphDBClient
+Runs the sync client's queries in worker threads, so awaiting code keeps
+many SPARQL requests in flight with the same replica failover, result
+cache, result formats and slow-query log
+"""
+
+import asyncio
+from typing import Dict, Any, List, Optional
+from config import GRAPHDB_MAX_CONCURRENCY
+from resilience import BackendUnavailableError
+
+
+class AsyncGraphDBClient:
+    """Asyncio client for executing SPARQL queries on GraphDB"""
+
+    def __init__(self, client=None, max_concurrency: int = GRAPHDB_MAX_CONCURRENCY):
+        """
+        Initialize async GraphDB client
+
+        Args:
+            client: GraphDBClient (or compatible) running the queries
+                (default: get_graphdb_client())
+            max_concurrency: Maximum number of queries in flight at once
+        """
+        if client is None:
+            from graphdb_client import get_graphdb_client
+            client = get_graphdb_client()
+
+        self.client = client
+        self.endpoint = client.endpoint
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def query(self, sparql_query: str) -> Dict[str, Any]:
+        """
+        Execute a SPARQL query on GraphDB
+
+        Waits for one of the max_concurrency slots, then runs
+        GraphDBClient.query in a worker thread.
+
+        Args:
+            sparql_query: SPARQL query string
+
+        Returns:
+            Dictionary with query results (GraphDBClient.query shape)
+
+        Raises:
+            BackendUnavailableError: GraphDB unreachable or circuit open
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.to_thread(self.client.query, sparql_query)
+
+    async def query_many(self, sparql_queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Execute several SPARQL queries concurrently
+
+        At most max_concurrency queries are in flight at the same time.
+
+        Args:
+            sparql_queries: List of SPARQL query strings
+
+        Returns:
+            List of result dictionaries, in the same order as the queries
+        """
+        return await asyncio.gather(
+            *(self.query(sparql_query) for sparql_query in sparql_queries)
+        )
+
+    async def test_connection(self) -> bool:
+        """Test connection to GraphDB"""
+        try:
+            result = await self.query("SELECT (COUNT(*) as ?count) WHERE { ?s ?p ?o }")
+        except BackendUnavailableError:
+            result = {}
+        bindings = result.get('results', {}).get('bindings', [])
+        if bindings:
+            print(" Connexion à GraphDB réussie!")
+            print(f"{bindings[0]['count']['value']} triplets trouvés dans le graphe")
+            return True
+
+        print("Impossible de se connecter à GraphDB")
+        return False
+
+    async def close(self):
+        """Close the pooled connections of the sync client"""
+        await asyncio.to_thread(self.client.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+def run_queries(
+    sparql_queries: List[str],
+    client=None,
+    max_concurrency: int = GRAPHDB_MAX_CONCURRENCY
+) -> List[Dict[str, Any]]:
+    """
+    Run a batch of SPARQL queries concurrently from synchronous code
+
+    Args:
+        sparql_queries: List of SPARQL query strings
+        client: GraphDBClient (or compatible) running the queries
+        max_concurrency: Maximum number of queries in flight at once
+
+    Returns:
+        List of result dictionaries, in the same order as the queries
+    """
+    async def _run():
+        return await AsyncGraphDBClient(client, max_concurrency).query_many(sparql_queries)
+
+    return asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    print("Test de connexion asynchrone à GraphDB...")
+
+    async def _main():
+        async with AsyncGraphDBClient() as client:
+            await client.test_connection()
+
+    asyncio.run(_main())
@@ -0,0 +1,309 @@
+# async_llm_client.py
+"""
+Async LLM Client - asyncio counterpart of LLMClient / SPARQLLLMClient / AnswerLLMClient
+Keeps many completions in flight while a semaphore per endpoint keeps them
+within the server's parallel slots
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Dict, List, Optional
+from config import (
+    LOCAL_LLM_ENDPOINT,
+    LOCAL_LLM_MODEL,
+    SPARQL_LLM_MODEL,
+    ANSWER_LLM_MODEL,
+    LLM_TEMPERATURE,
+    LLM_MAX_TOKENS,
+    REQUEST_TIMEOUT,
+    CONNECT_TIMEOUT,
+    LLM_POOL_MAXSIZE,
+    LLM_MAX_CONCURRENCY
+)
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+from resilience import async_call_with_retries, BackendUnavailableError, TransientError
+from llm_client import SPARQL_SYSTEM_PROMPT, ANSWER_SYSTEM_PROMPT
+from completion_cache import get_completion_cache
+
+# Event loop -> endpoint -> semaphore (asyncio primitives belong to one loop)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+_semaphores_lock = threading.Lock()
+
+
+def get_endpoint_semaphore(endpoint: str, max_concurrency: int = LLM_MAX_CONCURRENCY) -> asyncio.Semaphore:
+    """
+    Semaphore limiting the completions in flight on an endpoint
+
+    Every async client of the endpoint running in the current event loop
+    shares it; the first one to ask sets its size.
+
+    Args:
+        endpoint: API endpoint URL
+        max_concurrency: Parallel slots of the server
+
+    Returns:
+        asyncio.Semaphore of the endpoint for the running loop
+    """
+    loop = asyncio.get_running_loop()
+    with _semaphores_lock:
+        per_endpoint = _semaphores.setdefault(loop, {})
+        semaphore = per_endpoint.get(endpoint)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, max_concurrency))
+            per_endpoint[endpoint] = semaphore
+        return semaphore
+
+
+class AsyncLLMClient:
+    """Asyncio client for making requests to language models"""
+
+    def __init__(
+        self,
+        endpoint: str = LOCAL_LLM_ENDPOINT,
+        model: str = LOCAL_LLM_MODEL,
+        temperature: float = LLM_TEMPERATURE,
+        max_tokens: int = LLM_MAX_TOKENS,
+        max_concurrency: int = LLM_MAX_CONCURRENCY
+    ):
+        """
+        Initialize async LLM client
+
+        Args:
+            endpoint: API endpoint URL
+            model: Model name
+            temperature: Sampling temperature (0.0-1.0)
+            max_tokens: Maximum tokens to generate
+            max_concurrency: Completions in flight on the endpoint (its parallel slots)
+        """
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError(
+                "async_llm_client requires aiohttp. "
+                "Install with: pip install aiohttp"
+            )
+
+        self.endpoint = endpoint
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self.cache = get_completion_cache()
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        """Create the pooled session lazily, inside the running event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=LLM_POOL_MAXSIZE,
+                limit_per_host=LLM_POOL_MAXSIZE
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+            )
+        return self._session
+
+    async def generate(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Generate text from prompt
+
+        Waits for a free slot of the endpoint; the slot is released between
+        retries, so a backoff never keeps the server idle.
+
+        Args:
+            prompt: User prompt
+            system_prompt: Optional system prompt
+            temperature: Override default temperature
+            max_tokens: Override default max_tokens
+
+        Returns:
+            Generated text
+
+        Raises:
+            BackendUnavailableError: LLM server unreachable or circuit open
+        """
+        session = await self._get_session()
+        semaphore = get_endpoint_semaphore(self.endpoint, self.max_concurrency)
+
+        # Build messages
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature if temperature is not None else self.temperature,
+            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
+            "stream": False
+        }
+        if self.cache is not None:
+            cached = self.cache.get(payload)
+            if cached is not None:
+                return cached
+
+        async def _send():
+            async with semaphore:
+                async with session.post(f"{self.endpoint}/chat/completions", json=payload) as response:
+                    if response.status >= 500 or response.status == 429:
+                        raise TransientError(f"HTTP {response.status}")
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+        # Same circuit breaker and retry budget as the sync client
+        try:
+            result = await async_call_with_retries(
+                self.endpoint,
+                _send,
+                retryable=(aiohttp.ClientConnectionError, asyncio.TimeoutError, TransientError),
+                slow=(asyncio.TimeoutError,)
+            )
+            content = result["choices"][0]["message"]["content"]
+        except BackendUnavailableError:
+            raise
+        except asyncio.TimeoutError:
+            raise Exception("LLM request timed out after retries")
+        except (aiohttp.ClientError, ValueError, KeyError, IndexError, TypeError) as e:
+            raise Exception(f"LLM request failed: {str(e)}")
+
+        if self.cache is not None:
+            self.cache.put(payload, content)
+        return content
+
+    async def generate_many(
+        self,
+        prompts: List[str],
+        system_prompt: str = "",
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> List[str]:
+        """
+        Generate completions for several prompts concurrently
+
+        At most max_concurrency completions run on the endpoint at once.
+
+        Args:
+            prompts: User prompts
+            system_prompt: Optional system prompt (same for every prompt)
+            temperature: Override default temperature
+            max_tokens: Override default max_tokens
+
+        Returns:
+            Generated texts, in the same order as the prompts
+        """
+        return await asyncio.gather(
+            *(self.generate(prompt, system_prompt, temperature, max_tokens) for prompt in prompts)
+        )
+
+    async def close(self):
+        """Close the pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class AsyncSPARQLLLMClient(AsyncLLMClient):
+    """Async counterpart of SPARQLLLMClient (temperature 0, SPARQL system prompt)"""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        """Initialize async SPARQL generation LLM"""
+        super().__init__(
+            endpoint=LOCAL_LLM_ENDPOINT,
+            model=SPARQL_LLM_MODEL or LOCAL_LLM_MODEL,
+            temperature=0.0,
+            max_tokens=1500,
+            max_concurrency=max_concurrency
+        )
+
+    async def generate(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Generate SPARQL query (same defaults as SPARQLLLMClient.generate)"""
+        if temperature is None:
+            temperature = 0.0
+        return await super().generate(prompt, system_prompt or SPARQL_SYSTEM_PROMPT, temperature, max_tokens)
+
+
+class AsyncAnswerLLMClient(AsyncLLMClient):
+    """Async counterpart of AnswerLLMClient (temperature 0.3, French system prompt)"""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        """Initialize async answer generation LLM"""
+        super().__init__(
+            endpoint=LOCAL_LLM_ENDPOINT,
+            model=ANSWER_LLM_MODEL or LOCAL_LLM_MODEL,
+            temperature=0.3,
+            max_tokens=2000,
+            max_concurrency=max_concurrency
+        )
+
+    async def generate(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Generate natural language answer in French (same defaults as AnswerLLMClient.generate)"""
+        if temperature is None:
+            temperature = 0.3
+        return await super().generate(prompt, system_prompt or ANSWER_SYSTEM_PROMPT, temperature, max_tokens)
+
+
+def run_completions(
+    prompts: List[str],
+    client_class=AsyncLLMClient,
+    system_prompt: str = ""
+) -> List[str]:
+    """
+    Run a batch of completions concurrently from synchronous code
+
+    Args:
+        prompts: User prompts
+        client_class: AsyncLLMClient, AsyncSPARQLLLMClient or AsyncAnswerLLMClient
+        system_prompt: Optional system prompt (client default if empty)
+
+    Returns:
+        Generated texts, in the same order as the prompts
+    """
+    async def _run():
+        async with client_class() as client:
+            return await client.generate_many(prompts, system_prompt)
+
+    return asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    import time
+
+    prompts = [f"Donne un nom de cheval commençant par la lettre {letter}." for letter in "ABCDEFGH"]
+    print(f"{len(prompts)} complétions, au plus {LLM_MAX_CONCURRENCY} en parallèle sur {LOCAL_LLM_ENDPOINT}...")
+    start = time.monotonic()
+    try:
+        for prompt, answer in zip(prompts, run_completions(prompts, AsyncAnswerLLMClient)):
+            print(f"- {prompt} -> {answer.strip()[:80]}")
+        print(f"Terminé en {time.monotonic() - start:.1f}s")
+    except Exception as e:
+        print(f"Erreur LLM: {e}")
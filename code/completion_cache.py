@@ -0,0 +1,221 @@
+# completion_cache.py
+"""
+Completion Cache - Persistent cache of deterministic LLM completions
+Keys hash the model, messages, temperature and max_tokens of a chat request;
+entries live in a local SQLite file, evicted least recently used once the
+entry count or the total completion size exceeds its bound
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from config import (
+    ENABLE_COMPLETION_CACHE,
+    COMPLETION_CACHE_PATH,
+    COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_MAX_MB,
+    COMPLETION_CACHE_ANY_TEMPERATURE
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    completion TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used);
+"""
+
+# Keep the most recently used rows within both bounds, drop the rest
+_EVICT = """
+DELETE FROM completions WHERE key IN (
+    SELECT key FROM (
+        SELECT key,
+               ROW_NUMBER() OVER (ORDER BY last_used DESC) AS rank,
+               SUM(size) OVER (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING) AS kept
+        FROM completions
+    )
+    WHERE rank > ? OR kept > ?
+)
+"""
+
+
+def completion_key(payload: Dict[str, Any]) -> str:
+    """
+    Cache key of a chat completion request
+
+    Args:
+        payload: /chat/completions request body
+
+    Returns:
+        SHA-256 of its model, messages, temperature and max_tokens
+    """
+    fields = [payload.get("model"), payload.get("messages"), payload.get("temperature"), payload.get("max_tokens")]
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """SQLite-backed LRU cache of LLM completions, shared across runs"""
+
+    def __init__(
+        self,
+        path: str = COMPLETION_CACHE_PATH,
+        max_entries: int = COMPLETION_CACHE_MAX_ENTRIES,
+        max_mb: float = COMPLETION_CACHE_MAX_MB,
+        any_temperature: bool = COMPLETION_CACHE_ANY_TEMPERATURE
+    ):
+        """
+        Open (or create) the cache file
+
+        Args:
+            path: SQLite database file (":memory:" for a process-local cache)
+            max_entries: Maximum number of completions kept
+            max_mb: Maximum total size of the kept completions, in MB
+            any_temperature: Also cache sampled (temperature > 0) calls
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.any_temperature = any_temperature
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        try:
+            if path != ":memory:":
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")  # Chatbot and evaluation may share the file
+            self._conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            print(f"Cache des complétions désactivé ({path}): {e}")
+            self._conn = None
+
+    def cacheable(self, payload: Dict[str, Any]) -> bool:
+        """Whether a request is deterministic enough to be served from the cache"""
+        if self._conn is None or payload.get("stream"):
+            return False
+        return self.any_temperature or not payload.get("temperature")
+
+    def get(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Look up a request
+
+        Args:
+            payload: /chat/completions request body
+
+        Returns:
+            Cached completion, or None (miss or request not cacheable)
+        """
+        if not self.cacheable(payload):
+            return None
+        key = completion_key(payload)
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT completion FROM completions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error:
+                self.errors += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, payload: Dict[str, Any], completion: str):
+        """
+        Store the completion of a cacheable request
+
+        Args:
+            payload: /chat/completions request body
+            completion: Generated text
+        """
+        if not completion or not self.cacheable(payload):
+            return
+        size = len(completion.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, completion, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (completion_key(payload), completion, size, now, now)
+                )
+                self._conn.execute(_EVICT, (self.max_entries, self.max_bytes))
+            except sqlite3.Error:
+                self.errors += 1
+
+    def clear(self):
+        """Drop every cached completion"""
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.execute("VACUUM")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of this process and size of the cache file"""
+        entries, size = 0, 0
+        if self._conn is not None:
+            with self._lock:
+                try:
+                    entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+                except sqlite3.Error:
+                    self.errors += 1
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "size_mb": round(size / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "errors": self.errors
+        }
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+_cache: Optional[CompletionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """Process-wide completion cache (None when ENABLE_COMPLETION_CACHE=false)"""
+    global _cache
+    if not ENABLE_COMPLETION_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompletionCache()
+        return _cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cache persistant des complétions LLM")
+    parser.add_argument("--clear", action="store_true", help="Vider le cache")
+    args = parser.parse_args()
+
+    cache = CompletionCache()
+    if args.clear:
+        cache.clear()
+        print(f"Cache vidé: {cache.path}")
+    stats = cache.stats()
+    print(f"{cache.path}: {stats['entries']} complétions, {stats['size_mb']} MB")
@@ -28,6 +28,11 @@ ANSWER_LLM_MODEL = os.getenv("ANSWER_LLM_MODEL", "")  # Language model for Frenc
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "2000"))
 
+# Keep-alive connection pool per LLM endpoint (shared by the SPARQL and answer clients)
+LLM_POOL_MAXSIZE = int(os.getenv("LLM_POOL_MAXSIZE", "8"))               # Max open connections per endpoint
+LLM_POOL_BLOCK = os.getenv("LLM_POOL_BLOCK", "true").lower() == "true"  # Wait instead of opening extra sockets
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))          # Completions in flight per endpoint (async client)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
 
@@ -40,8 +45,56 @@ GRAPHDB_ENDPOINT = os.getenv(
     "http://localhost:7200/repositories/equestrian-kg"
 )
 
+# Read replicas: comma-separated SPARQL endpoints sharing the read load
+# (empty = every query goes to GRAPHDB_ENDPOINT, which always receives the writes)
+GRAPHDB_REPLICAS = [
+    endpoint.strip()
+    for endpoint in os.getenv("GRAPHDB_REPLICAS", "").split(",")
+    if endpoint.strip()
+]
+GRAPHDB_HEALTH_INTERVAL = float(os.getenv("GRAPHDB_HEALTH_INTERVAL", "10"))  # Seconds between replica probes
+# Read-your-writes: after a write, reads stay on GRAPHDB_ENDPOINT for this many seconds (0 = off)
+GRAPHDB_READ_YOUR_WRITES = float(os.getenv("GRAPHDB_READ_YOUR_WRITES", "5"))
+
+# Query backend: "http" (GraphDB server) or "embedded" (in-process rdflib over data/)
+GRAPHDB_BACKEND = os.getenv("GRAPHDB_BACKEND", "http").lower()
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+EMBEDDED_DATA_FILES = [
+    path.strip()
+    for path in os.getenv(
+        "EMBEDDED_DATA_FILES",
+        f"{DATA_DIR / 'ontology.owl'},{DATA_DIR / 'Horse_generatedDataV2.rdf'}"
+    ).split(",")
+    if path.strip()
+]
+
+# Pre-parsed binary snapshot of the embedded KG (rebuilt when the sources change)
+EMBEDDED_USE_SNAPSHOT = os.getenv("EMBEDDED_USE_SNAPSHOT", "true").lower() == "true"
+EMBEDDED_SNAPSHOT_PATH = os.getenv(
+    "EMBEDDED_SNAPSHOT_PATH",
+    str(DATA_DIR.parent / "cache" / "kg_snapshot.bin")
+)
+
 ONTOLOGY_GRAPH = os.getenv("ONTOLOGY_GRAPH", "")
 INSTANCES_GRAPH = os.getenv("INSTANCES_GRAPH", "")
+# Scope queries to the graphs above (instance queries -> INSTANCES_GRAPH, schema -> ONTOLOGY_GRAPH)
+SCOPE_NAMED_GRAPHS = os.getenv("SCOPE_NAMED_GRAPHS", "true").lower() == "true"
+# GraphDB keeps inferred statements outside the named graphs: add its implicit graph to scoped queries
+INFERRED_GRAPH = os.getenv("INFERRED_GRAPH", "http://www.ontotext.com/implicit")
+
+# Bulk loader (kg_loader.py): statements per upload request and parallel uploads
+LOADER_CHUNK_SIZE = int(os.getenv("LOADER_CHUNK_SIZE", "20000"))
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "4"))
+
+# HTTP connection pool (shared by query, test_connection and batch callers)
+GRAPHDB_POOL_CONNECTIONS = int(os.getenv("GRAPHDB_POOL_CONNECTIONS", "4"))  # Number of hosts kept pooled
+GRAPHDB_POOL_MAXSIZE = int(os.getenv("GRAPHDB_POOL_MAXSIZE", "10"))         # Max open connections per host
+GRAPHDB_POOL_BLOCK = os.getenv("GRAPHDB_POOL_BLOCK", "true").lower() == "true"  # Wait instead of exceeding the per-host limit
+GRAPHDB_MAX_CONCURRENCY = int(os.getenv("GRAPHDB_MAX_CONCURRENCY", "8"))  # Queries in flight (async client)
+
+# SELECT result format: "json" (sparql-results+json) or compact "tsv" / "csv"
+GRAPHDB_RESULT_FORMAT = os.getenv("GRAPHDB_RESULT_FORMAT", "json").lower()
 
 # ============================================================================
 # ONTOLOGY CONFIGURATION
@@ -62,6 +115,7 @@ DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "fr")
 VERBOSE = os.getenv("VERBOSE", "true").lower() == "true"
 SHOW_SPARQL = os.getenv("SHOW_SPARQL", "true").lower() == "true"
 SHOW_CONTEXT = os.getenv("SHOW_CONTEXT", "false").lower() == "true"
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "true").lower() == "true"  # Interactive chat prints answers token by token
 
 # ============================================================================
 # PERFORMANCE SETTINGS
@@ -69,8 +123,68 @@ SHOW_CONTEXT = os.getenv("SHOW_CONTEXT", "false").lower() == "true"
 
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "60"))
+CONNECT_TIMEOUT = float(os.getenv("CONNECT_TIMEOUT", "3"))  # Fail fast when GraphDB or the LLM server is down
+
+# Resilience (circuit breaker per endpoint, jittered backoff, global retry budget)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))  # Consecutive failures before opening
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))        # Seconds before a probe request
+RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", "0.5"))
+RETRY_BACKOFF_MAX = float(os.getenv("RETRY_BACKOFF_MAX", "8"))
+RETRY_BUDGET_CAPACITY = float(os.getenv("RETRY_BUDGET_CAPACITY", "10"))  # Max retries banked
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))      # Retry tokens earned per request
+
 ENABLE_CACHE = os.getenv("ENABLE_CACHE", "false").lower() == "true"
 
+# Rows fetched per generated SELECT (LIMIT injection, 0 = unbounded)
+SPARQL_PAGE_SIZE = int(os.getenv("SPARQL_PAGE_SIZE", "50"))
+
+# Join-order optimization of generated queries (per-predicate / per-class statistics)
+ENABLE_QUERY_OPTIMIZER = os.getenv("ENABLE_QUERY_OPTIMIZER", "true").lower() == "true"
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", "600"))  # Seconds before recomputing (0 = never)
+
+# Parameterized queries for common question shapes (no SPARQL LLM call on a confident match)
+ENABLE_TEMPLATE_ROUTER = os.getenv("ENABLE_TEMPLATE_ROUTER", "true").lower() == "true"
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.8"))  # Below: the LLM generates the query
+
+# Paraphrases of an answered question reuse its SPARQL (same linked entities, similar wording)
+ENABLE_SEMANTIC_CACHE = os.getenv("ENABLE_SEMANTIC_CACHE", "true").lower() == "true"
+SEMANTIC_CACHE_EMBEDDER = os.getenv("SEMANTIC_CACHE_EMBEDDER", "auto").lower()  # auto, sentence-transformers or hashing
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD")) if os.getenv("SEMANTIC_CACHE_THRESHOLD") else None  # Default: per embedder
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))  # LRU bound
+
+# Rewrite "combien" / superlative questions into COUNT / ORDER BY ... LIMIT queries
+ENABLE_AGGREGATION_PUSHDOWN = os.getenv("ENABLE_AGGREGATION_PUSHDOWN", "true").lower() == "true"
+
+# Local validation of generated queries (syntax, prefixes, ontology terms, relation directions)
+ENABLE_QUERY_VALIDATION = os.getenv("ENABLE_QUERY_VALIDATION", "true").lower() == "true"
+VALIDATOR_LIVE_SCHEMA = os.getenv("VALIDATOR_LIVE_SCHEMA", "false").lower() == "true"  # Also accept terms of the GraphDB schema
+
+# Relaxed variants (fuzzy literals, no FILTER, OPTIONAL attributes) of queries returning nothing
+ENABLE_QUERY_RELAXATION = os.getenv("ENABLE_QUERY_RELAXATION", "true").lower() == "true"
+RELAXATION_MAX_VARIANTS = int(os.getenv("RELAXATION_MAX_VARIANTS", "3"))  # Variants run concurrently
+
+# Self-repair of queries that are invalid, fail on GraphDB or return nothing
+ENABLE_QUERY_REPAIR = os.getenv("ENABLE_QUERY_REPAIR", "true").lower() == "true"
+REPAIR_MAX_ATTEMPTS = int(os.getenv("REPAIR_MAX_ATTEMPTS", "2"))       # LLM regenerations per question
+REPAIR_TIME_BUDGET = float(os.getenv("REPAIR_TIME_BUDGET", "30"))      # Wall-clock seconds for all attempts
+REPAIR_CACHE_SIZE = int(os.getenv("REPAIR_CACHE_SIZE", "256"))         # Repaired queries kept per normalized question
+
+# SPARQL result cache (used when ENABLE_CACHE=true)
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))                 # Seconds an entry stays valid
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))   # LRU bound
+CACHE_EPOCH_CHECK_INTERVAL = float(os.getenv("CACHE_EPOCH_CHECK_INTERVAL", "5"))  # Seconds between repository-size checks
+
+# Persistent LLM completion cache (SQLite; zero-temperature calls only unless COMPLETION_CACHE_ANY_TEMPERATURE)
+ENABLE_COMPLETION_CACHE = os.getenv("ENABLE_COMPLETION_CACHE", "true").lower() == "true"
+COMPLETION_CACHE_PATH = os.getenv(
+    "COMPLETION_CACHE_PATH",
+    str(DATA_DIR.parent / "cache" / "llm_completions.sqlite3")
+)
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "10000"))  # LRU bound
+COMPLETION_CACHE_MAX_MB = float(os.getenv("COMPLETION_CACHE_MAX_MB", "64"))             # Size bound (completion text)
+COMPLETION_CACHE_ANY_TEMPERATURE = os.getenv("COMPLETION_CACHE_ANY_TEMPERATURE", "false").lower() == "true"
+
 # ============================================================================
 # LOGGING CONFIGURATION
 # ============================================================================
@@ -78,6 +192,11 @@ ENABLE_CACHE = os.getenv("ENABLE_CACHE", "false").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = os.getenv("LOG_FILE", "logs/chatbot.log")
 
+# Slow generated queries: re-run in GraphDB explain mode and logged with their plan
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", "2"))  # Seconds (0 = off)
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.jsonl")
+
 Path("logs").mkdir(exist_ok=True)
 
 # ============================================================================
@@ -94,9 +213,20 @@ def validate_config():
         if not LOCAL_LLM_MODEL and not (SPARQL_LLM_MODEL and ANSWER_LLM_MODEL):
             errors.append("Either LOCAL_LLM_MODEL or both SPARQL_LLM_MODEL and ANSWER_LLM_MODEL must be set")
     
-    if not GRAPHDB_ENDPOINT:
+    if GRAPHDB_BACKEND not in ['http', 'embedded']:
+        errors.append("GRAPHDB_BACKEND must be 'http' or 'embedded'")
+    
+    if GRAPHDB_BACKEND == 'http' and not GRAPHDB_ENDPOINT:
         errors.append("GRAPHDB_ENDPOINT is not set")
     
+    if GRAPHDB_BACKEND == 'embedded':
+        for path in EMBEDDED_DATA_FILES:
+            if not Path(path).exists():
+                errors.append(f"EMBEDDED_DATA_FILES: {path} not found")
+    
+    if GRAPHDB_RESULT_FORMAT not in ['json', 'tsv', 'csv']:
+        errors.append("GRAPHDB_RESULT_FORMAT must be 'json', 'tsv' or 'csv'")
+    
     if not ONTOLOGY_NAMESPACE:
         errors.append("ONTOLOGY_NAMESPACE is not set")
     
@@ -135,11 +265,22 @@ def print_config():
     print(f"   Max Tokens:      {LLM_MAX_TOKENS}")
     
     print("\n GraphDB Settings:")
-    print(f"   Endpoint:        {GRAPHDB_ENDPOINT}")
+    print(f"   Backend:         {GRAPHDB_BACKEND}")
+    if GRAPHDB_BACKEND == 'embedded':
+        for path in EMBEDDED_DATA_FILES:
+            print(f"   Data file:       {path}")
+    else:
+        print(f"   Endpoint:        {GRAPHDB_ENDPOINT}")
+        if GRAPHDB_REPLICAS:
+            print(f"   Répliques:       {', '.join(GRAPHDB_REPLICAS)}")
+        print(f"   Pool:            {GRAPHDB_POOL_MAXSIZE} connexions/hôte (keep-alive)")
+        print(f"   Résultats:       {GRAPHDB_RESULT_FORMAT.upper()}")
     if ONTOLOGY_GRAPH:
         print(f"   Ontology Graph:  {ONTOLOGY_GRAPH}")
     if INSTANCES_GRAPH:
         print(f"   Instances Graph: {INSTANCES_GRAPH}")
+    if GRAPHDB_BACKEND == "http" and SCOPE_NAMED_GRAPHS and INSTANCES_GRAPH:
+        print("   Portée:          requêtes limitées aux graphes nommés" + (" (+ inférences)" if INFERRED_GRAPH else ""))
     
     print("\n Ontology Settings:")
     print(f"   Namespace:       {ONTOLOGY_NAMESPACE}")
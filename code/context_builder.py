@@ -3,23 +3,35 @@
 Context Builder - Formats SPARQL results for LLM consumption
 """
 
-from typing import List, Dict, Any
+from itertools import islice
+from typing import Iterable, Dict, Any, Optional
 
 
 class ContextBuilder:
     """Formats SPARQL results into readable context for LLM"""
     
-    def format_results(self, bindings: List[Dict[str, Any]], explanation: str = "") -> str:
+    def format_results(
+        self,
+        bindings: Iterable[Dict[str, Any]],
+        explanation: str = "",
+        max_results: Optional[int] = None,
+        truncated: bool = False
+    ) -> str:
         """
         Format SPARQL results as readable context
         
         Args:
-            bindings: List of result bindings from SPARQL query
+            bindings: Result bindings from SPARQL query (list or lazy
+                iterator such as GraphDBClient.query_stream)
             explanation: Optional explanation of the query
+            max_results: Only consume this many bindings (None = all)
+            truncated: More rows exist in the graph than the ones given
             
         Returns:
             Formatted context string
         """
+        bindings = list(islice(bindings, max_results))
+        
         if not bindings:
             return "Aucune donnée trouvée dans le graphe de connaissances."
         
@@ -30,6 +42,12 @@ class ContextBuilder:
         
         context += f"Données trouvées ({len(bindings)} résultats):\n\n"
         
+        if truncated:
+            context += (
+                f"Attention: résultats tronqués, seuls les {len(bindings)} premiers "
+                "sont affichés; d'autres existent dans le graphe.\n\n"
+            )
+        
         for i, binding in enumerate(bindings, 1):
             context += f"Résultat {i}:\n"
             for key, value in binding.items():
@@ -43,8 +61,9 @@ class ContextBuilder:
         
         return context
     
-    def format_for_display(self, bindings: List[Dict[str, Any]]) -> str:
+    def format_for_display(self, bindings: Iterable[Dict[str, Any]]) -> str:
         """Format results for terminal display"""
+        bindings = list(bindings)
         if not bindings:
             return "Aucun résultat"
         
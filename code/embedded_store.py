@@ -0,0 +1,192 @@
+# embedded_store.py
+"""
+Embedded Store - In-process SPARQL backend over the local RDF files
+Drop-in replacement for GraphDBClient (same sparql-results+json dicts),
+selected with GRAPHDB_BACKEND=embedded
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Iterator, Optional
+from config import (
+    EMBEDDED_DATA_FILES,
+    EMBEDDED_USE_SNAPSHOT,
+    EMBEDDED_SNAPSHOT_PATH,
+    ONTOLOGY_GRAPH,
+    INSTANCES_GRAPH
+)
+
+try:
+    import rdflib
+    from rdflib import BNode, Literal, URIRef
+    RDFLIB_AVAILABLE = True
+except ImportError:
+    RDFLIB_AVAILABLE = False
+
+
+def term_to_json(term) -> Dict[str, str]:
+    """Convert an rdflib term to a sparql-results+json binding value"""
+    if isinstance(term, URIRef):
+        return {"type": "uri", "value": str(term)}
+    if isinstance(term, BNode):
+        return {"type": "bnode", "value": str(term)}
+
+    value = {"type": "literal", "value": str(term)}
+    if isinstance(term, Literal):
+        if term.language:
+            value["xml:lang"] = term.language
+        elif term.datatype:
+            value["datatype"] = str(term.datatype)
+    return value
+
+
+def graph_name_for(path: Path) -> str:
+    """Named graph receiving a data file (ontology vs instance data)"""
+    if path.suffix == ".owl" and ONTOLOGY_GRAPH:
+        return ONTOLOGY_GRAPH
+    if path.suffix != ".owl" and INSTANCES_GRAPH:
+        return INSTANCES_GRAPH
+    return path.resolve().as_uri()
+
+
+class EmbeddedGraphDBClient:
+    """GraphDBClient-compatible client running SPARQL in-process with rdflib"""
+
+    def __init__(
+        self,
+        data_files: List[str] = EMBEDDED_DATA_FILES,
+        use_snapshot: bool = EMBEDDED_USE_SNAPSHOT,
+        snapshot_path: str = EMBEDDED_SNAPSHOT_PATH
+    ):
+        """
+        Load the RDF files into an in-memory dataset
+
+        Each file goes into its own named graph (ONTOLOGY_GRAPH /
+        INSTANCES_GRAPH when configured); the default graph is the union
+        of all of them, as in GraphDB.
+
+        Args:
+            data_files: Paths of the RDF/XML files to load
+            use_snapshot: Load from the binary snapshot when it matches the
+                sources, and (re)build it after parsing otherwise
+            snapshot_path: Snapshot file (see kg_snapshot.py)
+        """
+        if not RDFLIB_AVAILABLE:
+            raise ImportError(
+                "embedded_store requires rdflib. "
+                "Install with: pip install rdflib"
+            )
+
+        self.endpoint = "embedded://" + ",".join(Path(f).name for f in data_files)
+        self.data_files = [Path(f) for f in data_files]
+        self.loaded_from_snapshot = False
+
+        start = time.time()
+        dataset = None
+        if use_snapshot:
+            from kg_snapshot import load_snapshot
+            dataset = load_snapshot(data_files, snapshot_path)
+            self.loaded_from_snapshot = dataset is not None
+
+        if dataset is None:
+            dataset = self._parse_sources()
+            if use_snapshot:
+                from kg_snapshot import write_snapshot
+                try:
+                    write_snapshot(dataset, data_files, snapshot_path)
+                except OSError as e:
+                    print(f"Snapshot non écrit ({snapshot_path}): {e}")
+
+        self.dataset = dataset
+        self.load_time = time.time() - start
+        # rdflib's SPARQL parser (pyparsing) is not thread-safe: relaxation
+        # variants and the background stats refresh run one at a time
+        self._lock = threading.Lock()
+
+    def _parse_sources(self):
+        """Parse every source file into its named graph"""
+        dataset = rdflib.Dataset(default_union=True)
+        for path in self.data_files:
+            graph = dataset.graph(URIRef(graph_name_for(path)))
+            graph.parse(str(path), format=rdflib.util.guess_format(str(path)) or "xml")
+        return dataset
+
+    def query(self, sparql_query: str) -> Dict[str, Any]:
+        """
+        Execute a SPARQL query in-process
+
+        Args:
+            sparql_query: SPARQL query string
+
+        Returns:
+            Dictionary with query results (sparql-results+json shape)
+        """
+        with self._lock:
+            return self._query(sparql_query)
+
+    def _query(self, sparql_query: str) -> Dict[str, Any]:
+        """Parse, run and serialize a query (caller holds the lock)"""
+        try:
+            result = self.dataset.query(sparql_query)
+        except Exception as e:
+            print(f"Erreur lors de l'exécution de la requête: {e}")
+            return {"results": {"bindings": []}, "error": str(e)}
+
+        if result.type == "ASK":
+            return {"head": {}, "boolean": bool(result.askAnswer)}
+
+        if result.type != "SELECT":
+            print(f"Requête {result.type} non supportée par le backend embarqué")
+            return {"results": {"bindings": []}}
+
+        variables = [str(var) for var in result.vars]
+        bindings = []
+        for row in result:
+            binding = {}
+            for var, term in zip(variables, row):
+                if term is not None:
+                    binding[var] = term_to_json(term)
+            bindings.append(binding)
+
+        return {"head": {"vars": variables}, "results": {"bindings": bindings}}
+
+    def query_stream(self, sparql_query: str, max_rows: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield the bindings of a query (rows are already in memory; errors raise, as over HTTP)"""
+        result = self.query(sparql_query)
+        if "error" in result:
+            raise Exception(result["error"])
+        bindings = result.get("results", {}).get("bindings", [])
+        return iter(bindings[:max_rows] if max_rows is not None else bindings)
+
+    def query_batch(self, sparql_queries: List[str]) -> List[Dict[str, Any]]:
+        """Execute several SPARQL queries"""
+        return [self.query(sparql_query) for sparql_query in sparql_queries]
+
+    def size(self) -> int:
+        """Number of statements loaded"""
+        with self._lock:
+            return len(self.dataset)
+
+    def test_connection(self) -> bool:
+        """Report what was loaded"""
+        print(" Backend embarqué prêt!")
+        source = "snapshot" if self.loaded_from_snapshot else "RDF"
+        print(f"{self.size()} triplets chargés en {self.load_time:.2f}s ({source})")
+        return True
+
+    def close(self):
+        """Nothing to release (kept for GraphDBClient compatibility)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == "__main__":
+    print("Chargement du backend SPARQL embarqué...")
+
+    client = EmbeddedGraphDBClient()
+    client.test_connection()
@@ -372,6 +372,22 @@ class ChatbotEvaluator:
         if stats['failed'] > 0:
             print(f"\n❌ Failed: {stats['failed']} questions")
         
+        if getattr(self.chatbot, "router", None) is not None:
+            router_stats = self.chatbot.router.stats()
+            print(f"\n🧭 Template Router: {router_stats['hits']}/{router_stats['questions']} questions "
+                  f"({router_stats['hit_rate']:.0%}) answered without the SPARQL LLM")
+        
+        if getattr(self.chatbot, "semantic_cache", None) is not None:
+            semantic_stats = self.chatbot.semantic_cache.stats()
+            print(f"\n🔁 Semantic Cache: {semantic_stats['hits']}/{semantic_stats['lookups']} questions "
+                  f"({semantic_stats['hit_rate']:.0%}) reused the query of a paraphrase ({semantic_stats['embedder']})")
+        
+        completion_cache = getattr(getattr(self.chatbot, "sparql_llm", None), "cache", None)
+        if completion_cache is not None:
+            cache_stats = completion_cache.stats()
+            print(f"\n💾 Completion Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                  f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} entries on disk")
+        
         print("\n" + "="*80)
 
 
@@ -0,0 +1,153 @@
+# graph_scope.py
+"""
+Graph Scope - Restrict queries to the ONTOLOGY_GRAPH / INSTANCES_GRAPH named graphs
+Instance queries only scan the instance graph, schema introspection only the
+ontology graph, so scans do not grow with unrelated graphs of the repository;
+GraphDB's inferred statements (the implicit graph) stay visible to both
+"""
+
+from typing import Dict, List, Optional
+from config import ONTOLOGY_GRAPH, INSTANCES_GRAPH, INFERRED_GRAPH
+from sparql_tokenizer import (
+    tokenize,
+    split_prologue,
+    is_keyword,
+    IRI,
+    PNAME,
+    VAR,
+    STRING,
+    NUMBER,
+    NAME,
+    PUNCT,
+    SPARQLSyntaxError
+)
+
+RDF_NS = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RDFS_NS = "http://www.w3.org/2000/01/rdf-schema#"
+OWL_NS = "http://www.w3.org/2002/07/owl#"
+RDF_TYPE = RDF_NS + "type"
+
+# RDFS terms that only occur in the ontology (rdfs:label / rdfs:comment do not count)
+SCHEMA_TERMS = {RDFS_NS + name for name in ("subClassOf", "subPropertyOf", "domain", "range", "Class", "Datatype")}
+
+# Query scopes
+INSTANCES = "instances"
+ONTOLOGY = "ontology"
+ALL = "all"
+
+_TERM_KINDS = (IRI, PNAME, VAR)
+
+
+def _resolve(token, prefixes: Dict[str, str]) -> Optional[str]:
+    """Full IRI of an IRI / prefixed-name token (None for other tokens)"""
+    if token.kind == IRI:
+        return token.value[1:-1]
+    if token.kind == PNAME and not token.value.startswith("_:"):
+        prefix, _, local = token.value.partition(":")
+        namespace = prefixes.get(prefix + ":")
+        return namespace + local if namespace is not None else None
+    if is_keyword(token, "A") and token.value == "a":
+        return RDF_TYPE
+    return None
+
+
+def _is_schema(iri: Optional[str]) -> bool:
+    return iri is not None and (iri in SCHEMA_TERMS or iri.startswith(OWL_NS))
+
+
+def _is_vocabulary(iri: Optional[str]) -> bool:
+    return iri is not None and iri.startswith((RDF_NS, RDFS_NS, OWL_NS))
+
+
+def classify_query(sparql_query: str) -> Optional[str]:
+    """
+    Decide which part of the knowledge graph a query reads
+
+    A query using schema vocabulary (rdfs:subClassOf, rdfs:domain, owl:...)
+    is schema introspection unless it may also match instance data: an
+    rdf:type whose class is not an RDF/RDFS/OWL term, or a domain property
+    (or a variable) used as a predicate. When in doubt, both graphs are used.
+
+    Args:
+        sparql_query: SPARQL query string
+
+    Returns:
+        INSTANCES, ONTOLOGY or ALL; None if the query picks its own dataset
+        (FROM, GRAPH, SERVICE) or cannot be tokenized
+    """
+    try:
+        tokens = tokenize(sparql_query)
+    except SPARQLSyntaxError:
+        return None
+    declared, _, body = split_prologue(tokens)
+    prefixes = {pname: iri[1:-1] for pname, iri in declared}
+
+    if any(is_keyword(token, "FROM", "GRAPH", "SERVICE", "USING", "WITH") for token in body):
+        return None
+
+    schema = False
+    instance = False
+    depth = 0
+    for i, token in enumerate(body):
+        if token.kind == PUNCT and token.value == "{":
+            depth += 1
+            continue
+        if token.kind == PUNCT and token.value == "}":
+            depth -= 1
+            continue
+        iri = _resolve(token, prefixes)
+        if depth == 0 or (iri is None and token.kind != VAR):
+            continue
+
+        schema = schema or _is_schema(iri)
+        previous = body[i - 1] if i > 0 else None
+        following = body[i + 1] if i + 1 < len(body) else None
+
+        if iri == RDF_TYPE:
+            # rdf:type with a domain class (or any class) -> instance data
+            if following is not None and not _is_vocabulary(_resolve(following, prefixes)):
+                instance = True
+        elif not _is_vocabulary(iri) and previous is not None and following is not None:
+            # Domain term or variable in predicate position (between subject and object)
+            after_subject = previous.kind in _TERM_KINDS or (previous.kind == PUNCT and previous.value == ";")
+            before_object = following.kind in _TERM_KINDS + (STRING, NUMBER, NAME) or (
+                following.kind == PUNCT and following.value in ("/", "|", "*", "+", "?", "[", "(")
+            )
+            if after_subject and before_object:
+                instance = True
+
+    if not schema:
+        return INSTANCES
+    return ALL if instance else ONTOLOGY
+
+
+def dataset_graphs(sparql_query: str) -> Optional[List[str]]:
+    """
+    Default graphs a query should run against
+
+    Args:
+        sparql_query: SPARQL query string
+
+    Returns:
+        Graph IRIs to pass as default-graph-uri, or None to leave the
+        repository's default graph (no graphs configured, or the query
+        defines its own dataset)
+    """
+    scope = classify_query(sparql_query)
+    if scope is None:
+        return None
+
+    graphs = {
+        INSTANCES: [INSTANCES_GRAPH],
+        ONTOLOGY: [ONTOLOGY_GRAPH],
+        ALL: [ONTOLOGY_GRAPH, INSTANCES_GRAPH]
+    }[scope]
+
+    # Scoping to an unconfigured graph would hide data: keep the whole repository
+    if not all(graphs):
+        return None
+    # Inferred statements have no named graph: without this, rdf:type via
+    # rdfs:subClassOf, inverse and transitive properties would disappear
+    if INFERRED_GRAPH:
+        graphs.append(INFERRED_GRAPH)
+    return graphs
@@ -1,24 +1,237 @@
 # graphdb_client.py
 """
 GraphDB Client - Handles SPARQL queries to GraphDB
+Uses a pooled keep-alive HTTP session shared by every query
 """
 
+import codecs
+import json
+import re
+import time
 import requests
-from typing import Dict, Any
-from config import GRAPHDB_ENDPOINT, REQUEST_TIMEOUT
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Iterable, Iterator, Optional
+from config import (
+    GRAPHDB_ENDPOINT,
+    REQUEST_TIMEOUT,
+    MAX_RETRIES,
+    GRAPHDB_POOL_CONNECTIONS,
+    GRAPHDB_POOL_MAXSIZE,
+    GRAPHDB_POOL_BLOCK,
+    GRAPHDB_RESULT_FORMAT,
+    GRAPHDB_BACKEND,
+    CONNECT_TIMEOUT,
+    SCOPE_NAMED_GRAPHS,
+    GRAPHDB_REPLICAS,
+    GRAPHDB_READ_YOUR_WRITES,
+    ENABLE_CACHE
+)
+from sparql_results import RESULT_FORMATS, DECODERS, iter_tsv_bindings
+from query_cache import QueryCache
+from graph_scope import dataset_graphs
+from replica_pool import ReplicaSet
+from slow_query_log import SlowQueryLog
+from resilience import call_with_retries, get_circuit_breaker, CircuitBreaker, BackendUnavailableError, TransientError
+
+# Failures that mean "GraphDB is unreachable or overloaded" (circuit breaker)
+_UNAVAILABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, TransientError)
+
+# Start of the bindings array in an application/sparql-results+json body
+_BINDINGS_START = re.compile(r'"bindings"\s*:\s*\[')
+
+# First query-form keyword once IRIs are removed (PREFIX IRIs may contain "select")
+_QUERY_FORM = re.compile(r'\b(SELECT|ASK|CONSTRUCT|DESCRIBE)\b', re.IGNORECASE)
+_IRI = re.compile(r'<[^<>"\s]*>')
+
+
+def create_pooled_session(
+    pool_connections: int = GRAPHDB_POOL_CONNECTIONS,
+    pool_maxsize: int = GRAPHDB_POOL_MAXSIZE,
+    pool_block: bool = GRAPHDB_POOL_BLOCK
+) -> requests.Session:
+    """
+    Create a keep-alive HTTP session backed by a bounded connection pool
+    
+    Args:
+        pool_connections: Number of per-host pools to keep
+        pool_maxsize: Maximum number of connections kept open per host
+        pool_block: Wait for a free connection instead of opening extra ones
+    
+    Returns:
+        Configured requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Connection": "keep-alive",
+        "Accept-Encoding": "gzip, deflate"
+    })
+    return session
+
+
+def is_select_query(sparql_query: str) -> bool:
+    """Check whether a query is a SELECT (the only form with tabular results)"""
+    match = _QUERY_FORM.search(_IRI.sub(" ", sparql_query))
+    return bool(match) and match.group(1).upper() == "SELECT"
+
+
+def _error_message(error: Exception) -> str:
+    """Error text for callers; includes GraphDB's message for HTTP errors (e.g. MALFORMED QUERY)"""
+    response = getattr(error, "response", None)
+    if response is not None and response.text:
+        return f"{error}: {response.text.strip()[:500]}"
+    return str(error)
+
+
+def iter_json_bindings(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally decode the bindings of a sparql-results+json body
+    
+    Only the binding currently being decoded is held in memory; the
+    rest of the body is read from the chunk iterator on demand.
+    
+    Args:
+        chunks: Raw response body chunks
+    
+    Yields:
+        One binding dict at a time
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = None
+    
+    for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        
+        if pos is None:
+            match = _BINDINGS_START.search(buffer)
+            if not match:
+                continue
+            pos = match.end()
+        
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            try:
+                binding, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Binding not fully received yet
+            yield binding
+        
+        buffer = buffer[pos:]
+        pos = 0
+    
+    if pos is not None:
+        raise ValueError("Réponse SPARQL JSON tronquée")
 
 
 class GraphDBClient:
     """Client for executing SPARQL queries on GraphDB"""
     
-    def __init__(self, endpoint: str = GRAPHDB_ENDPOINT):
+    def __init__(
+        self,
+        endpoint: str = GRAPHDB_ENDPOINT,
+        pool_maxsize: int = GRAPHDB_POOL_MAXSIZE,
+        result_format: str = GRAPHDB_RESULT_FORMAT,
+        enable_cache: bool = ENABLE_CACHE,
+        scope_graphs: bool = SCOPE_NAMED_GRAPHS,
+        replicas: Optional[List[str]] = None,
+        read_your_writes: float = GRAPHDB_READ_YOUR_WRITES
+    ):
         """
         Initialize GraphDB client
         
         Args:
             endpoint: GraphDB SPARQL endpoint URL
+            pool_maxsize: Maximum number of pooled connections to GraphDB
+            result_format: SELECT result format to negotiate ("json", "tsv", "csv")
+            enable_cache: Cache results, invalidated when the repository size changes
+            scope_graphs: Run queries against INSTANCES_GRAPH / ONTOLOGY_GRAPH only
+                (see graph_scope.py) instead of the whole repository
+            replicas: Read replica endpoints (default: GRAPHDB_REPLICAS when
+                endpoint is GRAPHDB_ENDPOINT); writes always go to endpoint
+            read_your_writes: Seconds reads stay on endpoint after a write (0 = off)
         """
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"Format de résultats inconnu: {result_format}")
+        
         self.endpoint = endpoint
+        self.result_format = result_format
+        self.scope_graphs = scope_graphs
+        if replicas is None:
+            replicas = GRAPHDB_REPLICAS if endpoint == GRAPHDB_ENDPOINT else []
+        self.session = create_pooled_session(
+            pool_connections=max(GRAPHDB_POOL_CONNECTIONS, len(replicas) + 1),
+            pool_maxsize=pool_maxsize
+        )
+        self.replicas = ReplicaSet(replicas, self.session) if replicas else None
+        self.read_your_writes = read_your_writes
+        self._pinned_until = 0.0
+        self.slow_log = SlowQueryLog()
+        self.cache = QueryCache(epoch_fn=self.size) if enable_cache else None
+    
+    def _format_for(self, sparql_query: str) -> str:
+        """Pick the result format: tabular formats only apply to SELECT queries"""
+        if self.result_format != "json" and is_select_query(sparql_query):
+            return self.result_format
+        return "json"
+    
+    def _post(self, sparql_query: str, result_format: str, stream: bool = False) -> requests.Response:
+        """
+        POST a query through the circuit breaker, retrying connection failures
+        
+        With graph scoping, the dataset is restricted through the protocol's
+        default-graph-uri parameter; the query text is left untouched. With
+        read replicas, the query goes to the least loaded healthy replica,
+        unless this client wrote recently (read-your-writes).
+        
+        Raises:
+            BackendUnavailableError: GraphDB unreachable or circuit open
+        """
+        graphs = dataset_graphs(sparql_query) if self.scope_graphs else None
+        
+        def _post_to(endpoint: str, max_retries: int = MAX_RETRIES) -> requests.Response:
+            return call_with_retries(
+                endpoint,
+                lambda: _send(endpoint),
+                retryable=_UNAVAILABLE_ERRORS,
+                max_retries=max_retries,
+                no_retry=(requests.exceptions.ReadTimeout,),
+                slow=(requests.exceptions.ReadTimeout,)
+            )
+        
+        def _send(endpoint: str):
+            response = self.session.post(
+                endpoint,
+                params={"default-graph-uri": graphs} if graphs else None,
+                data=sparql_query.encode("utf-8"),
+                headers={
+                    "Content-Type": "application/sparql-query",
+                    "Accept": RESULT_FORMATS[result_format]
+                },
+                timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT),
+                stream=stream
+            )
+            if response.status_code >= 500:
+                response.close()
+                raise TransientError(f"HTTP {response.status_code}")
+            return response
+        
+        if self.replicas is None or time.monotonic() < self._pinned_until:
+            return _post_to(self.endpoint)
+        # Fail over to another replica instead of retrying the same one
+        return self.replicas.run(lambda endpoint: _post_to(endpoint, max_retries=1))
     
     def query(self, sparql_query: str) -> Dict[str, Any]:
         """
@@ -26,36 +239,208 @@ class GraphDBClient:
         
         Args:
             sparql_query: SPARQL query string
-            
+        
         Returns:
-            Dictionary with query results
+            Dictionary with query results (with a tabular format, bindings
+            are read-only views over compact row tuples)
+        
+        Raises:
+            BackendUnavailableError: GraphDB unreachable or circuit open
         """
+        if self.cache is not None:
+            cached = self.cache.get(sparql_query)
+            if cached is not None:
+                return cached
+        
+        result_format = self._format_for(sparql_query)
+        
         try:
-            response = requests.post(
-                self.endpoint,
-                data=sparql_query,
-                headers={
-                    "Content-Type": "application/sparql-query",
-                    "Accept": "application/sparql-results+json"
-                },
-                timeout=REQUEST_TIMEOUT
-            )
+            start = time.monotonic()
+            response = self._post(sparql_query, result_format)
             
             response.raise_for_status()
-            return response.json()
+            if result_format == "json":
+                result = response.json()
+            else:
+                result = DECODERS[result_format](response.content.decode("utf-8")).to_results()
             
-        except requests.exceptions.ConnectionError:
+            self.slow_log.observe(
+                sparql_query,
+                time.monotonic() - start,
+                len(result.get("results", {}).get("bindings", [])),
+                response.url.split("?")[0],
+                lambda explain: self._post(explain, "json").json()
+            )
+            
+        except BackendUnavailableError as e:
             print( "Erreur: Impossible de se connecter à GraphDB")
-            print(f"Vérifiez que GraphDB est lancé sur {self.endpoint}")
-            return {"results": {"bindings": []}}
+            print(f"Vérifiez que GraphDB est lancé sur {e.endpoint} ({e.reason})")
+            raise
+        
+        except requests.exceptions.ReadTimeout:
+            # GraphDB is up but the query is too slow: a query error for the repair loop
+            print(f"Erreur: Timeout après {REQUEST_TIMEOUT}s")
+            return {"results": {"bindings": []}, "error": f"Timeout après {REQUEST_TIMEOUT}s (requête trop lente)"}
             
+        except Exception as e:
+            print(f"Erreur lors de l'exécution de la requête: {e}")
+            return {"results": {"bindings": []}, "error": _error_message(e)}
+        
+        if self.cache is not None:
+            self.cache.put(sparql_query, result)
+        return result
+    
+    def size(self) -> Optional[int]:
+        """
+        Number of statements in the repository (RDF4J /size endpoint)
+        
+        Much cheaper than a COUNT query; used as the cache epoch.
+        
+        Returns:
+            Statement count, or None if GraphDB is unreachable
+        """
+        if get_circuit_breaker(self.endpoint).state == CircuitBreaker.OPEN:
+            return None
+        try:
+            response = self.session.get(
+                f"{self.endpoint.rstrip('/')}/size",
+                timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT)
+            )
+            response.raise_for_status()
+            return int(response.text.strip())
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+    
+    def query_stream(
+        self,
+        sparql_query: str,
+        max_rows: Optional[int] = None,
+        chunk_size: int = 8192
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Execute a SPARQL query and yield bindings lazily
+        
+        The response body is read incrementally, so only the bindings the
+        caller actually consumes are decoded. Stopping the iteration (or
+        reaching max_rows) closes the response without reading the rest.
+        
+        Args:
+            sparql_query: SPARQL query string
+            max_rows: Stop after this many bindings (None = no cap)
+            chunk_size: Number of bytes read from the socket at a time
+        
+        Yields:
+            Result bindings, one at a time
+        
+        Raises:
+            BackendUnavailableError: GraphDB unreachable or circuit open
+            Exception: Query rejected, timeout or body cut mid-stream (the
+                bindings already yielded are incomplete)
+        """
+        if max_rows is not None and max_rows <= 0:
+            return
+        
+        # TSV is line-oriented and streams naturally; CSV falls back to JSON
+        result_format = "tsv" if self._format_for(sparql_query) == "tsv" else "json"
+        
+        response = None
+        try:
+            response = self._post(sparql_query, result_format, stream=True)
+            response.raise_for_status()
+            
+            if result_format == "tsv":
+                response.encoding = "utf-8"
+                bindings = iter_tsv_bindings(response.iter_lines(chunk_size, decode_unicode=True))
+            else:
+                bindings = iter_json_bindings(response.iter_content(chunk_size))
+            
+            rows = 0
+            for binding in bindings:
+                yield binding
+                rows += 1
+                if max_rows is not None and rows >= max_rows:
+                    return
+        
+        except BackendUnavailableError as e:
+            print( "Erreur: Impossible de se connecter à GraphDB")
+            print(f"Vérifiez que GraphDB est lancé sur {e.endpoint} ({e.reason})")
+            raise
+        
         except requests.exceptions.Timeout:
             print(f"Erreur: Timeout après {REQUEST_TIMEOUT}s")
-            return {"results": {"bindings": []}}
-            
+            raise
+        
         except Exception as e:
             print(f"Erreur lors de l'exécution de la requête: {e}")
-            return {"results": {"bindings": []}}
+            raise
+        
+        finally:
+            if response is not None:
+                response.close()
+    
+    def query_batch(self, sparql_queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Execute several SPARQL queries over the same pooled connections
+        
+        Args:
+            sparql_queries: List of SPARQL query strings
+        
+        Returns:
+            List of result dictionaries, in the same order as the queries
+        """
+        return [self.query(sparql_query) for sparql_query in sparql_queries]
+    
+    def _statements(self, method: str, graph: Optional[str], data: Optional[bytes] = None, content_type: Optional[str] = None):
+        """Send a request to the RDF4J statements endpoint through the circuit breaker"""
+        def _send():
+            response = self.session.request(
+                method,
+                f"{self.endpoint.rstrip('/')}/statements",
+                params={"context": f"<{graph}>"} if graph else None,
+                data=data,
+                headers={"Content-Type": content_type} if content_type else None,
+                timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT)
+            )
+            if response.status_code >= 500:
+                raise TransientError(f"HTTP {response.status_code}: {response.text[:200]}")
+            return response
+        
+        response = call_with_retries(
+            self.endpoint,
+            _send,
+            retryable=_UNAVAILABLE_ERRORS,
+            no_retry=(requests.exceptions.ReadTimeout,),
+            slow=(requests.exceptions.ReadTimeout,)
+        )
+        response.raise_for_status()
+        if self.read_your_writes > 0:
+            self._pinned_until = time.monotonic() + self.read_your_writes
+        if self.cache is not None:
+            self.cache.clear()
+    
+    def add_statements(self, data: bytes, graph: Optional[str] = None, content_type: str = "application/n-triples"):
+        """
+        Upload RDF statements into the repository
+        
+        Args:
+            data: Serialized statements
+            graph: Named graph receiving them (default graph if None)
+            content_type: RDF format of data
+        
+        Raises:
+            BackendUnavailableError: GraphDB unreachable or circuit open
+            requests.HTTPError: GraphDB rejected the data
+        """
+        self._statements("POST", graph, data, content_type)
+    
+    def clear_graph(self, graph: Optional[str] = None):
+        """
+        Delete every statement of a named graph (of the whole repository if None)
+        
+        Raises:
+            BackendUnavailableError: GraphDB unreachable or circuit open
+        """
+        self._statements("DELETE", graph)
     
     def test_connection(self) -> bool:
         """Test connection to GraphDB"""
@@ -70,16 +455,49 @@ class GraphDBClient:
                 count = result['results']['bindings'][0]['count']['value']
                 print(" Connexion à GraphDB réussie!")
                 print(f"{count} triplets trouvés dans le graphe")
+                if self.replicas is not None:
+                    for replica in self.replicas.status():
+                        state = "OK" if replica["healthy"] else "écartée"
+                        print(f"  Réplique {replica['endpoint']}: {state}")
                 return True
         except:
             pass
         
         print("Impossible de se connecter à GraphDB")
         return False
+    
+    def close(self):
+        """Close the pooled connections"""
+        if self.replicas is not None:
+            self.replicas.close()
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_graphdb_client(endpoint: str = GRAPHDB_ENDPOINT, backend: str = GRAPHDB_BACKEND):
+    """
+    Get the SPARQL client for the configured backend
+    
+    Args:
+        endpoint: GraphDB SPARQL endpoint URL (http backend)
+        backend: "http" for a GraphDB server, "embedded" for in-process rdflib
+    
+    Returns:
+        GraphDBClient or EmbeddedGraphDBClient
+    """
+    if backend == "embedded":
+        from embedded_store import EmbeddedGraphDBClient
+        return EmbeddedGraphDBClient()
+    return GraphDBClient(endpoint)
 
 
 if __name__ == "__main__":
     print("Test de connexion à GraphDB...")
     
-    client = GraphDBClient()
-    client.test_connection()
+    with get_graphdb_client() as client:
+        client.test_connection()
@@ -5,11 +5,37 @@ Updated to use specialized LLMs for different tasks
 """
 
 import sys
-from graphdb_client import GraphDBClient
+import time
+from typing import Callable, Optional
+from graphdb_client import get_graphdb_client
 from intelligent_sparql_generator import IntelligentSPARQLGenerator
 from llm_client import get_sparql_llm, get_answer_llm
 from context_builder import ContextBuilder
-from config import GRAPHDB_ENDPOINT, VERBOSE, SHOW_SPARQL, SHOW_CONTEXT, get_active_models
+from sparql_pagination import QueryCursor
+from template_router import TemplateRouter
+from semantic_cache import SemanticQuestionCache
+from query_optimizer import QueryOptimizer
+from query_validator import QueryValidator
+from query_repair import QueryRepairer, RepairOutcome, problem_of, EMPTY_RESULT
+from query_relaxation import QueryRelaxer
+from resilience import BackendUnavailableError
+from config import (
+    GRAPHDB_ENDPOINT,
+    GRAPHDB_BACKEND,
+    VERBOSE,
+    SHOW_SPARQL,
+    SHOW_CONTEXT,
+    SPARQL_PAGE_SIZE,
+    ENABLE_TEMPLATE_ROUTER,
+    ENABLE_SEMANTIC_CACHE,
+    ENABLE_QUERY_OPTIMIZER,
+    ENABLE_QUERY_VALIDATION,
+    VALIDATOR_LIVE_SCHEMA,
+    ENABLE_QUERY_RELAXATION,
+    ENABLE_QUERY_REPAIR,
+    STREAM_ANSWERS,
+    get_active_models
+)
 
 
 class IntelligentEquestrianChatbot:
@@ -31,7 +57,10 @@ class IntelligentEquestrianChatbot:
             language: Response language (fr/en)
         """
         print(" Initialisation du Chatbot Équestre Intelligent...")
-        print(f"   Repository: {graphdb_endpoint.split('/')[-1]}")
+        if GRAPHDB_BACKEND == "embedded":
+            print("   Repository: embarqué (rdflib, data/)")
+        else:
+            print(f"   Repository: {graphdb_endpoint.split('/')[-1]}")
         print(f"   Langue: {language.upper()}")
         
         # Show model configuration
@@ -45,10 +74,12 @@ class IntelligentEquestrianChatbot:
             print(f"   Model: {models['sparql_model']}")
         
         self.language = language
+        self.last_cursor = None
+        self._executions = {}
         
         # Initialize all components with specialized LLMs
         try:
-            self.graphdb = GraphDBClient(graphdb_endpoint)
+            self.graphdb = get_graphdb_client(graphdb_endpoint)
             
             # Get specialized LLMs
             self.sparql_llm = get_sparql_llm()  # Code-specialized (Qwen2.5-Coder)
@@ -58,21 +89,51 @@ class IntelligentEquestrianChatbot:
             self.sparql_generator = IntelligentSPARQLGenerator(self.sparql_llm)
             self.context_builder = ContextBuilder()
             
+            # Common question shapes answered from parameterized queries
+            self.router = TemplateRouter(self.graphdb) if ENABLE_TEMPLATE_ROUTER else None
+            
+            # Paraphrases of answered questions reuse their query (entity index shared with the router)
+            self.semantic_cache = None
+            if ENABLE_SEMANTIC_CACHE:
+                self.semantic_cache = SemanticQuestionCache(
+                    self.graphdb,
+                    index=self.router.index if self.router is not None else None
+                )
+            
+            # Join-order optimizer between generation and execution
+            self.optimizer = QueryOptimizer(self.graphdb) if ENABLE_QUERY_OPTIMIZER else None
+            
+            # Local checks against the ontology vocabulary before execution
+            self.validator = QueryValidator() if ENABLE_QUERY_VALIDATION else None
+            if self.validator is not None and VALIDATOR_LIVE_SCHEMA:
+                try:
+                    self.validator.vocabulary.add_live_schema(self.graphdb)
+                except Exception as e:
+                    print(f"Schéma GraphDB non chargé pour la validation: {e}")
+            
+            # Relaxed variants of queries returning nothing, before any regeneration
+            self.relaxer = QueryRelaxer() if ENABLE_QUERY_RELAXATION else None
+            
+            # Bounded regeneration of queries that are invalid, fail or return nothing
+            self.repairer = QueryRepairer(self.sparql_generator, self.validator) if ENABLE_QUERY_REPAIR else None
+            
             print("\nChatbot initialisé!\n")
         except Exception as e:
             print(f"\nErreur lors de l'initialisation: {e}")
             raise
     
-    def answer_question(self, question: str, verbose: bool = VERBOSE) -> dict:
+    def answer_question(self, question: str, verbose: bool = VERBOSE, stream: bool = False) -> dict:
         """
         Answer a question about horses using specialized LLMs
         
         Args:
             question: User's question in natural language
             verbose: Show detailed steps
+            stream: Print the answer token by token as it is generated
             
         Returns:
-            Dictionary with answer and metadata
+            Dictionary with answer and metadata (answer_metrics: time to
+            first token and tokens per second when streamed)
         """
         if verbose:
             print(f"\n{'='*80}")
@@ -85,8 +146,30 @@ class IntelligentEquestrianChatbot:
         if verbose:
             print("ÉTAPE 1: Génération de la requête SPARQL (modèle code-spécialisé)...")
         
+        # A question whose generated query needed repairing reuses the repaired query
+        cached = self.repairer.cached(question) if self.repairer is not None else None
+        repair = None
+        
         try:
-            query_result = self.sparql_generator.generate_sparql(question, self.language)
+            if cached is not None:
+                query_result = cached
+                repair = RepairOutcome.from_cache(cached)
+                if verbose:
+                    print(" Requête réparée réutilisée (cache)")
+            else:
+                query_result = self.router.route(question) if self.router is not None else None
+                if query_result is not None:
+                    if verbose:
+                        print(f" Modèle de requête '{query_result['template']}' (sans appel au LLM SPARQL)")
+                else:
+                    query_result = self.semantic_cache.lookup(question) if self.semantic_cache is not None else None
+                    if query_result is not None:
+                        if verbose:
+                            match = query_result["semantic_match"]
+                            print(f" Requête de « {match['question']} » réutilisée (similarité {match['similarity']:.2f})")
+                    else:
+                        query_result = self.sparql_generator.generate_sparql(question, self.language)
+            validation = self.validator.validate(query_result["sparql_query"]) if self.validator is not None else None
             sparql_query = query_result["sparql_query"]
             entities_used = query_result["entities_used"]
             relations_used = query_result["relations_used"]
@@ -106,6 +189,16 @@ class IntelligentEquestrianChatbot:
                     print("-" * 80)
                     print()
         
+        except BackendUnavailableError as e:
+            # Fail fast: the LLM server is down, no point in going further
+            print(f"{e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "backend_unavailable": True,
+                "question": question
+            }
+            
         except Exception as e:
             error_msg = f"Erreur lors de la génération SPARQL: {str(e)}"
             print(f"{error_msg}")
@@ -121,8 +214,63 @@ class IntelligentEquestrianChatbot:
         if verbose:
             print("ÉTAPE 2: Exécution de la requête sur GraphDB...")
         
+        executed_query = sparql_query
+        results = None
+        problem = None
+        relaxation = None
+        if validation is not None and not validation.valid:
+            # Do not spend a GraphDB round trip on a query that cannot succeed
+            problem = validation.diagnostics()
+            if verbose:
+                print("Requête invalide:")
+                print(problem)
+                print()
+        
         try:
-            results = self.graphdb.query(sparql_query)
+            if problem is None:
+                executed_query, cursor, results = self._execute(sparql_query, verbose)
+                problem = problem_of(results)
+            
+            semantic_match = query_result.get("semantic_match")
+            if problem is not None and semantic_match is not None:
+                # The paraphrase's query does not answer this question: stop serving it
+                self.semantic_cache.forget(semantic_match["question"])
+                self.semantic_cache.forget(question)
+            
+            if problem == EMPTY_RESULT and self.relaxer is not None:
+                # Cheaper than another generation: loosen the query deterministically
+                relaxation = self._relax(sparql_query, verbose)
+                if relaxation is not None:
+                    sparql_query = relaxation.sparql_query
+                    explanation += f" (requête assouplie: {', '.join(relaxation.relaxations)})"
+                    executed_query, cursor = self._executions[sparql_query]
+                    results = relaxation.results
+                    problem = None
+                self._executions = {}
+            
+            if problem is not None and self.repairer is not None:
+                if cached is not None:
+                    self.repairer.forget(question)
+                repair = self._repair(question, sparql_query, problem, verbose)
+                if repair.success:
+                    query_result = repair.query_result
+                    sparql_query = query_result["sparql_query"]
+                    entities_used = query_result["entities_used"]
+                    relations_used = query_result["relations_used"]
+                    explanation = query_result["explanation"]
+                    executed_query, cursor = self._executions[sparql_query]
+                    results = repair.results
+                self._executions = {}
+            
+            if results is None:
+                return {
+                    "success": False,
+                    "error": "Requête SPARQL invalide:\n" + validation.diagnostics(),
+                    "validation_errors": validation.errors,
+                    "question": question,
+                    "sparql_query": sparql_query,
+                    "repair": repair.report() if repair is not None else None
+                }
             
             if not results or 'results' not in results:
                 if verbose:
@@ -134,12 +282,40 @@ class IntelligentEquestrianChatbot:
                     "sparql_query": sparql_query
                 }
             
+            if results.get("error"):
+                raise RuntimeError(results["error"])
+            
+            if self.semantic_cache is not None and "template" not in query_result and problem_of(results) is None:
+                # The query that produced rows (relaxed or repaired) serves the paraphrases
+                self.semantic_cache.store(
+                    question,
+                    dict(query_result, sparql_query=sparql_query, explanation=explanation)
+                )
+            
+            # Rows were cut (a streamed query may have no next page to fetch)
+            truncated = cursor.truncated
+            self.last_cursor = cursor
             bindings = results['results']['bindings']
             results_count = len(bindings)
             
             if verbose:
-                print(f"{results_count} résultat(s) trouvé(s)!\n")
+                if cursor.has_more:
+                    print(f"{results_count} premiers résultats (d'autres existent, tapez 'plus' pour la suite)\n")
+                elif truncated:
+                    print(f"{results_count} premiers résultats (d'autres existent)\n")
+                else:
+                    print(f"{results_count} résultat(s) trouvé(s)!\n")
         
+        except BackendUnavailableError as e:
+            # Fail fast: GraphDB is down, skip the answer LLM
+            return {
+                "success": False,
+                "error": str(e),
+                "backend_unavailable": True,
+                "question": question,
+                "sparql_query": sparql_query
+            }
+            
         except Exception as e:
             error_msg = f"Erreur GraphDB: {str(e)}"
             print(f" {error_msg}")
@@ -154,7 +330,8 @@ class IntelligentEquestrianChatbot:
                 "success": False,
                 "error": error_msg,
                 "question": question,
-                "sparql_query": sparql_query
+                "sparql_query": sparql_query,
+                "repair": repair.report() if repair is not None else None
             }
         
         # ====================================================================
@@ -164,7 +341,7 @@ class IntelligentEquestrianChatbot:
             print("ÉTAPE 3: Construction du contexte...")
         
         try:
-            context = self.context_builder.format_results(bindings, explanation)
+            context = self.context_builder.format_results(bindings, explanation, truncated=truncated)
             
             if verbose:
                 print(f"Contexte créé ({len(context)} caractères)\n")
@@ -190,10 +367,32 @@ class IntelligentEquestrianChatbot:
         if verbose:
             print("ÉTAPE 4: Génération de la réponse (modèle langage)...")
         
+        answer_metrics = None
+        streamed = False
         try:
-            answer = self._generate_answer(question, context, results_count, bindings)
+            if stream:
+                # Show the answer as it is generated
+                if verbose:
+                    print("RÉPONSE FINALE:")
+                    print("=" * 80)
+                answer, answer_metrics = self._generate_answer(
+                    question, context, results_count, bindings, truncated,
+                    on_token=lambda token: print(token, end="", flush=True)
+                )
+                streamed = True
+                print()
+                if verbose:
+                    print("=" * 80)
+                    if answer_metrics["ttft_s"] is not None:
+                        rate = answer_metrics["tokens_per_second"]
+                        print(f"Premier token: {answer_metrics['ttft_s']:.2f}s, "
+                              f"{answer_metrics['tokens']} tokens en {answer_metrics['total_s']:.2f}s"
+                              + (f" ({rate:.1f} tokens/s)" if rate else ""))
+                    print()
+            else:
+                answer, answer_metrics = self._generate_answer(question, context, results_count, bindings, truncated)
             
-            if verbose:
+            if verbose and not stream:
                 print("Réponse générée!\n")
         
         except Exception as e:
@@ -207,7 +406,7 @@ class IntelligentEquestrianChatbot:
         # ====================================================================
         # STEP 5: Display final answer
         # ====================================================================
-        if verbose:
+        if verbose and not streamed:
             print("RÉPONSE FINALE:")
             print("=" * 80)
             print(answer)
@@ -218,16 +417,153 @@ class IntelligentEquestrianChatbot:
             "success": True,
             "question": question,
             "sparql_query": sparql_query,
+            "executed_query": executed_query,
             "entities_used": entities_used,
             "relations_used": relations_used,
             "explanation": explanation,
             "results_count": results_count,
+            "truncated": truncated,
+            "cursor": cursor,
             "context": context,
             "answer": answer,
-            "raw_results": results
+            "answer_metrics": answer_metrics,
+            "raw_results": results,
+            "relaxation": relaxation.relaxations if relaxation is not None else None,
+            "template": query_result.get("template"),
+            "semantic_match": query_result.get("semantic_match"),
+            "repair": repair.report() if repair is not None else None
         }
     
-    def _generate_answer(self, question: str, context: str, results_count: int, bindings: list) -> str:
+    def _execute(self, sparql_query: str, verbose: bool = False):
+        """
+        Reorder and run a query, first page only
+        
+        Args:
+            sparql_query: SPARQL query to run
+            verbose: Show the reordered query
+            
+        Returns:
+            (executed query, cursor for the next pages, first page results)
+        """
+        executed_query = self._optimize(sparql_query, verbose)
+        # Fetch only the first page; the cursor can fetch more on demand
+        cursor = QueryCursor(self.graphdb, executed_query, SPARQL_PAGE_SIZE)
+        return executed_query, cursor, cursor.fetch_next()
+    
+    def _recording_execute(self):
+        """
+        Query runner for the relaxation and repair loops: the executed query
+        and cursor of each candidate are kept in self._executions, keyed by
+        the candidate query
+        """
+        executions = self._executions = {}
+        
+        def execute(candidate: str) -> dict:
+            executed_query, cursor, results = self._execute(candidate)
+            executions[candidate] = (executed_query, cursor)
+            return results
+        
+        return execute
+    
+    def _relax(self, sparql_query: str, verbose: bool):
+        """
+        Run the relaxed variants of a query that returned nothing
+        
+        Args:
+            sparql_query: Query without results
+            verbose: Show the relaxation that recovered rows
+            
+        Returns:
+            Relaxation, or None if no variant returns rows
+        """
+        relaxation = self.relaxer.relax(sparql_query, self._recording_execute())
+        if verbose:
+            if relaxation is None:
+                print("Aucun résultat, même avec la requête assouplie")
+            else:
+                print(f"Requête assouplie ({', '.join(relaxation.relaxations)}): "
+                      f"{relaxation.variants_tried} variante(s), {relaxation.latency_ms:.0f} ms")
+                if SHOW_SPARQL:
+                    print("-" * 80)
+                    for line in relaxation.sparql_query.split('\n'):
+                        print(f"  {line}")
+                    print("-" * 80)
+            print()
+        return relaxation
+    
+    def _repair(self, question: str, sparql_query: str, problem: str, verbose: bool):
+        """
+        Run the bounded repair loop on a query that is invalid, fails on
+        GraphDB or returns nothing
+        
+        Args:
+            question: User's question
+            sparql_query: Failing query
+            problem: Validator diagnostics, GraphDB error or empty result
+            verbose: Show each attempt
+            
+        Returns:
+            RepairOutcome
+        """
+        execute = self._recording_execute()
+        if verbose:
+            print(f"Réparation de la requête ({self.repairer.max_attempts} tentative(s) max, {self.repairer.time_budget:g}s)...")
+        outcome = self.repairer.repair(question, sparql_query, problem, execute)
+        
+        if verbose:
+            for attempt in outcome.attempts:
+                print(f"   Tentative {attempt.attempt}: {attempt.outcome} ({attempt.latency_ms:.0f} ms)")
+            if outcome.budget_exhausted:
+                print("   Budget de temps épuisé")
+            print(" Requête réparée!\n" if outcome.success else " Réparation sans succès\n")
+            if outcome.success and SHOW_SPARQL:
+                print("Requête SPARQL réparée:")
+                print("-" * 80)
+                for line in outcome.query_result["sparql_query"].split('\n'):
+                    print(f"  {line}")
+                print("-" * 80)
+                print()
+        return outcome
+    
+    def _optimize(self, sparql_query: str, verbose: bool) -> str:
+        """
+        Reorder the generated query for execution (the original query is
+        kept if the optimizer is disabled or fails)
+        
+        Args:
+            sparql_query: Generated SPARQL query
+            verbose: Show the reordered query
+            
+        Returns:
+            Query to execute
+        """
+        if self.optimizer is None:
+            return sparql_query
+        
+        try:
+            optimized = self.optimizer.optimize(sparql_query)
+        except Exception as e:
+            print(f"Optimisation de la requête ignorée: {e}")
+            return sparql_query
+        
+        if verbose and SHOW_SPARQL and optimized != sparql_query:
+            print("Requête réordonnée (sélectivité des motifs):")
+            print("-" * 80)
+            for line in optimized.split('\n'):
+                print(f"  {line}")
+            print("-" * 80)
+            print()
+        return optimized
+    
+    def _generate_answer(
+        self,
+        question: str,
+        context: str,
+        results_count: int,
+        bindings: list,
+        truncated: bool = False,
+        on_token: Optional[Callable[[str], None]] = None
+    ):
         """
         Generate natural language answer using LANGUAGE-SPECIALIZED LLM
         
@@ -236,9 +572,13 @@ class IntelligentEquestrianChatbot:
             context: Formatted context from SPARQL results
             results_count: Number of results found
             bindings: Raw SPARQL bindings
+            truncated: More rows exist than the ones in the context
+            on_token: Called with each token when the answer is streamed
             
         Returns:
-            Natural language answer in French
+            (natural language answer in French, metrics): metrics holds
+            ttft_s, total_s, tokens and tokens_per_second when streamed,
+            total_s otherwise
         """
         
         # Enhanced system prompt for French answer generation
@@ -274,18 +614,25 @@ Contexte: Aucune donnée trouvée dans le graphe de connaissances.
 Réponds poliment que tu n'as pas trouvé d'informations pour répondre à cette question.
 Suggère que les données recherchées n'existent peut-être pas encore dans la base."""
         else:
+            found = f"au moins {results_count} résultats, liste tronquée" if truncated else f"{results_count} résultats trouvés"
             user_prompt = f"""Question: {question}
 
-Contexte du graphe de connaissances ({results_count} résultats trouvés):
+Contexte du graphe de connaissances ({found}):
 {context}
 
 Réponds à la question en te basant uniquement sur ce contexte.
 Sois précis, informatif et naturel. Structure ta réponse de manière claire."""
         
         # Generate answer using the LANGUAGE-SPECIALIZED LLM
-        answer = self.answer_llm.generate(user_prompt, system_prompt)
+        if on_token is None:
+            started = time.monotonic()
+            answer = self.answer_llm.generate(user_prompt, system_prompt)
+            return answer, {"total_s": round(time.monotonic() - started, 3)}
         
-        return answer
+        completion = self.answer_llm.generate_stream(user_prompt, system_prompt)
+        for token in completion:
+            on_token(token)
+        return completion.text, completion.metrics()
     
     def chat(self):
         """Interactive chat mode"""
@@ -307,6 +654,7 @@ Sois précis, informatif et naturel. Structure ta réponse de manière claire.""
         print("\nCommandes:")
         print("  • 'quit', 'exit', 'quitter' pour terminer")
         print("  • 'help' pour voir les exemples")
+        print("  • 'plus' pour afficher la suite des résultats de la dernière requête")
         print("="*80)
         
         while True:
@@ -317,6 +665,7 @@ Sois précis, informatif et naturel. Structure ta réponse de manière claire.""
                     continue
                 
                 if question.lower() in ['quit', 'exit', 'quitter', 'bye', 'au revoir']:
+                    self._print_session_stats()
                     print("\n Au revoir!")
                     break
                 
@@ -330,10 +679,15 @@ Sois précis, informatif et naturel. Structure ta réponse de manière claire.""
                     print("  6. Quels entraînements dépendent de quel événement?")
                     continue
                 
+                if question.lower() in ['plus', 'more', 'suite']:
+                    self._show_next_page()
+                    continue
+                
                 # Answer the question
-                self.answer_question(question, verbose=True)
+                self.answer_question(question, verbose=True, stream=STREAM_ANSWERS)
                 
             except KeyboardInterrupt:
+                self._print_session_stats()
                 print("\n\n Au revoir!")
                 break
             except Exception as e:
@@ -341,6 +695,39 @@ Sois précis, informatif et naturel. Structure ta réponse de manière claire.""
                 import traceback
                 traceback.print_exc()
 
+    
+    def _print_session_stats(self):
+        """Share of the questions answered without calling the SPARQL LLM"""
+        if self.router is not None:
+            stats = self.router.stats()
+            if stats["questions"]:
+                print(f"\n Modèles de requêtes: {stats['hits']}/{stats['questions']} questions "
+                      f"({stats['hit_rate']:.0%}) sans appel au LLM SPARQL")
+        
+        if self.semantic_cache is not None:
+            stats = self.semantic_cache.stats()
+            if stats["lookups"]:
+                print(f" Cache sémantique: {stats['hits']}/{stats['lookups']} questions "
+                      f"({stats['hit_rate']:.0%}) reprises d'une question similaire")
+        
+        completion_cache = getattr(self.sparql_llm, "cache", None)
+        if completion_cache is not None:
+            stats = completion_cache.stats()
+            if stats["hits"] + stats["misses"]:
+                print(f" Cache des complétions: {stats['hits']}/{stats['hits'] + stats['misses']} appels LLM évités "
+                      f"({stats['hit_rate']:.0%}), {stats['entries']} complétions sur disque")
+    
+    def _show_next_page(self):
+        """Fetch and display the next page of the last query's results"""
+        if self.last_cursor is None or not self.last_cursor.has_more:
+            print("\n Aucun résultat supplémentaire.")
+            return
+        
+        page = self.last_cursor.fetch_next()
+        print(self.context_builder.format_for_display(page.get('results', {}).get('bindings', [])))
+        if self.last_cursor.has_more:
+            print(" D'autres résultats existent ('plus' pour continuer).")
+
 
 # ============================================================================
 # MAIN EXECUTION
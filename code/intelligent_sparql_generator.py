@@ -7,7 +7,9 @@ Intelligent SPARQL Generator - Equestrian Knowledge Graph
 import json
 import re
 from typing import Dict, Any
-from config import ONTOLOGY_NAMESPACE, get_sparql_prefixes
+from config import ONTOLOGY_NAMESPACE, ENABLE_AGGREGATION_PUSHDOWN, get_sparql_prefixes
+from aggregation_rewrite import push_down_aggregation
+from sparql_rewriter import SPARQLRewriter
 
 class IntelligentSPARQLGenerator:
     """Generates SPARQL queries using LLM intelligence and ontology awareness"""
@@ -21,6 +23,7 @@ class IntelligentSPARQLGenerator:
         """
         self.llm = llm_client
         self.namespace = ONTOLOGY_NAMESPACE
+        self.rewriter = SPARQLRewriter()
         
         # Create detailed ontology summary
         self.ontology_summary = self._create_ontology_summary()
@@ -339,9 +342,55 @@ Participation:
         # Parse response
         result = self._parse_llm_response(llm_response)
         
+        return self._postprocess(question, result)
+    
+    def repair_sparql(self, question: str, sparql_query: str, problem: str) -> Dict[str, Any]:
+        """
+        Ask the LLM to correct a query that was rejected or returned nothing
+        
+        Args:
+            question: User's question in natural language
+            sparql_query: Query to correct
+            problem: What went wrong (validator diagnostics, GraphDB error, ...)
+            
+        Returns:
+            Dict with sparql_query, entities_used, relations_used, explanation
+        """
+        prompt = f"""{self.ontology_summary}
+
+═══════════════════════════════════════════════════════════════
+CORRECTION D'UNE REQUÊTE SPARQL
+═══════════════════════════════════════════════════════════════
+
+Question: "{question}"
+
+Requête générée:
+{sparql_query}
+
+Problèmes détectés:
+{problem}
+
+Corrige la requête en respectant l'ontologie ci-dessus (noms exacts des classes
+et propriétés, directions des relations, préfixes déclarés).
+
+Réponds UNIQUEMENT avec un objet JSON valide, au même format que d'habitude:
+{{"sparql_query": "...", "entities_used": [...], "relations_used": [...], "explanation": "..."}}
+"""
+        result = self._parse_llm_response(self.llm.generate(prompt))
+        return self._postprocess(question, result)
+    
+    def _postprocess(self, question: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Rule-based corrections and aggregation pushdown of a parsed LLM response"""
         # Auto-correct V2 mistakes
         result = self._auto_correct_v2_queries(result)
         
+        # Count / rank in GraphDB instead of returning every row
+        if ENABLE_AGGREGATION_PUSHDOWN:
+            sparql_query, rewrite = push_down_aggregation(question, result["sparql_query"])
+            if rewrite:
+                result["sparql_query"] = sparql_query
+                result["aggregation_rewrite"] = rewrite
+        
         return result
     
     def _build_fewshot_prompt(self, question: str) -> str:
@@ -642,29 +691,16 @@ RÈGLES JSON:
     
     def _auto_correct_v2_queries(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Auto-correct common V2 property mistakes
-        This prevents queries from using old property names
+        Auto-correct common V2 mistakes (old property names, inverted
+        directions, ...) with the rules of sparql_rewriter
+        The names of the rules that fired are returned in rewrite_rules
         """
-        sparql_query = result.get('sparql_query', '')
-        
-        # V2 Event property corrections
-        corrections = [
-            ('horses:hasDate', 'horses:eventDate'),
-            ('horses:hasLocation', 'horses:eventLocation'),
-            ('?horse horses:AssociatedWith ?rider', '?rider horses:AssociatedWith ?horse'),
-            ('?horse horses:isAttachedTo ?sensor', '?sensor horses:isAttachedTo ?horse'),
-            ('horses:hasRanking', 'horses:rank'),
-        ]
-        
-        corrected = False
-        for old, new in corrections:
-            if old in sparql_query:
-                sparql_query = sparql_query.replace(old, new)
-                corrected = True
+        rewritten = self.rewriter.rewrite(result.get('sparql_query', ''))
         
-        if corrected:
-            result['sparql_query'] = sparql_query
+        if rewritten.fired:
+            result['sparql_query'] = rewritten.sparql_query
             result['auto_corrected'] = True
+            result['rewrite_rules'] = rewritten.fired
         
         return result
 
@@ -0,0 +1,231 @@
+# kg_loader.py
+"""
+KG Loader - Parallel chunked bulk loading of the RDF sources into GraphDB
+Streams the files, splits them into N-Triples chunks and uploads the chunks
+concurrently into the ONTOLOGY_GRAPH / INSTANCES_GRAPH named graphs
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from config import (
+    GRAPHDB_ENDPOINT,
+    EMBEDDED_DATA_FILES,
+    ONTOLOGY_GRAPH,
+    INSTANCES_GRAPH,
+    LOADER_CHUNK_SIZE,
+    LOADER_WORKERS
+)
+from graphdb_client import GraphDBClient
+
+try:
+    import rdflib
+    from rdflib import BNode
+    from rdflib.parser import create_input_source
+    from rdflib.plugins.parsers.rdfxml import RDFXMLParser
+    RDFLIB_AVAILABLE = True
+except ImportError:
+    RDFLIB_AVAILABLE = False
+
+
+def target_graph(path: Path) -> Optional[str]:
+    """Named graph receiving a data file (None = default graph)"""
+    graph = ONTOLOGY_GRAPH if path.suffix == ".owl" else INSTANCES_GRAPH
+    return graph or None
+
+
+class _ChunkSink:
+    """
+    Triple sink for the rdflib RDF/XML parser
+
+    Receives triples as the SAX parser produces them and hands over full
+    chunks of N-Triples lines, so a file is never held in memory as a graph.
+    Triples involving blank nodes are kept apart: blank node labels are
+    scoped to one upload request, so they must all travel together.
+    """
+
+    def __init__(self, chunk_size: int, emit: Callable[[List[str]], None]):
+        self.chunk_size = chunk_size
+        self.emit = emit
+        self.lines: List[str] = []
+        self.bnode_lines: List[str] = []
+
+    def add(self, triple):
+        line = " ".join(term.n3() for term in triple) + " .\n"
+        if any(isinstance(term, BNode) for term in triple):
+            self.bnode_lines.append(line)
+            return
+        self.lines.append(line)
+        if len(self.lines) >= self.chunk_size:
+            self.emit(self.lines)
+            self.lines = []
+
+    def bind(self, prefix, namespace, override=True):
+        """Prefixes are irrelevant in N-Triples"""
+
+    def flush(self):
+        """Emit the last partial chunk, then the blank-node chunk"""
+        if self.lines:
+            self.emit(self.lines)
+            self.lines = []
+        if self.bnode_lines:
+            self.emit(self.bnode_lines)
+            self.bnode_lines = []
+
+
+def stream_chunks(path: Path, emit: Callable[[List[str]], None], chunk_size: int = LOADER_CHUNK_SIZE):
+    """
+    Split an RDF file into chunks of N-Triples lines
+
+    RDF/XML (.owl, .rdf) is stream-parsed and each chunk is handed to
+    `emit` as soon as it is full; other formats are parsed with rdflib first.
+
+    Args:
+        path: RDF file
+        emit: Called with each chunk (list of N-Triples lines)
+        chunk_size: Statements per chunk
+    """
+    sink = _ChunkSink(chunk_size, emit)
+
+    fmt = rdflib.util.guess_format(str(path)) or "xml"
+    if fmt == "xml":
+        source = create_input_source(source=str(path), format=fmt)
+        try:
+            RDFXMLParser().parse(source, sink)
+        finally:
+            source.close()
+    else:
+        for triple in rdflib.Graph().parse(str(path), format=fmt):
+            sink.add(triple)
+    sink.flush()
+
+
+class BulkLoader:
+    """Upload RDF files into GraphDB as concurrent N-Triples chunks"""
+
+    def __init__(
+        self,
+        client: Optional[GraphDBClient] = None,
+        chunk_size: int = LOADER_CHUNK_SIZE,
+        workers: int = LOADER_WORKERS
+    ):
+        """
+        Args:
+            client: GraphDB client (a pooled client sized for `workers` by default)
+            chunk_size: Statements per upload request
+            workers: Uploads in flight at once
+        """
+        if not RDFLIB_AVAILABLE:
+            raise ImportError(
+                "kg_loader requires rdflib. "
+                "Install with: pip install rdflib"
+            )
+
+        self.client = client or GraphDBClient(GRAPHDB_ENDPOINT, pool_maxsize=max(workers, 1), enable_cache=False)
+        self.chunk_size = chunk_size
+        self.workers = max(workers, 1)
+
+        self.uploaded = 0
+        self.chunks_done = 0
+        self.failed: List[Tuple[Optional[str], List[str], Exception]] = []
+        self._start = 0.0
+
+    def _upload(self, graph: Optional[str], lines: List[str]) -> int:
+        self.client.add_statements("".join(lines).encode("utf-8"), graph)
+        return len(lines)
+
+    def _report(self, label: str):
+        elapsed = time.time() - self._start
+        rate = self.uploaded / elapsed if elapsed else 0.0
+        print(f"  {label}: {self.chunks_done} chunks, {self.uploaded} triplets ({rate:.0f} triplets/s)")
+
+    def load_file(self, path: Path, graph: Optional[str], executor: ThreadPoolExecutor):
+        """Upload one file, keeping at most 2 x workers chunks pending"""
+        pending: Dict = {}
+
+        def _collect(done):
+            for future in done:
+                chunk = pending.pop(future)
+                try:
+                    self.uploaded += future.result()
+                    self.chunks_done += 1
+                    self._report(path.name)
+                except Exception as e:
+                    print(f"  Chunk de {len(chunk)} triplets en échec: {e}")
+                    self.failed.append((graph, chunk, e))
+
+        def _submit(chunk: List[str]):
+            if len(pending) >= 2 * self.workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+            pending[executor.submit(self._upload, graph, chunk)] = chunk
+
+        stream_chunks(path, _submit, self.chunk_size)
+
+        if pending:
+            done, _ = wait(pending)
+            _collect(done)
+
+    def retry_failed(self):
+        """Upload the failed chunks again, one at a time"""
+        failed, self.failed = self.failed, []
+        for graph, chunk, _ in failed:
+            try:
+                self.uploaded += self._upload(graph, chunk)
+                self.chunks_done += 1
+            except Exception as e:
+                self.failed.append((graph, chunk, e))
+        self._report("reprise")
+
+    def load(self, data_files: List[str], replace: bool = False) -> bool:
+        """
+        Load RDF files into their named graphs
+
+        Args:
+            data_files: RDF files (.owl -> ONTOLOGY_GRAPH, others -> INSTANCES_GRAPH)
+            replace: Clear each target graph before loading it
+
+        Returns:
+            True if every chunk was uploaded
+        """
+        self._start = time.time()
+        targets = [(Path(f), target_graph(Path(f))) for f in data_files]
+
+        if replace:
+            for graph in dict.fromkeys(graph for _, graph in targets):
+                print(f"Vidage du graphe {graph or '(graphe par défaut)'}...")
+                self.client.clear_graph(graph)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for path, graph in targets:
+                print(f"Chargement de {path.name} dans {graph or '(graphe par défaut)'}...")
+                self.load_file(path, graph, executor)
+
+        if self.failed:
+            print(f"{len(self.failed)} chunk(s) en échec, nouvel essai...")
+            self.retry_failed()
+
+        elapsed = time.time() - self._start
+        print(f"\n{self.uploaded} triplets chargés en {elapsed:.2f}s ({self.chunks_done} chunks)")
+        if self.failed:
+            lost = sum(len(chunk) for _, chunk, _ in self.failed)
+            print(f"{len(self.failed)} chunk(s) non chargés ({lost} triplets)")
+            return False
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chargement parallèle des données RDF dans GraphDB")
+    parser.add_argument('files', nargs='*', default=EMBEDDED_DATA_FILES, help="Fichiers RDF (défaut: ontologie + instances de data/)")
+    parser.add_argument('--replace', action='store_true', help="Vider les graphes cibles avant le chargement")
+    parser.add_argument('--chunk-size', type=int, default=LOADER_CHUNK_SIZE, help="Triplets par requête")
+    parser.add_argument('--workers', type=int, default=LOADER_WORKERS, help="Requêtes d'upload en parallèle")
+    args = parser.parse_args()
+
+    loader = BulkLoader(chunk_size=args.chunk_size, workers=args.workers)
+    ok = loader.load(args.files, replace=args.replace)
+    sys.exit(0 if ok else 1)
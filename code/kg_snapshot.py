@@ -0,0 +1,204 @@
+# kg_snapshot.py
+"""
+KG Snapshot - Pre-parsed binary snapshot of the embedded knowledge graph
+Avoids re-parsing the RDF/XML sources on every start of the embedded backend
+
+File layout:
+    MAGIC (8 bytes) | SHA-256 of the source files and graph names (32 bytes)
+    | header length (8 bytes, little endian) | UTF-8 JSON header (graphs, terms)
+    | quads as uint32 (graph, subject, predicate, object) term indexes
+"""
+
+import hashlib
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import List, Optional
+from config import EMBEDDED_DATA_FILES, EMBEDDED_SNAPSHOT_PATH, ONTOLOGY_GRAPH, INSTANCES_GRAPH
+
+try:
+    import rdflib
+    from rdflib import BNode, Literal, URIRef
+    RDFLIB_AVAILABLE = True
+except ImportError:
+    RDFLIB_AVAILABLE = False
+
+MAGIC = b"KGSNAP02"
+_PREFIX = struct.Struct("<8s32sQ")
+
+
+def source_fingerprint(data_files: List[str]) -> bytes:
+    """SHA-256 over the graph names and the names and contents of the source files"""
+    digest = hashlib.sha256()
+    # The sources are loaded into these graphs: changing them invalidates the snapshot
+    digest.update(f"{ONTOLOGY_GRAPH}\n{INSTANCES_GRAPH}\n".encode("utf-8"))
+    for path in data_files:
+        path = Path(path)
+        digest.update(path.name.encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.digest()
+
+
+def _encode_term(term) -> tuple:
+    if isinstance(term, URIRef):
+        return ("u", str(term))
+    if isinstance(term, BNode):
+        return ("b", str(term))
+    return (
+        "l",
+        str(term),
+        str(term.datatype) if term.datatype else None,
+        term.language
+    )
+
+
+def _decode_term(encoded: list):
+    kind = encoded[0]
+    if kind == "u":
+        return URIRef(encoded[1])
+    if kind == "b":
+        return BNode(encoded[1])
+    return Literal(
+        encoded[1],
+        lang=encoded[3],
+        datatype=URIRef(encoded[2]) if encoded[2] else None
+    )
+
+
+def write_snapshot(dataset, data_files: List[str], snapshot_path: str = EMBEDDED_SNAPSHOT_PATH):
+    """
+    Serialize a loaded dataset to a snapshot file
+
+    Args:
+        dataset: rdflib Dataset holding the parsed sources
+        data_files: Source files the dataset was built from
+        snapshot_path: Output file
+    """
+    term_ids = {}
+    terms = []
+    quads = array("I")
+
+    def _term_id(term) -> int:
+        key = _encode_term(term)
+        if key not in term_ids:
+            term_ids[key] = len(terms)
+            terms.append(key)
+        return term_ids[key]
+
+    graphs = []
+    for graph in dataset.graphs():
+        if not len(graph):
+            continue
+        graph_index = len(graphs)
+        graphs.append(str(graph.identifier))
+        for s, p, o in graph:
+            quads.extend((graph_index, _term_id(s), _term_id(p), _term_id(o)))
+
+    header = json.dumps(
+        {"graphs": graphs, "terms": terms, "itemsize": quads.itemsize},
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+    if sys.byteorder != "little":
+        quads.byteswap()
+
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = snapshot_path.with_suffix(snapshot_path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, source_fingerprint(data_files), len(header)))
+        f.write(header)
+        f.write(quads.tobytes())
+    tmp_path.replace(snapshot_path)
+
+
+def load_snapshot(data_files: List[str], snapshot_path: str = EMBEDDED_SNAPSHOT_PATH):
+    """
+    Memory-map a snapshot and rebuild the dataset from it
+
+    Args:
+        data_files: Source files the snapshot must match
+        snapshot_path: Snapshot file
+
+    Returns:
+        rdflib Dataset, or None if the snapshot is missing or stale
+    """
+    snapshot_path = Path(snapshot_path)
+    if not snapshot_path.exists():
+        return None
+
+    with open(snapshot_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if len(mm) < _PREFIX.size:
+                return None
+            magic, fingerprint, header_length = _PREFIX.unpack_from(mm, 0)
+            if magic != MAGIC or fingerprint != source_fingerprint(data_files):
+                return None
+
+            header_end = _PREFIX.size + header_length
+            try:
+                header = json.loads(mm[_PREFIX.size:header_end].decode("utf-8"))
+            except ValueError:
+                return None
+            if header.get("itemsize") != 4 or sys.byteorder != "little":
+                return None
+
+            terms = [_decode_term(encoded) for encoded in header["terms"]]
+            dataset = rdflib.Dataset(default_union=True)
+            graphs = [dataset.graph(URIRef(name)) for name in header["graphs"]]
+
+            with memoryview(mm) as view, view[header_end:] as body, body.cast("I") as quads:
+                dataset.addN(
+                    (terms[quads[i + 1]], terms[quads[i + 2]], terms[quads[i + 3]], graphs[quads[i]])
+                    for i in range(0, len(quads), 4)
+                )
+
+    return dataset
+
+
+def is_fresh(data_files: List[str] = EMBEDDED_DATA_FILES, snapshot_path: str = EMBEDDED_SNAPSHOT_PATH) -> bool:
+    """Check that a snapshot exists and matches the current source files"""
+    snapshot_path = Path(snapshot_path)
+    if not snapshot_path.exists():
+        return False
+    with open(snapshot_path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+    if len(prefix) < _PREFIX.size:
+        return False
+    magic, fingerprint, _ = _PREFIX.unpack(prefix)
+    return magic == MAGIC and fingerprint == source_fingerprint(data_files)
+
+
+def build_snapshot(
+    data_files: List[str] = EMBEDDED_DATA_FILES,
+    snapshot_path: str = EMBEDDED_SNAPSHOT_PATH
+) -> Optional[str]:
+    """Parse the sources with the embedded backend and write their snapshot"""
+    from embedded_store import EmbeddedGraphDBClient
+
+    client = EmbeddedGraphDBClient(data_files, use_snapshot=False)
+    write_snapshot(client.dataset, data_files, snapshot_path)
+    return str(snapshot_path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Snapshot binaire du graphe de connaissances embarqué")
+    parser.add_argument('--check', action='store_true', help="Vérifier seulement si le snapshot est à jour")
+    args = parser.parse_args()
+
+    if args.check:
+        fresh = is_fresh()
+        print(f"Snapshot {'à jour' if fresh else 'absent ou obsolète'}: {EMBEDDED_SNAPSHOT_PATH}")
+        sys.exit(0 if fresh else 1)
+
+    start = time.time()
+    path = build_snapshot()
+    print(f"Snapshot écrit: {path} ({Path(path).stat().st_size} octets, {time.time() - start:.2f}s)")
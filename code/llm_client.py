@@ -2,11 +2,15 @@
 """
 LLM Client - Handles communication with Language Models
 Updated to support multiple specialized LLMs for different tasks
+Clients of the same endpoint share one pooled keep-alive HTTP session
+Deterministic completions are served from the persistent completion cache
 """
 
-import requests
+import json
+import threading
 import time
-from typing import Optional
+import requests
+from typing import Any, Dict, Iterator, List, Optional
 from config import (
     LOCAL_LLM_ENDPOINT,
     LOCAL_LLM_MODEL,
@@ -15,8 +19,128 @@ from config import (
     LLM_TEMPERATURE,
     LLM_MAX_TOKENS,
     REQUEST_TIMEOUT,
-    MAX_RETRIES
+    CONNECT_TIMEOUT,
+    LLM_POOL_MAXSIZE,
+    LLM_POOL_BLOCK
 )
+from graphdb_client import create_pooled_session
+from completion_cache import get_completion_cache
+from resilience import call_with_retries, BackendUnavailableError, TransientError
+
+# Default system prompts of the specialized clients (shared with async_llm_client)
+SPARQL_SYSTEM_PROMPT = """You are an expert in generating SPARQL queries.
+You generate valid, syntactically correct SPARQL queries.
+You respond ONLY with valid JSON containing the SPARQL query.
+You are precise and follow instructions exactly."""
+
+ANSWER_SYSTEM_PROMPT = """Tu es un assistant expert et bienveillant.
+Tu réponds en français de manière claire, naturelle et engageante.
+Tu es précis et informatif tout en restant accessible."""
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_llm_session(endpoint: str) -> requests.Session:
+    """
+    Pooled keep-alive session of an LLM endpoint (created on first use)
+    
+    Args:
+        endpoint: API endpoint URL
+        
+    Returns:
+        requests.Session shared by every client of the endpoint
+    """
+    with _sessions_lock:
+        session = _sessions.get(endpoint)
+        if session is None:
+            session = create_pooled_session(
+                pool_connections=1,
+                pool_maxsize=LLM_POOL_MAXSIZE,
+                pool_block=LLM_POOL_BLOCK
+            )
+            _sessions[endpoint] = session
+        return session
+
+
+def close_llm_sessions():
+    """Close the pooled connections of every LLM endpoint"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+class CompletionStream:
+    """
+    Tokens of a streamed completion (OpenAI-compatible server-sent events),
+    with time-to-first-token and generation rate once consumed
+    """
+    
+    def __init__(self, response: requests.Response, started: float):
+        """
+        Args:
+            response: Streaming HTTP response of /chat/completions
+            started: time.monotonic() when the request was sent
+        """
+        self.response = response
+        self.started = started
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.parts: List[str] = []
+        self.usage_tokens: Optional[int] = None  # completion_tokens, when the server reports usage
+    
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for line in self.response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue  # Keep-alive comments and blank separators
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                if chunk.get("usage"):
+                    self.usage_tokens = chunk["usage"].get("completion_tokens", self.usage_tokens)
+                for choice in chunk.get("choices", []):
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if self.first_token_at is None:
+                            self.first_token_at = time.monotonic()
+                        self.parts.append(content)
+                        yield content
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"LLM stream interrupted: {str(e)}")
+        finally:
+            self.finished_at = time.monotonic()
+            self.response.close()
+    
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+    
+    @property
+    def tokens(self) -> int:
+        # One content delta is one token on llama.cpp / LM Studio / vLLM
+        return self.usage_tokens or len(self.parts)
+    
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns:
+            ttft_s (time to first token), total_s, tokens and tokens_per_second
+            (generation rate after the first token)
+        """
+        finished = self.finished_at or time.monotonic()
+        ttft = self.first_token_at - self.started if self.first_token_at is not None else None
+        generating = finished - self.first_token_at if self.first_token_at is not None else 0.0
+        return {
+            "ttft_s": round(ttft, 3) if ttft is not None else None,
+            "total_s": round(finished - self.started, 3),
+            "tokens": self.tokens,
+            "tokens_per_second": round((self.tokens - 1) / generating, 1) if generating > 0 and self.tokens > 1 else None
+        }
 
 
 class LLMClient:
@@ -42,6 +166,8 @@ class LLMClient:
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.session = get_llm_session(endpoint)
+        self.cache = get_completion_cache()
     
     def generate(
         self,
@@ -60,8 +186,65 @@ class LLMClient:
             max_tokens: Override default max_tokens
             
         Returns:
-            Generated text
+            Generated text (from the completion cache for zero-temperature calls
+            already made with the same model, messages and max_tokens)
+        
+        Raises:
+            BackendUnavailableError: LLM server unreachable or circuit open
+        """
+        payload = self._payload(prompt, system_prompt, temperature, max_tokens, stream=False)
+        if self.cache is not None:
+            cached = self.cache.get(payload)
+            if cached is not None:
+                return cached
+        
+        response = self._post(payload)
+        
+        try:
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            raise Exception(f"LLM request failed: {str(e)}")
+        
+        if self.cache is not None:
+            self.cache.put(payload, content)
+        return content
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> CompletionStream:
+        """
+        Generate text from prompt, token by token
+        
+        Args:
+            prompt: User prompt
+            system_prompt: Optional system prompt
+            temperature: Override default temperature
+            max_tokens: Override default max_tokens
+            
+        Returns:
+            CompletionStream: iterate it for the tokens, then read text / metrics()
+        
+        Raises:
+            BackendUnavailableError: LLM server unreachable or circuit open
         """
+        started = time.monotonic()
+        response = self._post(self._payload(prompt, system_prompt, temperature, max_tokens, stream=True))
+        return CompletionStream(response, started)
+    
+    def _payload(
+        self,
+        prompt: str,
+        system_prompt: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool
+    ) -> Dict[str, Any]:
+        """Body of a chat completion request"""
         # Use provided values or defaults
         temp = temperature if temperature is not None else self.temperature
         tokens = max_tokens if max_tokens is not None else self.max_tokens
@@ -72,41 +255,51 @@ class LLMClient:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
         
-        # Make request with retries
-        for attempt in range(MAX_RETRIES):
-            try:
-                response = requests.post(
-                    f"{self.endpoint}/chat/completions",
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": temp,
-                        "max_tokens": tokens,
-                        "stream": False
-                    },
-                    timeout=REQUEST_TIMEOUT
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                return result["choices"][0]["message"]["content"]
-            
-            except requests.exceptions.Timeout:
-                if attempt < MAX_RETRIES - 1:
-                    print(f"Timeout, retry {attempt + 1}/{MAX_RETRIES}...")
-                    time.sleep(2)
-                else:
-                    raise Exception("LLM request timed out after retries")
-            
-            except requests.exceptions.RequestException as e:
-                if attempt < MAX_RETRIES - 1:
-                    print(f"Request error, retry {attempt + 1}/{MAX_RETRIES}...")
-                    time.sleep(2)
-                else:
-                    raise Exception(f"LLM request failed: {str(e)}")
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temp,
+            "max_tokens": tokens,
+            "stream": stream
+        }
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+    
+    def _post(self, payload: Dict[str, Any]) -> requests.Response:
+        """Send a chat completion request (retries only until the response starts)"""
+        stream = payload["stream"]
+        
+        def _send():
+            response = self.session.post(
+                f"{self.endpoint}/chat/completions",
+                json=payload,
+                timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT),
+                stream=stream
+            )
+            if response.status_code >= 500 or response.status_code == 429:
+                response.close()
+                raise TransientError(f"HTTP {response.status_code}")
+            return response
+        
+        # Make request through the circuit breaker (jittered retries, shared budget)
+        try:
+            response = call_with_retries(
+                self.endpoint,
+                _send,
+                retryable=(requests.exceptions.ConnectionError, requests.exceptions.Timeout, TransientError),
+                slow=(requests.exceptions.ReadTimeout,)
+            )
+        except requests.exceptions.ReadTimeout:
+            # The server is up, the completion is too long: a request error, not an outage
+            raise Exception("LLM request timed out after retries")
         
-        raise Exception("Failed to generate response")
+        try:
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            response.close()
+            raise Exception(f"LLM request failed: {str(e)}")
+        return response
 
 
 class SPARQLLLMClient(LLMClient):
@@ -146,10 +339,7 @@ class SPARQLLLMClient(LLMClient):
         
         # Add SPARQL-specific system context if not provided
         if not system_prompt:
-            system_prompt = """You are an expert in generating SPARQL queries.
-You generate valid, syntactically correct SPARQL queries.
-You respond ONLY with valid JSON containing the SPARQL query.
-You are precise and follow instructions exactly."""
+            system_prompt = SPARQL_SYSTEM_PROMPT
         
         return super().generate(prompt, system_prompt, temperature, max_tokens)
 
@@ -185,17 +375,33 @@ class AnswerLLMClient(LLMClient):
         
         Uses slightly higher temperature for more natural, varied responses
         """
+        system_prompt, temperature = self._answer_defaults(system_prompt, temperature)
+        return super().generate(prompt, system_prompt, temperature, max_tokens)
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> CompletionStream:
+        """
+        Stream a natural language answer in French (same defaults as generate)
+        """
+        system_prompt, temperature = self._answer_defaults(system_prompt, temperature)
+        return super().generate_stream(prompt, system_prompt, temperature, max_tokens)
+    
+    @staticmethod
+    def _answer_defaults(system_prompt: str, temperature: Optional[float]):
         # Use moderate temperature for answers (unless explicitly overridden)
         if temperature is None:
             temperature = 0.3
         
         # Add French-specific system context if not provided
         if not system_prompt:
-            system_prompt = """Tu es un assistant expert et bienveillant.
-Tu réponds en français de manière claire, naturelle et engageante.
-Tu es précis et informatif tout en restant accessible."""
+            system_prompt = ANSWER_SYSTEM_PROMPT
         
-        return super().generate(prompt, system_prompt, temperature, max_tokens)
+        return system_prompt, temperature
 
 
 # Legacy class for backward compatibility
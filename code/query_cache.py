@@ -0,0 +1,176 @@
+# query_cache.py
+"""
+Query Cache - SPARQL result cache in front of GraphDBClient.query
+Keys are normalized queries; entries expire after a TTL, are evicted LRU
+and are all dropped when the repository changes
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+from config import CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_EPOCH_CHECK_INTERVAL
+from sparql_tokenizer import normalize_query, SPARQLSyntaxError
+from sparql_results import BindingsView
+
+
+def rename_result_variables(result: Dict[str, Any], mapping: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Rename the variables of a query result
+
+    Args:
+        result: Result dict as returned by GraphDBClient.query
+        mapping: Old variable name -> new variable name
+
+    Returns:
+        New result dict (binding values are shared, not copied)
+    """
+    renamed = dict(result)
+    if "head" in result and "vars" in result["head"]:
+        renamed["head"] = dict(result["head"])
+        renamed["head"]["vars"] = [mapping.get(var, var) for var in result["head"]["vars"]]
+
+    if "results" in result:
+        bindings = result["results"].get("bindings", [])
+        if isinstance(bindings, BindingsView):
+            bindings = bindings.table.rename(mapping).bindings()
+        else:
+            bindings = [
+                {mapping.get(var, var): value for var, value in binding.items()}
+                for binding in bindings
+            ]
+        renamed["results"] = dict(result["results"])
+        renamed["results"]["bindings"] = bindings
+
+    return renamed
+
+
+class QueryCache:
+    """TTL + LRU cache of SPARQL results with repository-epoch invalidation"""
+
+    def __init__(
+        self,
+        ttl: float = CACHE_TTL,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        epoch_fn: Optional[Callable[[], Any]] = None,
+        epoch_check_interval: float = CACHE_EPOCH_CHECK_INTERVAL
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of cached results (LRU eviction)
+            epoch_fn: Cheap callable returning the repository "epoch"
+                (e.g. its statement count); a new value clears the cache
+            epoch_check_interval: Minimum seconds between two epoch checks
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.epoch_fn = epoch_fn
+        self.epoch_check_interval = epoch_check_interval
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = None
+        self._last_epoch_check = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(sparql_query: str) -> Tuple[Optional[str], Dict[str, str]]:
+        """Normalized key and variable mapping (key is None if the query cannot be tokenized)"""
+        try:
+            return normalize_query(sparql_query)
+        except SPARQLSyntaxError:
+            return None, {}
+
+    def _check_epoch(self):
+        """
+        Drop every entry if the repository changed since the last check
+
+        The epoch is read (a request to GraphDB) without holding the lock,
+        so lookups never wait on the network; one caller per interval does
+        the check.
+        """
+        if self.epoch_fn is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_epoch_check < self.epoch_check_interval:
+                return
+            self._last_epoch_check = now
+
+        epoch = self.epoch_fn()
+        with self._lock:
+            if epoch is None or epoch != self._epoch:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+            self._epoch = epoch
+
+    def get(self, sparql_query: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a query
+
+        Args:
+            sparql_query: SPARQL query string
+
+        Returns:
+            Cached result using the caller's variable names, or None
+        """
+        key, variables = self.make_key(sparql_query)
+        if key is None:
+            return None
+
+        self._check_epoch()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[1]
+
+        canonical_to_caller = {canonical: name for name, canonical in variables.items()}
+        return rename_result_variables(result, canonical_to_caller)
+
+    def put(self, sparql_query: str, result: Dict[str, Any]):
+        """
+        Store a successful query result
+
+        Args:
+            sparql_query: SPARQL query string
+            result: Result dict as returned by GraphDBClient.query
+        """
+        key, variables = self.make_key(sparql_query)
+        if key is None:
+            return
+
+        canonical_result = rename_result_variables(result, variables)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), canonical_result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations
+        }
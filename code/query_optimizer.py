@@ -0,0 +1,372 @@
+# query_optimizer.py
+"""
+Query Optimizer - Reorder the triple patterns of generated SPARQL queries
+Patterns are joined most selective first, using per-predicate and per-class
+cardinalities of the repository, and each FILTER is moved right after the
+pattern that binds its last variable
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from config import STATS_REFRESH_INTERVAL
+from resilience import BackendUnavailableError
+from graph_scope import RDF_TYPE
+from sparql_ast import (
+    parse_query,
+    GroupPattern,
+    TriplePattern,
+    Filter,
+    Union,
+    Optional_,
+    NamedGroup,
+    Minus,
+    SubSelect,
+    Term
+)
+from sparql_tokenizer import is_keyword, IRI, PNAME, NAME, VAR, SPARQLSyntaxError
+
+# Estimated fraction of rows kept by a FILTER
+_FILTER_SELECTIVITY = 0.5
+# Estimated fraction of rows kept per bound end of a pattern without statistics
+_BOUND_SELECTIVITY = 0.01
+
+_PREDICATE_STATS_QUERY = """
+SELECT ?p (COUNT(*) AS ?n) (COUNT(DISTINCT ?s) AS ?subjects) (COUNT(DISTINCT ?o) AS ?objects)
+WHERE { ?s ?p ?o }
+GROUP BY ?p
+"""
+
+_CLASS_STATS_QUERY = """
+SELECT ?c (COUNT(?s) AS ?n)
+WHERE { ?s a ?c }
+GROUP BY ?c
+"""
+
+
+def _int(binding: Dict, name: str) -> int:
+    try:
+        return int(binding[name]["value"])
+    except (KeyError, ValueError):
+        return 0
+
+
+class GraphStatistics:
+    """Cardinalities of the repository, recomputed every refresh_interval seconds"""
+
+    def __init__(self, client, refresh_interval: float = STATS_REFRESH_INTERVAL):
+        """
+        Args:
+            client: GraphDB client (or embedded store) the queries run on
+            refresh_interval: Seconds before the statistics are recomputed
+        """
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.predicates: Dict[str, Tuple[int, int, int]] = {}  # IRI -> (triples, subjects, objects)
+        self.classes: Dict[str, int] = {}                      # IRI -> instances
+        self.total = 0
+        self.computed_at: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def compute(self):
+        """
+        Run the statistics queries (two aggregate scans of the repository)
+
+        Raises:
+            BackendUnavailableError: GraphDB unreachable
+        """
+        predicates = {}
+        for binding in self.client.query(_PREDICATE_STATS_QUERY).get("results", {}).get("bindings", []):
+            if "p" in binding:
+                predicates[binding["p"]["value"]] = (
+                    _int(binding, "n"), _int(binding, "subjects"), _int(binding, "objects")
+                )
+        classes = {}
+        for binding in self.client.query(_CLASS_STATS_QUERY).get("results", {}).get("bindings", []):
+            if "c" in binding:
+                classes[binding["c"]["value"]] = _int(binding, "n")
+
+        with self._lock:
+            self.predicates = predicates
+            self.classes = classes
+            self.total = sum(n for n, _, _ in predicates.values())
+            self.computed_at = time.monotonic()
+
+    def ensure_fresh(self) -> bool:
+        """
+        Compute the statistics on first use, then refresh them in the
+        background once they are older than refresh_interval
+
+        Returns:
+            True if statistics are available
+        """
+        if self.computed_at is None:
+            try:
+                self.compute()
+            except BackendUnavailableError:
+                return False
+            return self.total > 0
+
+        stale = self.refresh_interval > 0 and time.monotonic() - self.computed_at > self.refresh_interval
+        with self._lock:
+            if not stale or self._refreshing:
+                return self.total > 0
+            self._refreshing = True
+
+        def _refresh():
+            try:
+                self.compute()
+            except Exception as e:
+                print(f"Rafraîchissement des statistiques impossible: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=_refresh, name="graph-statistics", daemon=True).start()
+        return self.total > 0
+
+
+class QueryOptimizer:
+    """Selectivity-based join ordering and FILTER placement"""
+
+    def __init__(self, client=None, statistics: Optional[GraphStatistics] = None):
+        """
+        Args:
+            client: GraphDB client used to compute the statistics
+            statistics: Precomputed statistics (default: computed from client)
+        """
+        self.statistics = statistics or GraphStatistics(client)
+        self._prefixes: Dict[str, str] = {}
+
+    def optimize(self, sparql_query: str) -> str:
+        """
+        Reorder a query for execution
+
+        Only the order of triple patterns inside a basic graph pattern and the
+        position of FILTERs inside their group change, so the results are the
+        same as the original query's.
+
+        Args:
+            sparql_query: SPARQL query string
+
+        Returns:
+            Optimized query, or the query unchanged if it cannot be parsed,
+            needs no reordering or no statistics are available
+        """
+        try:
+            query = parse_query(sparql_query)
+        except SPARQLSyntaxError:
+            return sparql_query
+        if not self.statistics.ensure_fresh():
+            return sparql_query
+
+        self._prefixes = query.prefix_map()
+        changed = self._optimize_group(query.where, set())
+        return query.to_string() if changed else sparql_query
+
+    # -- cardinality estimation -------------------------------------------
+
+    def _iri(self, token) -> Optional[str]:
+        if token.kind == IRI:
+            return token.value[1:-1]
+        if token.kind == PNAME:
+            prefix, _, local = token.value.partition(":")
+            namespace = self._prefixes.get(prefix + ":")
+            return namespace + local if namespace is not None else None
+        if token.kind == NAME and token.value == "a":
+            return RDF_TYPE
+        return None
+
+    @staticmethod
+    def _is_bound(term: Term, bound: Set[str]) -> bool:
+        return term[0].kind != VAR or term[0].value[1:] in bound
+
+    def estimate(self, pattern: TriplePattern, bound: Set[str]) -> float:
+        """
+        Estimated number of matches of a pattern once the variables in
+        bound have values
+
+        Args:
+            pattern: Triple pattern
+            bound: Names of the variables already bound
+
+        Returns:
+            Estimated cardinality
+        """
+        stats = self.statistics
+        subject_bound = self._is_bound(pattern.subject, bound)
+        object_bound = self._is_bound(pattern.object, bound)
+        predicate = None if pattern.is_path else self._iri(pattern.predicate[0])
+
+        if predicate is None:
+            # Variable predicate or property path: no per-predicate statistics
+            if pattern.is_path:
+                counts = [stats.predicates.get(self._iri(token), (0, 0, 0))[0] for token in pattern.predicate]
+                cardinality = float(max(counts) or stats.total)
+            else:
+                cardinality = float(stats.total)
+            for is_bound in (subject_bound, object_bound):
+                if is_bound:
+                    cardinality *= _BOUND_SELECTIVITY
+            return cardinality
+
+        if predicate == RDF_TYPE and pattern.object[0].kind != VAR:
+            cardinality = float(stats.classes.get(self._iri(pattern.object[0]), 0))
+            return min(cardinality, 1.0) if subject_bound else cardinality
+
+        triples, subjects, objects = stats.predicates.get(predicate, (0, 0, 0))
+        cardinality = float(triples)
+        if subject_bound:
+            cardinality /= max(subjects, 1)
+        if object_bound:
+            cardinality /= max(objects, 1)
+        return cardinality
+
+    # -- rewriting ----------------------------------------------------------
+
+    def _order_triples(
+        self,
+        triples: List[TriplePattern],
+        bound: Set[str],
+        filters: List[Filter]
+    ) -> List[TriplePattern]:
+        """
+        Greedy join order: repeatedly take the cheapest pattern connected to
+        what is already bound (original position breaks ties)
+        """
+        remaining = list(triples)
+        ordered = []
+        bound = set(bound)
+        while remaining:
+            def cost(pattern):
+                variables = pattern.variables()
+                connected = not bound or not variables or bool(variables & bound)
+                estimate = self.estimate(pattern, bound)
+                # Patterns that complete a FILTER let it prune right away
+                newly_bound = bound | variables
+                for constraint in filters:
+                    names = constraint.variables()
+                    if names and not names <= bound and names <= newly_bound:
+                        estimate *= _FILTER_SELECTIVITY
+                return (not connected, estimate, triples.index(pattern))
+
+            best = min(remaining, key=cost)
+            remaining.remove(best)
+            ordered.append(best)
+            bound |= best.variables()
+        return ordered
+
+    def _optimize_group(self, group: GroupPattern, outer_bound: Set[str]) -> bool:
+        """
+        Optimize a group and the groups nested in it
+
+        Args:
+            group: Group graph pattern (modified in place)
+            outer_bound: Variables bound by the enclosing patterns
+
+        Returns:
+            True if anything moved
+        """
+        original = list(group.elements)
+
+        # A FILTER applies to its whole group wherever it is written: take them
+        # out, then put each one back as soon as its variables are bound
+        filters = [element for element in original if isinstance(element, Filter)]
+        elements = []
+        run: List[TriplePattern] = []
+        bound = set(outer_bound)
+        for element in original + [None]:
+            if isinstance(element, Filter):
+                continue
+            if isinstance(element, TriplePattern):
+                run.append(element)
+                continue
+            if run:
+                run = self._order_triples(run, bound, filters)
+                elements.extend(run)
+                for pattern in run:
+                    bound |= pattern.variables()
+                run = []
+            if element is not None:
+                elements.append(element)
+                bound |= element.bound_variables()
+
+        group.elements = self._place_filters(elements, filters, outer_bound)
+        changed = [id(element) for element in group.elements] != [id(element) for element in original]
+
+        # Nested groups: OPTIONAL / UNION / GRAPH branches see the variables bound before them
+        bound = set(outer_bound)
+        for element in group.elements:
+            if isinstance(element, GroupPattern):
+                changed |= self._optimize_group(element, bound)
+            elif isinstance(element, Union):
+                for branch in element.groups:
+                    changed |= self._optimize_group(branch, bound)
+            elif isinstance(element, (Optional_, NamedGroup)) and not isinstance(element, Minus):
+                changed |= self._optimize_group(element.group, bound)
+            elif isinstance(element, (Minus, SubSelect)):
+                inner = element.group if isinstance(element, Minus) else element.query.where
+                changed |= self._optimize_group(inner, set())
+            bound |= element.bound_variables()
+        return changed
+
+    @staticmethod
+    def _place_filters(elements: list, filters: List[Filter], outer_bound: Set[str]) -> list:
+        """Insert each FILTER after the element that binds its last variable"""
+        if not filters:
+            return elements
+
+        certainly_bound = set(outer_bound)
+        for element in elements:
+            certainly_bound |= element.bound_variables()
+
+        placed = []
+        pending = []
+        for constraint in filters:
+            names = constraint.variables()
+            uses_exists = any(is_keyword(token, "EXISTS") for token in constraint.expression)
+            if uses_exists or not names <= certainly_bound:
+                # Correlated or depends on optional values: evaluate last
+                pending.append(constraint)
+            else:
+                placed.append(constraint)
+
+        result = []
+        bound = set(outer_bound)
+        for constraint in [c for c in placed if c.variables() <= bound]:
+            result.append(constraint)
+        for element in elements:
+            result.append(element)
+            before = set(bound)
+            bound |= element.bound_variables()
+            for constraint in placed:
+                names = constraint.variables()
+                if names <= bound and not names <= before:
+                    result.append(constraint)
+        return result + pending
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from graphdb_client import get_graphdb_client
+
+    parser = argparse.ArgumentParser(description="Réordonne une requête SPARQL selon la sélectivité des motifs")
+    parser.add_argument('file', nargs='?', help="Fichier contenant la requête (défaut: entrée standard)")
+    parser.add_argument('--stats', action='store_true', help="Afficher les statistiques du repository")
+    args = parser.parse_args()
+
+    optimizer = QueryOptimizer(get_graphdb_client())
+    if not optimizer.statistics.ensure_fresh():
+        print("Statistiques indisponibles (GraphDB injoignable ou repository vide)")
+        sys.exit(1)
+
+    if args.stats:
+        statistics = optimizer.statistics
+        print(f"{statistics.total} triplets, {len(statistics.predicates)} prédicats, {len(statistics.classes)} classes")
+        for iri, (triples, subjects, objects) in sorted(statistics.predicates.items(), key=lambda item: -item[1][0]):
+            print(f"  {triples:>8}  {subjects:>8} sujets  {objects:>8} objets  {iri}")
+
+    text = open(args.file, encoding="utf-8").read() if args.file else sys.stdin.read()
+    print(optimizer.optimize(text))
@@ -0,0 +1,318 @@
+# query_relaxation.py
+"""
+Query Relaxation - Deterministic loosening of generated queries that return nothing
+Exact literal matches become case- and accent-insensitive, FILTERs are
+dropped and attribute patterns become OPTIONAL; the relaxed variants run
+concurrently and the least relaxed one returning rows wins, without
+another LLM generation
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Set
+from config import RELAXATION_MAX_VARIANTS, REQUEST_TIMEOUT
+from graph_scope import RDF_TYPE
+from query_repair import problem_of
+from sparql_ast import (
+    parse_query,
+    iter_groups,
+    make_var,
+    Query,
+    GroupPattern,
+    TriplePattern,
+    Filter,
+    Bind,
+    Raw,
+    Union,
+    Optional_
+)
+from sparql_tokenizer import tokenize, IRI, PNAME, NAME, VAR, STRING, LANGTAG, SPARQLSyntaxError
+
+# Relaxations, from the least to the most permissive (each variant adds the next one)
+FUZZY_LITERALS = "fuzzy-literals"            # hasName "Dakota" -> REGEX(STR(?v), "^\\s*d[aàâä]k[oô]t[aàâä]\\s*$", "i")
+DROP_FILTERS = "drop-filters"                # FILTER(...) removed
+OPTIONAL_ATTRIBUTES = "optional-attributes"  # ?h hasAge ?age -> OPTIONAL { ?h hasAge ?age }
+RELAXATIONS = (FUZZY_LITERALS, DROP_FILTERS, OPTIONAL_ATTRIBUTES)
+
+Variant = namedtuple("Variant", ["relaxations", "sparql_query"])
+Relaxation = namedtuple("Relaxation", ["relaxations", "sparql_query", "results", "latency_ms", "variants_tried"])
+
+_ACCENTS = {
+    "a": "aàâäáã", "c": "cç", "e": "eéèêë", "i": "iîïí", "n": "nñ",
+    "o": "oôöóò", "u": "uùûüú", "y": "yÿ"
+}
+_XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _literal_regex(value: str) -> str:
+    """Anchored regex matching value whatever its case, accents and surrounding spaces"""
+    parts = []
+    for char in _fold(value.strip()):
+        if char in _ACCENTS:
+            letters = _ACCENTS[char]
+            parts.append(f"[{letters}{letters.upper()}]")
+        elif char.isspace():
+            parts.append("\\s+")
+        elif char.isalnum():
+            parts.append(char)
+        else:
+            parts.append(re.escape(char))
+    return "^\\s*" + "".join(parts) + "\\s*$"
+
+
+def _sparql_string(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _string_value(term, prefixes: Dict[str, str]) -> Optional[str]:
+    """Lexical value of a plain, language-tagged or xsd:string literal term"""
+    if not term or term[0].kind != STRING or term[0].value.startswith(("'''", '"""')):
+        return None
+    if len(term) == 2 and term[1].kind != LANGTAG:
+        return None
+    if len(term) == 3:
+        datatype = term[2].value
+        if term[2].kind == PNAME:
+            prefix, _, local = datatype.partition(":")
+            datatype = "<" + prefixes.get(prefix + ":", "") + local + ">"
+        if datatype != f"<{_XSD_STRING}>":
+            return None
+    if len(term) > 3:
+        return None
+    return term[0].value[1:-1]
+
+
+def _fresh(query: Query, base: str, taken: Set[str]) -> str:
+    name, n = base, 1
+    while name in taken:
+        n += 1
+        name = f"{base}{n}"
+    taken.add(name)
+    return name
+
+
+def _fuzzy_literals(query: Query) -> bool:
+    prefixes = query.prefix_map()
+    taken = query.where.variables() | query.projected_variables()
+    changed = False
+    for group in iter_groups(query.where):
+        elements = []
+        for element in group.elements:
+            value = _string_value(element.object, prefixes) if isinstance(element, TriplePattern) else None
+            if value is None or not _fold(value).strip():
+                elements.append(element)
+                continue
+            name = _fresh(query, "literal", taken)
+            elements.append(TriplePattern(element.subject, element.predicate, (make_var(name),)))
+            elements.append(Filter(tokenize(
+                f"(REGEX(STR(?{name}), {_sparql_string(_literal_regex(value))}, \"i\"))"
+            )))
+            changed = True
+        group.elements = elements
+    return changed
+
+
+def _drop_filters(query: Query) -> bool:
+    changed = False
+    for group in iter_groups(query.where):
+        kept = [element for element in group.elements if not isinstance(element, Filter)]
+        if len(kept) != len(group.elements):
+            group.elements = kept
+            changed = True
+    return changed
+
+
+def _occurrences(group: GroupPattern) -> Counter:
+    """How many elements of the query use each variable"""
+    counts = Counter()
+    for inner in iter_groups(group):
+        for element in inner.elements:
+            if isinstance(element, TriplePattern):
+                counts.update(element.variables())
+            elif isinstance(element, Filter):
+                counts.update(element.variables())
+            elif isinstance(element, (Bind, Raw)):
+                counts.update(element.variables())
+    return counts
+
+
+def _is_type(pattern: TriplePattern) -> bool:
+    token = pattern.predicate[0]
+    return (token.kind == NAME and token.value == "a") or token.value in ("rdf:type", f"<{RDF_TYPE}>")
+
+
+def _required_groups(group: GroupPattern):
+    """Groups whose patterns must match (not under OPTIONAL / MINUS / a subquery)"""
+    yield group
+    for element in group.elements:
+        if isinstance(element, GroupPattern):
+            yield from _required_groups(element)
+        elif isinstance(element, Union):
+            for branch in element.groups:
+                yield from _required_groups(branch)
+
+
+def _optional_attributes(query: Query) -> bool:
+    """
+    Wrap in OPTIONAL the patterns that only fetch a value (object variable
+    used nowhere else) of a subject another required pattern still binds
+    """
+    occurrences = _occurrences(query.where)
+    changed = False
+    for group in _required_groups(query.where):
+        def is_attribute(element) -> bool:
+            return (
+                isinstance(element, TriplePattern) and not element.is_path and not _is_type(element)
+                and element.subject[0].kind == VAR and element.predicate[0].kind in (IRI, PNAME)
+                and element.object[0].kind == VAR and occurrences[element.object[0].value[1:]] == 1
+            )
+
+        attributes = [element for element in group.elements if is_attribute(element)]
+        required = [element for element in group.elements if isinstance(element, TriplePattern) and not is_attribute(element)]
+        anchored = {name for pattern in required for name in pattern.variables()}
+        wrapped = [pattern for pattern in attributes if pattern.subject[0].value[1:] in anchored]
+        if not wrapped:
+            continue
+        group.elements = [element for element in group.elements if not any(element is w for w in wrapped)]
+        group.elements.extend(Optional_(GroupPattern([pattern])) for pattern in wrapped)
+        changed = True
+    return changed
+
+
+_STEPS = {
+    FUZZY_LITERALS: _fuzzy_literals,
+    DROP_FILTERS: _drop_filters,
+    OPTIONAL_ATTRIBUTES: _optional_attributes
+}
+
+
+def relax_variants(sparql_query: str, max_variants: int = RELAXATION_MAX_VARIANTS) -> List[Variant]:
+    """
+    Progressively relaxed versions of a query
+
+    Variant n applies the first n relaxations of RELAXATIONS that change
+    the query (filters are dropped before literals are made fuzzy, so the
+    fuzzy-match filters survive).
+
+    Args:
+        sparql_query: SELECT query that returned no rows
+        max_variants: Maximum number of variants
+
+    Returns:
+        Variants from the least to the most relaxed (empty if the query
+        cannot be parsed or nothing can be relaxed)
+    """
+    try:
+        parse_query(sparql_query)
+    except SPARQLSyntaxError:
+        return []
+
+    applicable = []
+    for name in RELAXATIONS:
+        query = parse_query(sparql_query)
+        if query.form == "SELECT" and _STEPS[name](query):
+            applicable.append(name)
+
+    variants = []
+    for count in range(1, min(len(applicable), max_variants) + 1):
+        names = applicable[:count]
+        query = parse_query(sparql_query)
+        for name in sorted(names, key=lambda step: step != DROP_FILTERS):
+            _STEPS[name](query)
+        variants.append(Variant(names, query.to_string()))
+    return variants
+
+
+class QueryRelaxer:
+    """Run the relaxed variants of an empty query concurrently"""
+
+    def __init__(self, max_variants: int = RELAXATION_MAX_VARIANTS, timeout: float = REQUEST_TIMEOUT):
+        """
+        Args:
+            max_variants: Variants tried per query (0 disables relaxation)
+            timeout: Seconds to wait for the variants
+        """
+        self.max_variants = max_variants
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_variants), thread_name_prefix="query-relaxation")
+        self._lock = threading.Lock()
+        self._stats = {"relaxed": 0, "recovered": 0, "variants": 0}
+
+    def relax(self, sparql_query: str, execute: Callable[[str], Dict[str, Any]]) -> Optional[Relaxation]:
+        """
+        Find the least relaxed variant of a query that returns rows
+
+        All variants are sent at once; a variant is accepted as soon as
+        every less relaxed variant has come back empty, so a looser query
+        never wins over a stricter one that also has rows.
+
+        Args:
+            sparql_query: Query that returned no rows
+            execute: Runs a query and returns its results (GraphDBClient.query shape)
+
+        Returns:
+            Relaxation(relaxations, sparql_query, results, latency_ms,
+            variants_tried), or None if no variant returns rows
+
+        Raises:
+            BackendUnavailableError: GraphDB is down
+        """
+        variants = relax_variants(sparql_query, self.max_variants)
+        if not variants:
+            return None
+
+        start = time.monotonic()
+        futures = [self._executor.submit(execute, variant.sparql_query) for variant in variants]
+        deadline = start + self.timeout
+        found = None
+        try:
+            pending = set(futures)
+            while pending and found is None:
+                done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    break  # Timed out
+                for index, future in enumerate(futures):
+                    if not future.done():
+                        break
+                    results = future.result()
+                    if problem_of(results) is None:
+                        found = Relaxation(
+                            variants[index].relaxations,
+                            variants[index].sparql_query,
+                            results,
+                            round((time.monotonic() - start) * 1000, 1),
+                            len(variants)
+                        )
+                        break
+        finally:
+            for future in futures:
+                future.cancel()
+
+        with self._lock:
+            self._stats["relaxed"] += 1
+            self._stats["recovered"] += int(found is not None)
+            self._stats["variants"] += len(variants)
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+if __name__ == "__main__":
+    import sys
+
+    text = open(sys.argv[1], encoding="utf-8").read() if len(sys.argv) > 1 else sys.stdin.read()
+    for variant in relax_variants(text):
+        print(f"# {' + '.join(variant.relaxations)}")
+        print(variant.sparql_query)
+        print()
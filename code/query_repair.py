@@ -0,0 +1,233 @@
+# query_repair.py
+"""
+Query Repair - Bounded self-repair of generated queries that fail or return nothing
+The problem (validator diagnostics, GraphDB error or empty result) goes back
+to the SPARQL LLM for a corrected query, for at most REPAIR_MAX_ATTEMPTS
+attempts within REPAIR_TIME_BUDGET seconds; successful repairs are cached
+per normalized question
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+from config import REPAIR_MAX_ATTEMPTS, REPAIR_TIME_BUDGET, REPAIR_CACHE_SIZE
+
+EMPTY_RESULT = "La requête s'exécute mais ne retourne aucun résultat."
+
+# One repair attempt: outcome is "ok", "invalid", "error", "empty" or "timeout"
+RepairAttempt = namedtuple("RepairAttempt", ["attempt", "outcome", "latency_ms", "sparql_query", "problem"])
+
+
+class RepairOutcome:
+    """Result of a repair run"""
+
+    def __init__(self):
+        self.query_result: Optional[Dict[str, Any]] = None  # generate_sparql-shaped dict of the repaired query
+        self.results: Optional[Dict[str, Any]] = None       # Its SPARQL results
+        self.attempts: List[RepairAttempt] = []
+        self.cached = False
+        self.budget_exhausted = False
+
+    @classmethod
+    def from_cache(cls, query_result: Dict[str, Any]) -> "RepairOutcome":
+        """Outcome of a question answered with a previously repaired query"""
+        outcome = cls()
+        outcome.query_result = query_result
+        outcome.cached = True
+        return outcome
+
+    @property
+    def success(self) -> bool:
+        return self.query_result is not None
+
+    def report(self) -> Dict[str, Any]:
+        """Metrics for the chatbot response"""
+        return {
+            "success": self.success,
+            "cached": self.cached,
+            "attempts": len(self.attempts),
+            "latencies_ms": [attempt.latency_ms for attempt in self.attempts],
+            "outcomes": [attempt.outcome for attempt in self.attempts],
+            "budget_exhausted": self.budget_exhausted
+        }
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, no accents, no punctuation, single spaces"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def problem_of(results: Optional[Dict[str, Any]]) -> Optional[str]:
+    """What is wrong with an execution result (None = usable rows)"""
+    if results is None:
+        return EMPTY_RESULT
+    if results.get("error"):
+        return f"Erreur GraphDB: {results['error']}"
+    if "boolean" in results:
+        return None
+    if not results.get("results", {}).get("bindings"):
+        return EMPTY_RESULT
+    return None
+
+
+class QueryRepairer:
+    """Repair loop around IntelligentSPARQLGenerator.repair_sparql"""
+
+    def __init__(
+        self,
+        generator,
+        validator=None,
+        max_attempts: int = REPAIR_MAX_ATTEMPTS,
+        time_budget: float = REPAIR_TIME_BUDGET,
+        cache_size: int = REPAIR_CACHE_SIZE
+    ):
+        """
+        Args:
+            generator: IntelligentSPARQLGenerator (provides repair_sparql)
+            validator: QueryValidator checking each candidate before execution
+            max_attempts: LLM repair calls per question
+            time_budget: Wall-clock seconds for the whole repair (LLM calls included)
+            cache_size: Repaired queries kept (LRU, per normalized question)
+        """
+        self.generator = generator
+        self.validator = validator
+        self.max_attempts = max_attempts
+        self.time_budget = time_budget
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="query-repair")
+        self._stats = {"repairs": 0, "successes": 0, "attempts": 0, "cache_hits": 0, "timeouts": 0}
+        self._latencies: List[float] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_attempts > 0
+
+    def cached(self, question: str) -> Optional[Dict[str, Any]]:
+        """Query that previously repaired this question, if any"""
+        key = normalize_question(question)
+        with self._lock:
+            query_result = self._cache.get(key)
+            if query_result is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return dict(query_result)
+        return None
+
+    def _remember(self, question: str, query_result: Dict[str, Any]):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[normalize_question(question)] = dict(query_result)
+            self._cache.move_to_end(normalize_question(question))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def forget(self, question: str):
+        """Drop a cached repair (e.g. it stopped returning rows)"""
+        with self._lock:
+            self._cache.pop(normalize_question(question), None)
+
+    def repair(
+        self,
+        question: str,
+        sparql_query: str,
+        problem: str,
+        execute: Callable[[str], Dict[str, Any]]
+    ) -> RepairOutcome:
+        """
+        Ask for corrected queries until one returns rows
+
+        Each candidate is validated locally first, then executed. The wall
+        clock budget covers the whole loop: an LLM call still running when
+        it runs out is abandoned.
+
+        Args:
+            question: User's question
+            sparql_query: Query that failed
+            problem: Why it failed (diagnostics, GraphDB error, empty result)
+            execute: Runs a query and returns its results (GraphDBClient.query shape)
+
+        Returns:
+            RepairOutcome (query_result / results set on success)
+
+        Raises:
+            BackendUnavailableError: the LLM server or GraphDB is down
+        """
+        outcome = RepairOutcome()
+        deadline = time.monotonic() + self.time_budget
+
+        for attempt in range(1, self.max_attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                outcome.budget_exhausted = True
+                break
+
+            start = time.monotonic()
+            future = self._executor.submit(self._attempt, question, sparql_query, problem, execute)
+            try:
+                query_result, results, result_problem, kind = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                outcome.attempts.append(RepairAttempt(attempt, "timeout", round((time.monotonic() - start) * 1000, 1), None, None))
+                outcome.budget_exhausted = True
+                break
+
+            latency = round((time.monotonic() - start) * 1000, 1)
+            outcome.attempts.append(RepairAttempt(attempt, kind, latency, query_result["sparql_query"], result_problem))
+            if kind == "ok":
+                outcome.query_result = query_result
+                outcome.results = results
+                self._remember(question, query_result)
+                break
+            sparql_query, problem = query_result["sparql_query"], result_problem
+
+        self._record(outcome)
+        return outcome
+
+    def _attempt(self, question: str, sparql_query: str, problem: str, execute):
+        """One LLM repair + validation + execution"""
+        query_result = self.generator.repair_sparql(question, sparql_query, problem)
+        candidate = query_result["sparql_query"]
+
+        if self.validator is not None:
+            validation = self.validator.validate(candidate)
+            if not validation.valid:
+                return query_result, None, validation.diagnostics(), "invalid"
+
+        results = execute(candidate)
+        result_problem = problem_of(results)
+        if result_problem is None:
+            return query_result, results, None, "ok"
+        if result_problem == EMPTY_RESULT and self.validator is not None:
+            warnings = self.validator.validate(candidate).diagnostics()
+            if warnings:
+                result_problem += "\n" + warnings
+        return query_result, results, result_problem, "error" if results and results.get("error") else "empty"
+
+    def _record(self, outcome: RepairOutcome):
+        with self._lock:
+            self._stats["repairs"] += 1
+            self._stats["successes"] += int(outcome.success)
+            self._stats["attempts"] += len(outcome.attempts)
+            self._stats["timeouts"] += int(outcome.budget_exhausted)
+            self._latencies.append(sum(attempt.latency_ms for attempt in outcome.attempts))
+            self._latencies = self._latencies[-1000:]
+
+    def stats(self) -> Dict[str, Any]:
+        """Aggregate counters (success rate vs time spent repairing)"""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        if latencies:
+            stats["p50_ms"] = latencies[len(latencies) // 2]
+            stats["p95_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        stats["cached_repairs"] = len(self._cache)
+        return stats
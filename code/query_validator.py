@@ -0,0 +1,351 @@
+# query_validator.py
+"""
+Query Validator - Check generated SPARQL locally before it reaches GraphDB
+Syntax, declared prefixes, existence of every horses: term in the ontology
+vocabulary and relation directions, against lookup sets built once from the
+RDF sources (and optionally the live schema)
+"""
+
+import difflib
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Set
+from config import ONTOLOGY_NAMESPACE, EMBEDDED_DATA_FILES
+from graph_scope import RDF_NS, RDFS_NS, OWL_NS, RDF_TYPE
+from sparql_ast import parse_query, iter_groups, TriplePattern, UnsupportedSyntax
+from sparql_rewriter import DEFAULT_RULES, InvertDirection, RuleContext
+from sparql_tokenizer import tokenize, split_prologue, IRI, PNAME, VAR, SPARQLSyntaxError
+
+# Prefixes GraphDB and rdflib resolve without a PREFIX declaration
+BUILTIN_PREFIXES = {"rdf:", "rdfs:", "owl:", "xsd:"}
+
+_RDF_ABOUT = f"{{{RDF_NS}}}about"
+_RDF_ID = f"{{{RDF_NS}}}ID"
+_RDF_RESOURCE = f"{{{RDF_NS}}}resource"
+_RDF_DATATYPE = f"{{{RDF_NS}}}datatype"
+_XML_BASE = "{http://www.w3.org/XML/1998/namespace}base"
+
+_CLASS_TAGS = {f"{{{OWL_NS}}}Class", f"{{{RDFS_NS}}}Class"}
+_PROPERTY_TAGS = {
+    f"{{{OWL_NS}}}ObjectProperty", f"{{{OWL_NS}}}DatatypeProperty",
+    f"{{{OWL_NS}}}AnnotationProperty", f"{{{RDF_NS}}}Property"
+}
+_DATATYPE_PROPERTY_TAG = f"{{{OWL_NS}}}DatatypeProperty"
+
+
+class OntologyVocabulary:
+    """Terms of the ontology namespace, by kind"""
+
+    def __init__(self, namespace: str = ONTOLOGY_NAMESPACE):
+        self.namespace = namespace
+        self.classes: Set[str] = set()
+        self.properties: Set[str] = set()
+        self.datatype_properties: Set[str] = set()
+        self.individuals: Set[str] = set()
+        self.domains: Dict[str, Set[str]] = {}
+        self.ranges: Dict[str, Set[str]] = {}
+        self.superclasses: Dict[str, Set[str]] = {}
+        self.terms: frozenset = frozenset()
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str] = EMBEDDED_DATA_FILES, namespace: str = ONTOLOGY_NAMESPACE):
+        """
+        Build the vocabulary from RDF/XML files (ontology and instance data)
+
+        Args:
+            paths: RDF/XML files
+            namespace: Namespace whose terms are checked
+
+        Returns:
+            OntologyVocabulary
+        """
+        vocabulary = cls(namespace)
+        for path in paths:
+            root = ET.parse(path).getroot()
+            base = root.get(_XML_BASE, "")
+            for node in root:
+                vocabulary._read_node(node, base)
+        vocabulary._freeze()
+        return vocabulary
+
+    def add_live_schema(self, client):
+        """
+        Add the classes and properties of the repository (GraphDB schema)
+
+        Args:
+            client: GraphDB client
+        """
+        result = client.query(f"""
+            SELECT DISTINCT ?term ?kind WHERE {{
+                {{ ?term a ?kind . VALUES ?kind {{ <{OWL_NS}Class> <{RDFS_NS}Class> }} }}
+                UNION {{ ?term a ?kind . VALUES ?kind {{ <{OWL_NS}ObjectProperty> <{OWL_NS}DatatypeProperty> }} }}
+                UNION {{ [] a ?term . BIND(<{OWL_NS}Class> AS ?kind) }}
+                UNION {{ [] ?term [] . BIND(<{RDF_NS}Property> AS ?kind) }}
+                FILTER(STRSTARTS(STR(?term), "{self.namespace}"))
+            }}
+        """)
+        for binding in result.get("results", {}).get("bindings", []):
+            term, kind = binding["term"]["value"], binding["kind"]["value"]
+            if kind.endswith("Class"):
+                self.classes.add(term)
+            else:
+                self.properties.add(term)
+                if kind == OWL_NS + "DatatypeProperty":
+                    self.datatype_properties.add(term)
+        self._freeze()
+
+    def _resolve(self, value: str, base: str) -> str:
+        return base + value if value.startswith("#") else value
+
+    def _read_node(self, node, base: str):
+        """Node element: typed resource, class or property declaration"""
+        about = node.get(_RDF_ABOUT) or (f"#{node.get(_RDF_ID)}" if node.get(_RDF_ID) else None)
+        subject = self._resolve(about, base) if about else None
+        tag = node.tag.replace("{", "").replace("}", "")
+
+        if subject:
+            if node.tag in _CLASS_TAGS:
+                self.classes.add(subject)
+            elif node.tag in _PROPERTY_TAGS:
+                self.properties.add(subject)
+                if node.tag == _DATATYPE_PROPERTY_TAG:
+                    self.datatype_properties.add(subject)
+            elif not tag.startswith((OWL_NS, RDF_NS, RDFS_NS)):
+                self.classes.add(tag)  # <Horse rdf:about="..."> : typed node
+                self.individuals.add(subject)
+            else:
+                self.individuals.add(subject)
+
+        for child in node:
+            self._read_property(subject, child, base)
+
+    def _read_property(self, subject: Optional[str], element, base: str):
+        """Property element: predicate used in the data, values and nested nodes"""
+        predicate = element.tag.replace("{", "").replace("}", "")
+        resource = element.get(_RDF_RESOURCE)
+        value = self._resolve(resource, base) if resource else None
+
+        if predicate == RDF_TYPE and value:
+            self.classes.add(value)
+        elif predicate == RDFS_NS + "subClassOf" and value and subject:
+            self.classes.add(value)
+            self.superclasses.setdefault(subject, set()).add(value)
+        elif predicate == RDFS_NS + "domain" and value and subject:
+            self.domains.setdefault(subject, set()).add(value)
+        elif predicate == RDFS_NS + "range" and value and subject:
+            self.ranges.setdefault(subject, set()).add(value)
+        elif not predicate.startswith((OWL_NS, RDF_NS, RDFS_NS)):
+            self.properties.add(predicate)
+            if value is None and (element.get(_RDF_DATATYPE) or (element.text or "").strip()):
+                self.datatype_properties.add(predicate)
+            elif value:
+                self.individuals.add(value)
+
+        for nested in element:
+            self._read_node(nested, base)
+
+    def _freeze(self):
+        self.terms = frozenset(
+            iri for iri in self.classes | self.properties | self.individuals if iri.startswith(self.namespace)
+        )
+
+    def is_subclass(self, cls: str, ancestor: str) -> bool:
+        seen, stack = set(), [cls]
+        while stack:
+            current = stack.pop()
+            if current == ancestor:
+                return True
+            if current not in seen:
+                seen.add(current)
+                stack.extend(self.superclasses.get(current, ()))
+        return False
+
+    def suggest(self, local_name: str, candidates: Set[str]) -> Optional[str]:
+        """Closest known local name (for repair hints)"""
+        names = [iri[len(self.namespace):] for iri in candidates if iri.startswith(self.namespace)]
+        matches = difflib.get_close_matches(local_name, names, n=1, cutoff=0.7)
+        return matches[0] if matches else None
+
+
+class ValidationResult:
+    """Errors make the query invalid; warnings are informative"""
+
+    def __init__(self, errors: List[str], warnings: List[str]):
+        self.errors = errors
+        self.warnings = warnings
+
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+    def diagnostics(self) -> str:
+        """Problems as a bullet list (for logs and repair prompts)"""
+        return "\n".join(f"- {message}" for message in self.errors + self.warnings)
+
+
+_default_vocabulary: Optional[OntologyVocabulary] = None
+
+
+def get_vocabulary() -> OntologyVocabulary:
+    """Vocabulary of the configured RDF sources, built once"""
+    global _default_vocabulary
+    if _default_vocabulary is None:
+        _default_vocabulary = OntologyVocabulary.from_files()
+    return _default_vocabulary
+
+
+class QueryValidator:
+    """Local checks of a generated query"""
+
+    def __init__(self, vocabulary: Optional[OntologyVocabulary] = None):
+        """
+        Args:
+            vocabulary: Terms to check against (default: data/ontology.owl and the instance data)
+        """
+        self.vocabulary = vocabulary or get_vocabulary()
+        self.directions = [rule for rule in DEFAULT_RULES if isinstance(rule, InvertDirection)]
+
+    def validate(self, sparql_query: str) -> ValidationResult:
+        """
+        Check a query
+
+        Args:
+            sparql_query: SPARQL query string
+
+        Returns:
+            ValidationResult (errors empty = the query can be sent)
+        """
+        errors: List[str] = []
+        warnings: List[str] = []
+
+        try:
+            tokens = tokenize(sparql_query)
+        except SPARQLSyntaxError as e:
+            # The local tokenizer covers a subset of SPARQL: let the endpoint decide
+            return ValidationResult([], [f"Syntaxe non analysée localement: {e}"])
+        declared, _, body = split_prologue(tokens)
+        prefixes = {pname: iri[1:-1] for pname, iri in declared}
+
+        vocabulary = self.vocabulary
+        namespace = vocabulary.namespace
+        for token in body:
+            if token.kind == PNAME and not token.value.startswith("_:"):
+                prefix = token.value.split(":", 1)[0] + ":"
+                if prefix not in prefixes and prefix not in BUILTIN_PREFIXES:
+                    errors.append(f"Préfixe non déclaré: {prefix} ({token.value})")
+                    continue
+            iri = self._iri(token, prefixes)
+            if iri is not None and iri.startswith(namespace) and iri not in vocabulary.terms:
+                local = iri[len(namespace):]
+                hint = vocabulary.suggest(local, vocabulary.terms)
+                errors.append(
+                    f"Terme inconnu de l'ontologie: {token.value}"
+                    + (f" (vouliez-vous dire {token.value[:-len(local)] if token.kind == PNAME else ''}{hint} ?)" if hint else "")
+                )
+
+        try:
+            query = parse_query(sparql_query)
+        except UnsupportedSyntax:
+            return ValidationResult(errors, warnings)
+        except SPARQLSyntaxError as e:
+            return ValidationResult(errors + [f"Syntaxe: {e}"], warnings)
+
+        context = RuleContext(query)
+        literal_variables: Set[str] = set()
+        patterns: List[TriplePattern] = []
+        for group in iter_groups(query.where):
+            patterns.extend(group.triples())
+
+        for pattern in patterns:
+            for token in pattern.predicate:
+                iri = self._iri(token, prefixes)
+                if iri is None or iri == RDF_TYPE or not iri.startswith(namespace) or iri not in vocabulary.terms:
+                    continue
+                if iri not in vocabulary.properties:
+                    kind = "une classe" if iri in vocabulary.classes else "une instance"
+                    errors.append(f"{token.value} est {kind}, pas une propriété (position prédicat)")
+                elif iri in vocabulary.datatype_properties and pattern.object[0].kind == VAR:
+                    literal_variables.add(pattern.object[0].value[1:])
+
+            if context.iri(pattern.predicate) == RDF_TYPE:
+                cls = context.iri(pattern.object)
+                if cls in vocabulary.properties and cls not in vocabulary.classes:
+                    errors.append(f"{pattern.object[0].value} est une propriété, pas une classe (objet de rdf:type)")
+
+        for pattern in patterns:
+            if pattern.subject[0].kind == VAR and pattern.subject[0].value[1:] in literal_variables:
+                errors.append(
+                    f"{pattern.subject[0].value} est la valeur d'une propriété de données (littéral), "
+                    f"il ne peut pas être sujet d'un triplet"
+                )
+            errors.extend(self._check_direction(pattern, context))
+            warnings.extend(self._check_domain(pattern, context))
+
+        return ValidationResult(list(dict.fromkeys(errors)), list(dict.fromkeys(warnings)))
+
+    @staticmethod
+    def _iri(token, prefixes: Dict[str, str]) -> Optional[str]:
+        if token.kind == IRI:
+            return token.value[1:-1]
+        if token.kind == PNAME:
+            prefix, _, local = token.value.partition(":")
+            namespace = prefixes.get(prefix + ":")
+            return namespace + local if namespace is not None else None
+        return None
+
+    def _check_direction(self, pattern: TriplePattern, context: RuleContext) -> List[str]:
+        """Relations whose direction the ontology summary warns about"""
+        predicate = context.iri(pattern.predicate)
+        for rule in self.directions:
+            if predicate != rule.predicate:
+                continue
+            subject_types = self._types(pattern.subject, context)
+            object_types = self._types(pattern.object, context)
+            if rule.object.class_iri in subject_types or rule.subject.class_iri in object_types:
+                name = predicate[len(self.vocabulary.namespace):]
+                expected_subject = rule.subject.class_iri[len(self.vocabulary.namespace):]
+                expected_object = rule.object.class_iri[len(self.vocabulary.namespace):]
+                return [f"Direction inversée: {name} va de {expected_subject} vers {expected_object}"]
+        return []
+
+    def _check_domain(self, pattern: TriplePattern, context: RuleContext) -> List[str]:
+        """rdfs:domain / rdfs:range declared in the ontology (warnings only)"""
+        predicate = context.iri(pattern.predicate)
+        if predicate is None or any(rule.predicate == predicate for rule in self.directions):
+            return []
+        warnings = []
+        for term, declared, label in (
+            (pattern.subject, self.vocabulary.domains.get(predicate), "domaine"),
+            (pattern.object, self.vocabulary.ranges.get(predicate), "portée")
+        ):
+            types = self._types(term, context)
+            if not declared or not types:
+                continue
+            if not any(self.vocabulary.is_subclass(t, d) or self.vocabulary.is_subclass(d, t) for t in types for d in declared):
+                warnings.append(
+                    f"{pattern.predicate[0].value}: {term[0].value} n'est pas du {label} attendu "
+                    f"({', '.join(d.rsplit('#', 1)[-1] for d in declared)})"
+                )
+        return warnings
+
+    @staticmethod
+    def _types(term, context: RuleContext) -> Set[str]:
+        if term[0].kind == VAR:
+            return context.types.get(term[0].value[1:], set())
+        return set()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    text = open(sys.argv[1], encoding="utf-8").read() if len(sys.argv) > 1 else sys.stdin.read()
+    validator = QueryValidator()
+    start = time.perf_counter()
+    result = validator.validate(text)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    print("Requête valide" if result.valid else "Requête invalide")
+    if result.errors or result.warnings:
+        print(result.diagnostics())
+    print(f"({elapsed:.3f} ms)")
+    sys.exit(0 if result.valid else 1)
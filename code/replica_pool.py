@@ -0,0 +1,169 @@
+# replica_pool.py
+"""
+Replica Pool - Spread read queries across several GraphDB replicas
+Least-outstanding-requests selection (ties broken by observed latency),
+ejection of unhealthy replicas and re-admission through periodic probes
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+import requests
+from config import CONNECT_TIMEOUT, GRAPHDB_HEALTH_INTERVAL
+from resilience import BackendUnavailableError, get_circuit_breaker
+
+# Weight of the latest sample in the latency moving average
+_LATENCY_ALPHA = 0.3
+
+
+class Replica:
+    """Load and health state of one endpoint"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.outstanding = 0
+        self.latency = 0.0  # Exponential moving average, seconds
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+
+    def score(self):
+        """Lower is better: fewest requests in flight, then fastest"""
+        return (self.outstanding, self.latency)
+
+
+class ReplicaSet:
+    """Pick a replica per query and keep track of which ones are up"""
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        session: Optional[requests.Session] = None,
+        health_interval: float = GRAPHDB_HEALTH_INTERVAL
+    ):
+        """
+        Args:
+            endpoints: SPARQL endpoint URLs of the replicas
+            session: HTTP session used for the health probes
+            health_interval: Seconds between two probes of every replica (0 = no probes)
+        """
+        self.replicas = [Replica(endpoint) for endpoint in endpoints]
+        self.session = session or requests.Session()
+        self.health_interval = health_interval
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+
+    def _ensure_prober(self):
+        """Start the probe thread on first use"""
+        if self.health_interval <= 0 or self._prober is not None:
+            return
+        self._prober = threading.Thread(target=self._probe_loop, name="graphdb-health", daemon=True)
+        self._prober.start()
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.probe()
+
+    def probe(self):
+        """Probe every replica; ejected replicas that answer are re-admitted"""
+        for replica in self.replicas:
+            try:
+                response = self.session.get(
+                    f"{replica.endpoint.rstrip('/')}/size",
+                    timeout=(CONNECT_TIMEOUT, CONNECT_TIMEOUT)
+                )
+                healthy = response.status_code < 500
+            except requests.exceptions.RequestException:
+                healthy = False
+
+            if healthy and not replica.healthy:
+                print(f"Réplique de nouveau disponible: {replica.endpoint}")
+                get_circuit_breaker(replica.endpoint).record_success()
+            elif not healthy and replica.healthy:
+                print(f"Réplique écartée (sonde en échec): {replica.endpoint}")
+            replica.healthy = healthy
+
+    def _candidates(self, excluded: List[Replica]) -> List[Replica]:
+        """Untried replicas, best first (ejected ones only as a last resort)"""
+        available = [
+            replica for replica in self.replicas
+            if replica not in excluded
+            and not get_circuit_breaker(replica.endpoint).is_open()
+        ]
+        healthy = [replica for replica in available if replica.healthy]
+        return sorted(healthy or available, key=Replica.score)
+
+    def run(self, operation: Callable[[str], Any]) -> Any:
+        """
+        Run an operation on the least loaded healthy replica
+
+        A replica that turns out to be unreachable is ejected until a probe
+        succeeds, and the operation moves on to the next one.
+
+        Args:
+            operation: Callable taking the endpoint URL
+
+        Returns:
+            Result of the operation
+
+        Raises:
+            BackendUnavailableError: every replica is down
+        """
+        self._ensure_prober()
+        tried: List[Replica] = []
+
+        while True:
+            with self._lock:
+                candidates = self._candidates(tried)
+                if not candidates:
+                    break
+                replica = candidates[0]
+                replica.outstanding += 1
+                replica.requests += 1
+
+            start = time.monotonic()
+            try:
+                result = operation(replica.endpoint)
+            except BackendUnavailableError:
+                # A read timeout is raised as is: the query is slow, not the replica
+                replica.failures += 1
+                replica.healthy = False
+                tried.append(replica)
+                print(f"Réplique indisponible, bascule: {replica.endpoint}")
+                continue
+            finally:
+                with self._lock:
+                    replica.outstanding -= 1
+
+            elapsed = time.monotonic() - start
+            with self._lock:
+                if replica.latency:
+                    replica.latency += _LATENCY_ALPHA * (elapsed - replica.latency)
+                else:
+                    replica.latency = elapsed
+            return result
+
+        raise BackendUnavailableError(
+            ",".join(replica.endpoint for replica in self.replicas),
+            "aucune réplique disponible"
+        )
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-replica counters"""
+        return [
+            {
+                "endpoint": replica.endpoint,
+                "healthy": replica.healthy,
+                "outstanding": replica.outstanding,
+                "latency_ms": round(replica.latency * 1000, 1),
+                "requests": replica.requests,
+                "failures": replica.failures
+            }
+            for replica in self.replicas
+        ]
+
+    def close(self):
+        """Stop the health probes"""
+        self._stop.set()
@@ -0,0 +1,257 @@
+# resilience.py
+"""
+Resilience - Circuit breakers, retry backoff and a global retry budget
+Shared by the GraphDB and LLM clients so a failing dependency fails fast
+instead of costing minutes of request latency
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+from config import (
+    MAX_RETRIES,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    RETRY_BUDGET_CAPACITY,
+    RETRY_BUDGET_RATIO
+)
+
+
+class BackendUnavailableError(Exception):
+    """A backend (GraphDB or LLM server) is down or its circuit is open"""
+
+    def __init__(self, endpoint: str, reason: str):
+        self.endpoint = endpoint
+        self.reason = reason
+        super().__init__(f"Service indisponible ({endpoint}): {reason}")
+
+
+class TransientError(Exception):
+    """Retryable failure reported by a backend (HTTP 5xx, 429)"""
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker
+
+    closed: requests flow; after failure_threshold consecutive failures
+    the circuit opens. open: requests fail immediately until
+    reset_timeout has elapsed. half-open: a single probe request is let
+    through; its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def is_open(self) -> bool:
+        """Whether requests are currently rejected (without claiming the probe)"""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        """The backend answered"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_slow(self):
+        """The backend took the request but did not answer in time: neither outcome"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """The backend could not be reached or failed transiently"""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """
+    Global retry budget shared by every client
+
+    Each request deposits `ratio` tokens (up to `capacity`) and each retry
+    spends one, so retries stay a bounded fraction of traffic when a
+    dependency is failing.
+    """
+
+    def __init__(self, capacity: float = RETRY_BUDGET_CAPACITY, ratio: float = RETRY_BUDGET_RATIO):
+        self.capacity = capacity
+        self.ratio = ratio
+        self.tokens = capacity
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+RETRY_BUDGET = RetryBudget()
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """Circuit breaker shared by every client of an endpoint"""
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint)
+        return _breakers[endpoint]
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BACKOFF_BASE, cap: float = RETRY_BACKOFF_MAX) -> float:
+    """Exponential backoff with full jitter for the given attempt (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retries(
+    endpoint: str,
+    operation: Callable[[], Any],
+    retryable: Tuple[Type[BaseException], ...],
+    max_retries: int = MAX_RETRIES,
+    no_retry: Tuple[Type[BaseException], ...] = (),
+    slow: Tuple[Type[BaseException], ...] = ()
+) -> Any:
+    """
+    Run an operation through the endpoint's circuit breaker with retries
+
+    Args:
+        endpoint: Endpoint URL (selects the circuit breaker)
+        operation: Callable performing one attempt
+        retryable: Exception types meaning "backend unreachable / transient"
+        max_retries: Maximum number of attempts
+        no_retry: Types not worth retrying (e.g. a read timeout on a slow query)
+        slow: Types meaning the backend is up but did not answer in time
+            (read timeouts): not breaker failures, raised as they are once
+            no retry is left, for the caller to report as a request error
+
+    Returns:
+        Result of the first successful attempt
+
+    Raises:
+        BackendUnavailableError: circuit open, or every attempt failed transiently
+    """
+    breaker = get_circuit_breaker(endpoint)
+    RETRY_BUDGET.record_request()
+    last_error = None
+
+    for attempt in range(max_retries):
+        if not breaker.allow_request():
+            raise BackendUnavailableError(endpoint, "circuit ouvert après des échecs répétés")
+        try:
+            result = operation()
+        except slow as e:
+            breaker.record_slow()  # One slow query or long completion says nothing about the server
+            if isinstance(e, no_retry) or attempt == max_retries - 1 or not RETRY_BUDGET.try_spend():
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Timeout, retry {attempt + 1}/{max_retries} dans {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        except retryable as e:
+            breaker.record_failure()
+            last_error = e
+            if isinstance(e, no_retry):
+                break
+            if attempt < max_retries - 1 and RETRY_BUDGET.try_spend():
+                delay = backoff_delay(attempt)
+                print(f"Échec temporaire, retry {attempt + 1}/{max_retries} dans {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            break
+        except Exception:
+            breaker.record_success()  # The backend answered, the request itself is wrong
+            raise
+        breaker.record_success()
+        return result
+
+    raise BackendUnavailableError(endpoint, str(last_error)) from last_error
+
+
+async def async_call_with_retries(
+    endpoint: str,
+    operation: Callable[[], Awaitable[Any]],
+    retryable: Tuple[Type[BaseException], ...],
+    max_retries: int = MAX_RETRIES,
+    no_retry: Tuple[Type[BaseException], ...] = (),
+    slow: Tuple[Type[BaseException], ...] = ()
+) -> Any:
+    """Asyncio version of call_with_retries (same breaker and budget)"""
+    breaker = get_circuit_breaker(endpoint)
+    RETRY_BUDGET.record_request()
+    last_error = None
+
+    for attempt in range(max_retries):
+        if not breaker.allow_request():
+            raise BackendUnavailableError(endpoint, "circuit ouvert après des échecs répétés")
+        try:
+            result = await operation()
+        except slow as e:
+            breaker.record_slow()
+            if isinstance(e, no_retry) or attempt == max_retries - 1 or not RETRY_BUDGET.try_spend():
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        except retryable as e:
+            breaker.record_failure()
+            last_error = e
+            if isinstance(e, no_retry):
+                break
+            if attempt < max_retries - 1 and RETRY_BUDGET.try_spend():
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            break
+        except Exception:
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+    raise BackendUnavailableError(endpoint, str(last_error)) from last_error
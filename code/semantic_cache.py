@@ -0,0 +1,277 @@
+# semantic_cache.py
+"""
+Semantic Cache - Reuse the SPARQL of a previously answered paraphrase
+A question is linked to the entities it names (as for the template router)
+and the rest of it, its intent, is embedded on the CPU; a new question
+reuses the cached query of the closest earlier question naming the same
+entities, numbers and comparison / negation words once their similarity
+reaches the threshold
+"""
+
+import re
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from math import sqrt
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from config import (
+    SEMANTIC_CACHE_EMBEDDER,
+    SEMANTIC_CACHE_MODEL,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES
+)
+from template_router import EntityIndex, INSTANCE, fold, link_entities
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+# Question words, articles and filler verbs: they carry no intent of their own
+_STOPWORDS = frozenset("""
+    a au aux avec c ce ces cet cette d dans de des du elle en est et il ils l la le les leur leurs
+    me moi mon ma mes ont par pour qu que quel quelle quelles quels qui quoi s sa se ses son sont sur t
+    un une y dis donne donner fait font peux pourrais connais tu vous svp existe existent liste lister affiche montre
+""".split())
+
+# Words that invert or bound a FILTER: "plus de 10 ans" and "moins de 10 ans" never share a query
+_OPERATOR_RE = re.compile(
+    r"\b(plus|moins|avant|apres|pas|sans|ne|n|aucun|aucune|jamais|sauf|entre|depuis)\b"
+    r"|\b(superieur|inferieur|max|min)\w*|\b\d+\b"
+)
+
+# The entities, numbers and operators of a question: all must match for a reuse
+Signature = Tuple[FrozenSet[str], Tuple[str, ...]]
+CacheEntry = namedtuple("CacheEntry", ["question", "signature", "vector", "query_result"])
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embedding: content words and their character trigrams
+    hashed into a fixed-size vector (tolerates plurals, typos and word order)
+    """
+
+    name = "hashing"
+    default_threshold = 0.9  # Bag of words: only near-identical wordings are reused
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _add(self, vector: List[float], feature: str, weight: float):
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % self.dimensions] += weight if (h >> 31) & 1 else -weight
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = [word for word in text.split() if word not in _STOPWORDS]
+        for word in words:
+            self._add(vector, "w:" + word, 1.0)
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                self._add(vector, "c:" + padded[i:i + 3], 0.3)
+        if not words:
+            self._add(vector, "empty", 1.0)  # "Dakota ?" and "dakota" ask the same thing
+        return _normalize(vector)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model, run on the CPU"""
+
+    name = "sentence-transformers"
+    default_threshold = 0.9
+
+    def __init__(self, model_name: str = SEMANTIC_CACHE_MODEL):
+        """
+        Args:
+            model_name: Hugging Face model id or local path
+        """
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise ImportError(
+                "SentenceTransformerEmbedder requires sentence-transformers. "
+                "Install with: pip install sentence-transformers"
+            )
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(self, text: str) -> List[float]:
+        return [float(x) for x in self.model.encode(text, normalize_embeddings=True)]
+
+
+def get_embedder(kind: str = SEMANTIC_CACHE_EMBEDDER):
+    """
+    Embedder named by SEMANTIC_CACHE_EMBEDDER
+
+    Args:
+        kind: "sentence-transformers", "hashing" or "auto" (the model when
+            it is installed and loads, hashing otherwise)
+
+    Returns:
+        Object with name, default_threshold and embed(text) -> unit vector
+    """
+    if kind == "hashing":
+        return HashingEmbedder()
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder()
+    if SENTENCE_TRANSFORMERS_AVAILABLE:
+        try:
+            return SentenceTransformerEmbedder()
+        except Exception as e:
+            print(f"Modèle d'embedding non chargé ({e}), repli sur l'embedding par hachage")
+    else:
+        print("Cache sémantique: sentence-transformers absent, embedding par hachage (seuil strict)")
+    return HashingEmbedder()
+
+
+class SemanticQuestionCache:
+    """In-memory vector index of answered questions and their SPARQL queries"""
+
+    def __init__(
+        self,
+        client=None,
+        index: Optional[EntityIndex] = None,
+        embedder=None,
+        threshold: Optional[float] = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES
+    ):
+        """
+        Args:
+            client: GraphDB client the individuals are read from (if no index)
+            index: EntityIndex to share with the template router
+            embedder: Embedder (default: get_embedder())
+            threshold: Minimum cosine similarity for a reuse (None: the embedder's default)
+            max_entries: Questions kept (LRU)
+        """
+        self.index = index if index is not None else EntityIndex(client)
+        self.embedder = embedder if embedder is not None else get_embedder()
+        self.threshold = threshold if threshold is not None else self.embedder.default_threshold
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()  # Folded question -> entry
+        self._buckets: Dict[Signature, set] = {}                       # Signature -> folded questions
+        self._lock = threading.Lock()
+        self._last: Optional[Tuple[str, Signature, List[float]]] = None
+        self._stats = {"lookups": 0, "hits": 0}
+
+    def _encode(self, question: str) -> Tuple[str, Signature, List[float]]:
+        """Folded question, its signature and the embedding of its intent"""
+        last = self._last
+        if last is not None and last[0] == fold(question):
+            return last
+
+        text = fold(question)
+        links = link_entities(self.index, text)
+        # Individuals are matched by the signature; class words ("chevaux") stay part of the intent
+        intent = f" {text} "
+        for link in links:
+            if link.tier == INSTANCE:
+                intent = intent.replace(f" {link.surface} ", " ")
+        operators = [match.group(1) or match.group(2) or match.group(0) for match in _OPERATOR_RE.finditer(text)]
+        signature = (frozenset(link.iri for link in links), tuple(sorted(operators)))
+        encoded = (text, signature, self.embedder.embed(intent.strip()))
+        self._last = encoded
+        return encoded
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached query of the closest paraphrase of a question
+
+        Args:
+            question: Question in natural language
+
+        Returns:
+            Dict shaped like IntelligentSPARQLGenerator.generate_sparql, plus
+            semantic_match {"question", "similarity"}, or None to generate
+        """
+        try:
+            text, signature, vector = self._encode(question)
+        except Exception as e:
+            print(f"Cache sémantique ignoré: {e}")
+            return None
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            best, similarity = None, -1.0
+            for key in self._buckets.get(signature, ()):
+                entry = self._entries[key]
+                score = _dot(vector, entry.vector)
+                if score > similarity:
+                    best, similarity = entry, score
+            if best is None or similarity < self.threshold:
+                return None
+            self._entries.move_to_end(fold(best.question))
+            self._stats["hits"] += 1
+
+        query_result = dict(best.query_result)
+        query_result["semantic_match"] = {"question": best.question, "similarity": round(similarity, 3)}
+        return query_result
+
+    def store(self, question: str, query_result: Dict[str, Any]):
+        """
+        Remember the query that answered a question
+
+        Args:
+            question: Question in natural language
+            query_result: Dict shaped like IntelligentSPARQLGenerator.generate_sparql
+        """
+        try:
+            text, signature, vector = self._encode(question)
+        except Exception as e:
+            print(f"Cache sémantique ignoré: {e}")
+            return
+
+        query_result = {key: value for key, value in query_result.items() if key != "semantic_match"}
+        with self._lock:
+            previous = self._entries.pop(text, None)
+            if previous is not None:
+                self._buckets[previous.signature].discard(text)
+            self._entries[text] = CacheEntry(question, signature, vector, query_result)
+            self._buckets.setdefault(signature, set()).add(text)
+            while len(self._entries) > self.max_entries:
+                key, entry = self._entries.popitem(last=False)
+                self._buckets[entry.signature].discard(key)
+
+    def forget(self, question: str):
+        """Drop the entry of a question (e.g. its query stopped returning rows)"""
+        text = fold(question)
+        with self._lock:
+            entry = self._entries.pop(text, None)
+            if entry is not None:
+                self._buckets[entry.signature].discard(text)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate (questions answered without the SPARQL LLM) and index size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["embedder"] = self.embedder.name
+        return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from graphdb_client import get_graphdb_client
+
+    parser = argparse.ArgumentParser(description="Similarité entre questions vue par le cache sémantique")
+    parser.add_argument("reference", help="Question déjà posée")
+    parser.add_argument("questions", nargs="+", help="Questions à comparer")
+    args = parser.parse_args()
+
+    cache = SemanticQuestionCache(get_graphdb_client())
+    _, reference_signature, reference_vector = cache._encode(args.reference)
+    print(f"Embedding: {cache.embedder.name}, seuil {cache.threshold}")
+    for question in args.questions:
+        _, signature, vector = cache._encode(question)
+        similarity = _dot(reference_vector, vector)
+        reused = signature == reference_signature and similarity >= cache.threshold
+        print(f"  {'réutilisée' if reused else 'générée':<10} {similarity:.2f}  {question}"
+              + ("" if signature == reference_signature else "  (entités, nombres ou comparaisons différents)"))
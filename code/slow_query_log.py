@@ -0,0 +1,170 @@
+# slow_query_log.py
+"""
+Slow Query Log - Capture GraphDB query plans of slow generated queries
+Queries over SLOW_QUERY_THRESHOLD are re-run in GraphDB's explain mode and
+logged (query, latency, rows, plan) to a local JSON-lines file
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from config import SLOW_QUERY_THRESHOLD, SLOW_QUERY_LOG, SLOW_QUERY_EXPLAIN
+from sparql_tokenizer import tokenize, is_keyword, PUNCT, SPARQLSyntaxError
+
+# GraphDB returns the query plan instead of the results for this pseudo-graph
+EXPLAIN_GRAPH = "http://www.ontotext.com/explain"
+
+
+def explain_query(sparql_query: str) -> Optional[str]:
+    """
+    Rewrite a SELECT query into GraphDB's explain form (FROM onto:explain)
+
+    Args:
+        sparql_query: SPARQL query string
+
+    Returns:
+        Explain query, or None if the query is not a SELECT
+    """
+    try:
+        tokens = tokenize(sparql_query)
+    except SPARQLSyntaxError:
+        return None
+
+    seen_select = False
+    for token in tokens:
+        if is_keyword(token, "SELECT"):
+            seen_select = True
+        elif is_keyword(token, "ASK", "CONSTRUCT", "DESCRIBE"):
+            return None
+        elif seen_select and (is_keyword(token, "FROM", "WHERE") or (token.kind == PUNCT and token.value == "{")):
+            position = token.start
+            return f"{sparql_query[:position]}FROM <{EXPLAIN_GRAPH}>\n{sparql_query[position:]}"
+    return None
+
+
+def plan_from_result(result: Dict[str, Any]) -> Optional[str]:
+    """Extract the plan text from the result of an explain query"""
+    bindings = result.get("results", {}).get("bindings", [])
+    if not bindings:
+        return None
+    return "\n".join(str(value.get("value", "")) for value in bindings[0].values())
+
+
+class SlowQueryLog:
+    """Append-only JSON-lines log of slow queries and their plans"""
+
+    def __init__(
+        self,
+        path: str = SLOW_QUERY_LOG,
+        threshold: float = SLOW_QUERY_THRESHOLD,
+        explain: bool = SLOW_QUERY_EXPLAIN
+    ):
+        """
+        Args:
+            path: Log file
+            threshold: Latency in seconds above which a query is logged (0 = off)
+            explain: Re-run slow queries in explain mode to capture their plan
+        """
+        self.path = Path(path)
+        self.threshold = threshold
+        self.explain = explain
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def observe(
+        self,
+        sparql_query: str,
+        latency: float,
+        rows: int,
+        endpoint: str,
+        run_query: Callable[[str], Dict[str, Any]]
+    ):
+        """
+        Record a query if it was slow
+
+        The explain query runs in a background thread so the caller does not
+        wait for the plan.
+
+        Args:
+            sparql_query: Query that was executed
+            latency: Execution time in seconds
+            rows: Number of result rows
+            endpoint: Endpoint that answered
+            run_query: Callable executing a query (used for the explain query)
+        """
+        if not self.enabled or latency < self.threshold:
+            return
+
+        entry = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endpoint": endpoint,
+            "latency_s": round(latency, 3),
+            "rows": rows,
+            "query": sparql_query,
+            "plan": None
+        }
+
+        explain = explain_query(sparql_query) if self.explain else None
+        if explain is None:
+            self._write(entry)
+            return
+
+        def _capture():
+            try:
+                entry["plan"] = plan_from_result(run_query(explain))
+            except Exception as e:
+                entry["plan_error"] = str(e)
+            self._write(entry)
+
+        threading.Thread(target=_capture, name="slow-query-explain", daemon=True).start()
+
+    def _write(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Every logged query (unreadable lines are skipped)"""
+        if not self.path.exists():
+            return []
+        entries = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def slowest(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Logged queries, slowest first"""
+        return sorted(self.entries(), key=lambda entry: entry["latency_s"], reverse=True)[:limit]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Requêtes SPARQL les plus lentes et leurs plans d'exécution")
+    parser.add_argument('--top', type=int, default=10, help="Nombre de requêtes à afficher")
+    parser.add_argument('--no-plan', action='store_true', help="Ne pas afficher les plans")
+    parser.add_argument('--log', type=str, default=SLOW_QUERY_LOG, help="Fichier de log")
+    args = parser.parse_args()
+
+    slowest = SlowQueryLog(args.log).slowest(args.top)
+    if not slowest:
+        print(f"Aucune requête lente enregistrée dans {args.log}")
+
+    for rank, entry in enumerate(slowest, 1):
+        print("=" * 80)
+        print(f"#{rank}  {entry['latency_s']}s  {entry['rows']} ligne(s)  {entry['timestamp']}  {entry['endpoint']}")
+        print("-" * 80)
+        print(entry["query"].strip())
+        if not args.no_plan:
+            print("-" * 80)
+            print(entry.get("plan") or f"(pas de plan: {entry.get('plan_error', 'non capturé')})")
@@ -0,0 +1,658 @@
+# sparql_ast.py
+"""
+SPARQL AST - Parser and serializer for the SELECT / ASK queries we generate
+Group graph patterns become nodes (triple patterns, FILTER, OPTIONAL, UNION,
+...) that the rewriting and optimization passes inspect and rearrange
+"""
+
+from typing import Iterator, List, Optional, Set, Tuple
+from sparql_tokenizer import (
+    Token,
+    tokenize,
+    split_prologue,
+    is_keyword,
+    IRI,
+    PNAME,
+    VAR,
+    STRING,
+    LANGTAG,
+    NUMBER,
+    NAME,
+    PUNCT,
+    SPARQLSyntaxError
+)
+
+# An RDF term, property path or expression, kept as its tokens
+Term = Tuple[Token, ...]
+
+_MODIFIER_KEYWORDS = ("GROUP", "HAVING", "ORDER", "LIMIT", "OFFSET", "VALUES")
+
+
+class UnsupportedSyntax(SPARQLSyntaxError):
+    """Valid SPARQL this parser does not model (the query may still be fine)"""
+
+
+def var_names(tokens) -> Set[str]:
+    """Names (without ?/$) of the variables appearing in tokens"""
+    return {token.value[1:] for token in tokens if token.kind == VAR}
+
+
+def make_var(name: str) -> Token:
+    return Token(VAR, "?" + name)
+
+
+def make_term(value: str) -> Token:
+    """Token for an IRI (<...>), prefixed name or the keyword a"""
+    if value.startswith("<"):
+        return Token(IRI, value)
+    if value == "a":
+        return Token(NAME, value)
+    return Token(PNAME, value)
+
+
+def join_tokens(tokens) -> str:
+    """Serialize expression tokens with conventional spacing"""
+    parts = []
+    previous = before = None
+    for token in tokens:
+        value = token.value
+        if previous is not None:
+            unary_sign = (
+                previous.value in ("+", "-") and token.kind == NUMBER
+                and (before is None or (before.kind == PUNCT and before.value != ")"))
+            )
+            glued = (
+                value in (")", ",", ";") or token.kind == LANGTAG or value == "^^"
+                or previous.value in ("(", "^^", "!") or unary_sign
+                or (value == "(" and previous.kind in (NAME, IRI, PNAME))
+            )
+            if not glued:
+                parts.append(" ")
+        parts.append(value)
+        previous, before = token, previous
+    return "".join(parts)
+
+
+def term_text(term: Term) -> str:
+    """Serialize a term or property path (no inner spaces)"""
+    if len(term) > 1 and term[0].kind == STRING:
+        return join_tokens(term)
+    return "".join(token.value for token in term)
+
+
+# ----------------------------------------------------------------------------
+# Nodes
+# ----------------------------------------------------------------------------
+
+class TriplePattern:
+    """subject predicate object"""
+
+    def __init__(self, subject: Term, predicate: Term, obj: Term):
+        self.subject = subject
+        self.predicate = predicate
+        self.object = obj
+
+    @property
+    def is_path(self) -> bool:
+        return len(self.predicate) > 1
+
+    def variables(self) -> Set[str]:
+        return var_names(self.subject + self.predicate + self.object)
+
+    def bound_variables(self) -> Set[str]:
+        return self.variables()
+
+    def serialize(self, indent: str) -> List[str]:
+        return [f"{indent}{term_text(self.subject)} {term_text(self.predicate)} {term_text(self.object)} ."]
+
+
+class Filter:
+    """FILTER constraint (expression tokens, without the FILTER keyword)"""
+
+    def __init__(self, expression: List[Token]):
+        self.expression = expression
+
+    def variables(self) -> Set[str]:
+        return var_names(self.expression)
+
+    def bound_variables(self) -> Set[str]:
+        return set()
+
+    def serialize(self, indent: str) -> List[str]:
+        separator = "" if self.expression and self.expression[0].value == "(" else " "
+        return [f"{indent}FILTER{separator}{join_tokens(self.expression)}"]
+
+
+class Bind:
+    """BIND(expression AS ?var) (tokens include the parentheses)"""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+
+    @property
+    def target(self) -> Optional[str]:
+        if len(self.tokens) >= 2 and self.tokens[-2].kind == VAR:
+            return self.tokens[-2].value[1:]
+        return None
+
+    def variables(self) -> Set[str]:
+        return var_names(self.tokens)
+
+    def bound_variables(self) -> Set[str]:
+        return {self.target} if self.target else set()
+
+    def serialize(self, indent: str) -> List[str]:
+        return [f"{indent}BIND{join_tokens(self.tokens)}"]
+
+
+class Raw:
+    """Any other element (inline VALUES, ...) kept as tokens"""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+
+    def variables(self) -> Set[str]:
+        return var_names(self.tokens)
+
+    def bound_variables(self) -> Set[str]:
+        if self.tokens and is_keyword(self.tokens[0], "VALUES"):
+            return self.variables()
+        return set()
+
+    def serialize(self, indent: str) -> List[str]:
+        return [indent + join_tokens(self.tokens)]
+
+
+class GroupPattern:
+    """{ ... } : ordered list of elements"""
+
+    def __init__(self, elements: Optional[list] = None):
+        self.elements = elements if elements is not None else []
+
+    def variables(self) -> Set[str]:
+        names = set()
+        for element in self.elements:
+            names |= element.variables()
+        return names
+
+    def bound_variables(self) -> Set[str]:
+        names = set()
+        for element in self.elements:
+            names |= element.bound_variables()
+        return names
+
+    def triples(self) -> List[TriplePattern]:
+        """Triple patterns directly in this group"""
+        return [element for element in self.elements if isinstance(element, TriplePattern)]
+
+    def serialize(self, indent: str) -> List[str]:
+        lines = [indent + "{"]
+        lines.extend(self.serialize_body(indent + "  "))
+        lines.append(indent + "}")
+        return lines
+
+    def serialize_body(self, indent: str) -> List[str]:
+        lines = []
+        for element in self.elements:
+            lines.extend(element.serialize(indent))
+        return lines
+
+
+class Optional_:
+    """OPTIONAL { ... }"""
+
+    keyword = "OPTIONAL"
+
+    def __init__(self, group: GroupPattern):
+        self.group = group
+
+    def variables(self) -> Set[str]:
+        return self.group.variables()
+
+    def bound_variables(self) -> Set[str]:
+        return set()
+
+    def serialize(self, indent: str) -> List[str]:
+        lines = self.group.serialize(indent)
+        lines[0] = f"{indent}{self.keyword} {{"
+        return lines
+
+
+class Minus(Optional_):
+    """MINUS { ... }"""
+
+    keyword = "MINUS"
+
+
+class NamedGroup(Optional_):
+    """GRAPH term { ... } / SERVICE term { ... }"""
+
+    def __init__(self, keyword_tokens: List[Token], group: GroupPattern):
+        super().__init__(group)
+        self.keyword_tokens = keyword_tokens
+
+    @property
+    def keyword(self):
+        return join_tokens(self.keyword_tokens)
+
+    def variables(self) -> Set[str]:
+        return var_names(self.keyword_tokens) | self.group.variables()
+
+    def bound_variables(self) -> Set[str]:
+        return var_names(self.keyword_tokens) | self.group.bound_variables()
+
+
+class Union:
+    """{ ... } UNION { ... } ..."""
+
+    def __init__(self, groups: List[GroupPattern]):
+        self.groups = groups
+
+    def variables(self) -> Set[str]:
+        names = set()
+        for group in self.groups:
+            names |= group.variables()
+        return names
+
+    def bound_variables(self) -> Set[str]:
+        bound = [group.bound_variables() for group in self.groups]
+        return set.intersection(*bound) if bound else set()
+
+    def serialize(self, indent: str) -> List[str]:
+        lines = []
+        for i, group in enumerate(self.groups):
+            group_lines = group.serialize(indent)
+            if i:
+                group_lines[0] = f"{indent}UNION {{"
+            lines.extend(group_lines)
+        return lines
+
+
+class SubSelect:
+    """{ SELECT ... } nested query"""
+
+    def __init__(self, query: "Query"):
+        self.query = query
+
+    def variables(self) -> Set[str]:
+        return self.query.projected_variables()
+
+    def bound_variables(self) -> Set[str]:
+        return self.query.projected_variables()
+
+    def serialize(self, indent: str) -> List[str]:
+        return [indent + line for line in self.query.serialize_body()]
+
+
+class Query:
+    """SELECT or ASK query"""
+
+    def __init__(self):
+        self.prefixes: List[Tuple[str, str]] = []
+        self.base = ""
+        self.form = "SELECT"
+        self.modifier: Optional[str] = None
+        self.projection: List[Term] = []
+        self.star = False
+        self.dataset: List[Token] = []
+        self.where = GroupPattern()
+        self.group_by: List[Token] = []
+        self.having: List[Token] = []
+        self.order_by: List[Token] = []
+        self.limit: Optional[int] = None
+        self.offset: Optional[int] = None
+        self.values: List[Token] = []
+
+    def prefix_map(self) -> dict:
+        """pname ("horses:") -> namespace IRI (without brackets)"""
+        return {pname: iri[1:-1] for pname, iri in self.prefixes}
+
+    def projected_variables(self) -> Set[str]:
+        if self.star:
+            return self.where.variables()
+        names = set()
+        for item in self.projection:
+            if len(item) == 1:
+                names.add(item[0].value[1:])
+            elif len(item) >= 2 and item[-2].kind == VAR:
+                names.add(item[-2].value[1:])  # ( expression AS ?var )
+        return names
+
+    def serialize_body(self) -> List[str]:
+        """Query without its prologue"""
+        head = self.form
+        if self.modifier:
+            head += " " + self.modifier
+        if self.form == "SELECT":
+            head += " *" if self.star else " " + " ".join(
+                term_text(item) if len(item) == 1 else join_tokens(item) for item in self.projection
+            )
+        lines = [head]
+        if self.dataset:
+            lines.append(join_tokens(self.dataset))
+        where = self.where.serialize("")
+        where[0] = "WHERE {"
+        lines.extend(where)
+        if self.group_by:
+            lines.append("GROUP BY " + join_tokens(self.group_by))
+        if self.having:
+            lines.append("HAVING " + join_tokens(self.having))
+        if self.order_by:
+            lines.append("ORDER BY " + join_tokens(self.order_by))
+        if self.limit is not None:
+            lines.append(f"LIMIT {self.limit}")
+        if self.offset:
+            lines.append(f"OFFSET {self.offset}")
+        if self.values:
+            lines.append(join_tokens(self.values))
+        return lines
+
+    def to_string(self) -> str:
+        lines = []
+        if self.base:
+            lines.append(f"BASE {self.base}")
+        lines.extend(f"PREFIX {pname} {iri}" for pname, iri in self.prefixes)
+        if lines:
+            lines.append("")
+        lines.extend(self.serialize_body())
+        return "\n".join(lines)
+
+
+def iter_groups(group: GroupPattern) -> Iterator[GroupPattern]:
+    """Yield a group and every group nested in it (OPTIONAL, UNION, ...)"""
+    yield group
+    for element in group.elements:
+        if isinstance(element, GroupPattern):
+            yield from iter_groups(element)
+        elif isinstance(element, Optional_):
+            yield from iter_groups(element.group)
+        elif isinstance(element, Union):
+            for branch in element.groups:
+                yield from iter_groups(branch)
+        elif isinstance(element, SubSelect):
+            yield from iter_groups(element.query.where)
+
+
+# ----------------------------------------------------------------------------
+# Parser
+# ----------------------------------------------------------------------------
+
+class _Parser:
+    """Recursive descent over the body tokens of a query"""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise SPARQLSyntaxError("Fin de requête inattendue")
+        self.pos += 1
+        return token
+
+    def at(self, value: str) -> bool:
+        token = self.peek()
+        return token is not None and token.kind == PUNCT and token.value == value
+
+    def expect(self, value: str) -> Token:
+        token = self.next()
+        if token.value != value:
+            raise SPARQLSyntaxError(f"'{value}' attendu, '{token.value}' trouvé")
+        return token
+
+    def balanced(self, open_value: str, close_value: str) -> List[Token]:
+        """Tokens of a bracketed block, brackets included"""
+        tokens = [self.expect(open_value)]
+        depth = 1
+        while depth:
+            token = self.next()
+            if token.kind == PUNCT and token.value == open_value:
+                depth += 1
+            elif token.kind == PUNCT and token.value == close_value:
+                depth -= 1
+            tokens.append(token)
+        return tokens
+
+    # -- query -------------------------------------------------------------
+
+    def query(self, nested: bool = False) -> Query:
+        query = Query()
+        token = self.next()
+        if is_keyword(token, "CONSTRUCT", "DESCRIBE"):
+            raise UnsupportedSyntax(f"Forme de requête non supportée: {token.value}")
+        if not is_keyword(token, "SELECT", "ASK"):
+            raise SPARQLSyntaxError(f"SELECT ou ASK attendu, '{token.value}' trouvé")
+        query.form = token.value.upper()
+
+        if query.form == "SELECT":
+            if self.peek() is not None and is_keyword(self.peek(), "DISTINCT", "REDUCED"):
+                query.modifier = self.next().value.upper()
+            while True:
+                token = self.peek()
+                if token is None:
+                    raise SPARQLSyntaxError("Clause WHERE manquante")
+                if token.kind == VAR:
+                    query.projection.append((self.next(),))
+                elif token.kind == PUNCT and token.value == "*":
+                    self.next()
+                    query.star = True
+                elif token.kind == PUNCT and token.value == "(":
+                    query.projection.append(tuple(self.balanced("(", ")")))
+                else:
+                    break
+            if not query.star and not query.projection:
+                raise SPARQLSyntaxError("Projection vide")
+
+        while self.peek() is not None and is_keyword(self.peek(), "FROM"):
+            query.dataset.append(self.next())
+            if self.peek() is not None and is_keyword(self.peek(), "NAMED"):
+                query.dataset.append(self.next())
+            query.dataset.append(self.next())
+
+        if self.peek() is not None and is_keyword(self.peek(), "WHERE"):
+            self.next()
+        query.where = self.group()
+
+        while self.peek() is not None and not (nested and self.at("}")):
+            token = self.next()
+            keyword = token.value.upper() if token.kind == NAME else None
+            if keyword == "GROUP" and is_keyword(self.peek() or token, "BY"):
+                self.next()
+                query.group_by = self.clause_tokens(nested)
+            elif keyword == "HAVING":
+                query.having = self.clause_tokens(nested)
+            elif keyword == "ORDER" and is_keyword(self.peek() or token, "BY"):
+                self.next()
+                query.order_by = self.clause_tokens(nested)
+            elif keyword in ("LIMIT", "OFFSET") and self.peek() is not None and self.peek().kind == NUMBER:
+                value = int(self.next().value)
+                if keyword == "LIMIT":
+                    query.limit = value
+                else:
+                    query.offset = value
+            elif keyword == "VALUES" and not nested:
+                query.values = [token] + self.tokens[self.pos:]
+                self.pos = len(self.tokens)
+            else:
+                raise SPARQLSyntaxError(f"Modificateur inattendu: {token.value}")
+        return query
+
+    def clause_tokens(self, nested: bool) -> List[Token]:
+        """Tokens of a solution modifier, up to the next modifier keyword"""
+        tokens = []
+        depth = 0
+        while self.peek() is not None:
+            token = self.peek()
+            if depth == 0 and (is_keyword(token, *_MODIFIER_KEYWORDS) or (nested and self.at("}"))):
+                break
+            if token.kind == PUNCT and token.value == "(":
+                depth += 1
+            elif token.kind == PUNCT and token.value == ")":
+                depth -= 1
+            tokens.append(self.next())
+        if not tokens:
+            raise SPARQLSyntaxError("Modificateur vide")
+        return tokens
+
+    # -- group graph patterns ---------------------------------------------
+
+    def group(self) -> GroupPattern:
+        self.expect("{")
+        if self.peek() is not None and is_keyword(self.peek(), "SELECT"):
+            query = self.query(nested=True)
+            self.expect("}")
+            return GroupPattern([SubSelect(query)])
+
+        group = GroupPattern()
+        while not self.at("}"):
+            token = self.peek()
+            if token is None:
+                raise SPARQLSyntaxError("'}' manquant")
+            if token.kind == PUNCT and token.value == ".":
+                self.next()
+            elif token.kind == PUNCT and token.value == "{":
+                branches = [self.group()]
+                while self.peek() is not None and is_keyword(self.peek(), "UNION"):
+                    self.next()
+                    branches.append(self.group())
+                group.elements.append(Union(branches) if len(branches) > 1 else branches[0])
+            elif is_keyword(token, "OPTIONAL"):
+                self.next()
+                group.elements.append(Optional_(self.group()))
+            elif is_keyword(token, "MINUS"):
+                self.next()
+                group.elements.append(Minus(self.group()))
+            elif is_keyword(token, "GRAPH", "SERVICE"):
+                keyword_tokens = [self.next()]
+                if is_keyword(self.peek() or token, "SILENT"):
+                    keyword_tokens.append(self.next())
+                keyword_tokens.append(self.next())
+                group.elements.append(NamedGroup(keyword_tokens, self.group()))
+            elif is_keyword(token, "FILTER"):
+                self.next()
+                group.elements.append(Filter(self.constraint()))
+            elif is_keyword(token, "BIND"):
+                self.next()
+                group.elements.append(Bind(self.balanced("(", ")")))
+            elif is_keyword(token, "VALUES"):
+                tokens = [self.next()]
+                if self.at("("):
+                    tokens.extend(self.balanced("(", ")"))
+                else:
+                    tokens.append(self.next())
+                tokens.extend(self.balanced("{", "}"))
+                group.elements.append(Raw(tokens))
+            else:
+                group.elements.extend(self.triples())
+        self.expect("}")
+        return group
+
+    def constraint(self) -> List[Token]:
+        """Expression of a FILTER"""
+        token = self.peek()
+        if token is None:
+            raise SPARQLSyntaxError("FILTER vide")
+        if token.kind == PUNCT and token.value == "(":
+            return self.balanced("(", ")")
+        if is_keyword(token, "NOT") and self.peek(1) is not None and is_keyword(self.peek(1), "EXISTS"):
+            return [self.next(), self.next()] + self.balanced("{", "}")
+        if is_keyword(token, "EXISTS"):
+            return [self.next()] + self.balanced("{", "}")
+        if token.kind in (NAME, IRI, PNAME):
+            return [self.next()] + self.balanced("(", ")")
+        raise SPARQLSyntaxError(f"FILTER non reconnu: {token.value}")
+
+    def triples(self) -> List[TriplePattern]:
+        """Triples sharing a subject (predicate-object lists with ; and ,)"""
+        subject = self.term()
+        patterns = []
+        while True:
+            predicate = self.verb()
+            patterns.append(TriplePattern(subject, predicate, self.term()))
+            while self.at(","):
+                self.next()
+                patterns.append(TriplePattern(subject, predicate, self.term()))
+            if not self.at(";"):
+                break
+            while self.at(";"):
+                self.next()
+            if self.at(".") or self.at("}"):
+                break
+        if self.at("."):
+            self.next()
+        return patterns
+
+    def term(self) -> Term:
+        token = self.next()
+        if token.kind in (VAR, IRI, PNAME, NUMBER):
+            return (token,)
+        if token.kind == NAME and token.value.lower() in ("true", "false"):
+            return (token,)
+        if token.kind == STRING:
+            if self.peek() is not None and self.peek().kind == LANGTAG:
+                return (token, self.next())
+            if self.at("^^"):
+                return (token, self.next(), self.next())
+            return (token,)
+        if token.kind == PUNCT and token.value in ("+", "-") and self.peek() is not None and self.peek().kind == NUMBER:
+            return (Token(NUMBER, token.value + self.next().value, token.start),)
+        if token.kind == PUNCT and token.value == "[" and self.at("]"):
+            return (token, self.next())
+        if token.kind == PUNCT and token.value in ("[", "("):
+            raise UnsupportedSyntax(f"Terme non supporté: {token.value}")
+        raise SPARQLSyntaxError(f"Terme inattendu: {token.value}")
+
+    def verb(self) -> Term:
+        token = self.peek()
+        if token is not None and token.kind == VAR:
+            return (self.next(),)
+
+        path = []
+        while True:
+            while self.at("^") or self.at("!"):
+                path.append(self.next())
+            token = self.peek()
+            if token is None:
+                raise SPARQLSyntaxError("Prédicat manquant")
+            if token.kind in (IRI, PNAME) or (token.kind == NAME and token.value == "a"):
+                path.append(self.next())
+            elif token.kind == PUNCT and token.value == "(":
+                path.extend(self.balanced("(", ")"))
+            else:
+                raise SPARQLSyntaxError(f"Prédicat non supporté: {token.value}")
+            if self.at("*") or self.at("+") or self.at("?"):
+                path.append(self.next())
+            if self.at("/") or self.at("|"):
+                path.append(self.next())
+                continue
+            return tuple(path)
+
+
+def parse_query(sparql_query: str) -> Query:
+    """
+    Parse a SELECT or ASK query
+
+    Args:
+        sparql_query: SPARQL query string
+
+    Returns:
+        Query AST
+
+    Raises:
+        UnsupportedSyntax: valid query using a form the AST does not model
+            (CONSTRUCT / DESCRIBE, blank node property lists, collections)
+        SPARQLSyntaxError: the query is invalid
+    """
+    prefixes, base, body = split_prologue(tokenize(sparql_query))
+    parser = _Parser(body)
+    query = parser.query()
+    if parser.peek() is not None:
+        raise SPARQLSyntaxError(f"Texte inattendu après la requête: {parser.peek().value}")
+    query.prefixes = prefixes
+    query.base = base
+    return query
@@ -0,0 +1,251 @@
+# sparql_pagination.py
+"""
+SPARQL Pagination - LIMIT/OFFSET injection and cursors for generated SELECTs
+Caps the rows fetched per question and reports whether more rows exist
+"""
+
+import re
+from typing import Dict, Any, List, Optional, Tuple
+from config import SPARQL_PAGE_SIZE
+from sparql_tokenizer import tokenize, is_keyword, NAME, NUMBER, PUNCT, SPARQLSyntaxError
+from resilience import BackendUnavailableError
+
+_IRI_RE = re.compile(r"<[^<>\s]*>")
+_FORM_RE = re.compile(r"\b(SELECT|ASK|CONSTRUCT|DESCRIBE)\b", re.IGNORECASE)
+
+
+def _query_form(tokens) -> Optional[str]:
+    for token in tokens:
+        if is_keyword(token, "SELECT", "ASK", "CONSTRUCT", "DESCRIBE"):
+            return token.value.upper()
+    return None
+
+
+def is_select(sparql_query: str) -> bool:
+    """Whether a query is a SELECT, even when the local tokenizer cannot read it"""
+    try:
+        return _query_form(tokenize(sparql_query)) == "SELECT"
+    except SPARQLSyntaxError:
+        match = _FORM_RE.search(_IRI_RE.sub(" ", sparql_query))
+        return match is not None and match.group(1).upper() == "SELECT"
+
+
+def split_limit_offset(sparql_query: str) -> Optional[Tuple[str, Optional[int], int, int]]:
+    """
+    Remove the outer LIMIT / OFFSET of a SELECT query
+
+    Args:
+        sparql_query: SPARQL query string
+
+    Returns:
+        (query without outer LIMIT/OFFSET, limit or None, offset, position
+        where new modifiers must be inserted), or None if the query is not
+        a SELECT that can be paginated
+    """
+    try:
+        tokens = tokenize(sparql_query)
+    except SPARQLSyntaxError:
+        return None
+    if _query_form(tokens) != "SELECT":
+        return None
+
+    depth = 0
+    seen_group = False
+    limit = None
+    offset = 0
+    spans: List[Tuple[int, int]] = []
+    insert_at = None
+
+    for i, token in enumerate(tokens):
+        if token.kind == PUNCT and token.value == "{":
+            depth += 1
+            seen_group = True
+        elif token.kind == PUNCT and token.value == "}":
+            depth -= 1
+        elif depth == 0 and seen_group and token.kind == NAME:
+            upper = token.value.upper()
+            if upper in ("LIMIT", "OFFSET") and i + 1 < len(tokens) and tokens[i + 1].kind == NUMBER:
+                number = tokens[i + 1]
+                if upper == "LIMIT":
+                    limit = int(number.value)
+                else:
+                    offset = int(number.value)
+                spans.append((token.start, number.start + len(number.value)))
+            elif upper == "VALUES" and insert_at is None:
+                insert_at = token.start
+
+    if not seen_group or depth != 0:
+        return None
+
+    stripped = sparql_query
+    for start, end in reversed(spans):
+        stripped = stripped[:start] + stripped[end:]
+        if insert_at is not None and insert_at > start:
+            insert_at -= end - start
+
+    if insert_at is None:
+        stripped = stripped.rstrip()
+        insert_at = len(stripped)
+
+    return stripped, limit, offset, insert_at
+
+
+def paginate_query(sparql_query: str, limit: int, offset: int = 0) -> str:
+    """
+    Rewrite a SELECT query with the given LIMIT / OFFSET
+
+    The window is applied on top of the query's own LIMIT / OFFSET, never
+    widening it. Non-SELECT queries are returned unchanged.
+
+    Args:
+        sparql_query: SPARQL query string
+        limit: Maximum number of rows of the page
+        offset: Rows to skip, relative to the query's own OFFSET
+
+    Returns:
+        Rewritten query
+    """
+    split = split_limit_offset(sparql_query)
+    if split is None:
+        return sparql_query
+    stripped, base_limit, base_offset, insert_at = split
+
+    if base_limit is not None:
+        limit = max(0, min(limit, base_limit - offset))
+
+    modifiers = f"\nLIMIT {limit}"
+    if base_offset + offset:
+        modifiers += f"\nOFFSET {base_offset + offset}"
+    return stripped[:insert_at] + modifiers + "\n" + stripped[insert_at:].lstrip()
+
+
+class QueryCursor:
+    """
+    Page through the results of a SELECT query on demand
+
+    Each page is fetched with LIMIT page_size + 1 so the cursor knows
+    whether more rows exist without counting them. Pages are only stable
+    if the query has an ORDER BY; GraphDB is deterministic in practice.
+    A SELECT that cannot be rewritten is streamed instead, and the rest of
+    its response is left unread after page_size + 1 rows.
+
+    truncated tells whether rows were cut (what the context and the answer
+    prompt report); has_more whether fetch_next can return them, which a
+    streamed query cannot.
+    """
+
+    def __init__(self, client, sparql_query: str, page_size: int = SPARQL_PAGE_SIZE, stream: bool = False):
+        """
+        Args:
+            client: GraphDBClient (or compatible) used to run the pages
+            sparql_query: SELECT query to paginate
+            page_size: Rows per page
+            stream: Read a single page off the response stream even when
+                the query could be paginated
+        """
+        self.client = client
+        self.sparql_query = sparql_query
+        self.page_size = page_size
+
+        split = None if stream else split_limit_offset(sparql_query)
+        self.paginable = split is not None and page_size > 0
+        self.base_limit = split[1] if split is not None else None
+        self.streamable = (
+            not self.paginable and page_size > 0
+            and hasattr(client, "query_stream") and is_select(sparql_query)
+        )
+
+        self.position = 0
+        self.has_more = True
+        self.truncated = False  # Rows exist beyond the ones fetched
+        self.last_query = sparql_query
+
+    def fetch_next(self) -> Dict[str, Any]:
+        """
+        Fetch the next page
+
+        Returns:
+            Result dict (GraphDBClient.query shape) holding at most page_size bindings
+        """
+        if not self.has_more:
+            return {"results": {"bindings": []}}
+
+        if not self.paginable:
+            self.has_more = False
+            if self.streamable:
+                return self._fetch_streamed()
+            return self.client.query(self.sparql_query)
+
+        want = self.page_size
+        remaining = None
+        if self.base_limit is not None:
+            remaining = self.base_limit - self.position
+            want = min(want, remaining)
+        if want <= 0:
+            self.has_more = False
+            return {"results": {"bindings": []}}
+
+        probe = want + 1 if remaining is None or remaining > want else want
+        self.last_query = paginate_query(self.sparql_query, probe, self.position)
+        result = self.client.query(self.last_query)
+
+        bindings = result.get("results", {}).get("bindings", [])
+        self.has_more = len(bindings) > want
+        if self.has_more:
+            self.truncated = True
+            result = dict(result)
+            result["results"] = dict(result["results"])
+            result["results"]["bindings"] = bindings[:want]
+
+        self.position += min(len(bindings), want)
+        return result
+
+    def _fetch_streamed(self) -> Dict[str, Any]:
+        """First page of a SELECT without a LIMIT to rewrite, read off the response stream"""
+        try:
+            bindings = list(self.client.query_stream(self.sparql_query, max_rows=self.page_size + 1))
+        except BackendUnavailableError:
+            raise
+        except Exception as e:
+            # Same shape as GraphDBClient.query, so the repair loop sees the failure
+            return {"results": {"bindings": []}, "error": str(e)}
+
+        if len(bindings) > self.page_size:
+            self.truncated = True
+            bindings = bindings[:self.page_size]
+        self.position = len(bindings)
+        return {"results": {"bindings": bindings}}
+
+    def __iter__(self):
+        """Iterate over the remaining pages"""
+        while self.has_more:
+            yield self.fetch_next()
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from graphdb_client import get_graphdb_client
+    from context_builder import ContextBuilder
+
+    parser = argparse.ArgumentParser(description="Première page d'une requête SELECT et contexte transmis au LLM")
+    parser.add_argument("query", nargs="?", default="SELECT ?s ?p ?o WHERE { ?s ?p ?o }", help="Requête SELECT")
+    parser.add_argument("--page-size", type=int, default=SPARQL_PAGE_SIZE, help="Résultats par page")
+    parser.add_argument("--stream", action="store_true", help="Lire la page en flux, comme une requête non paginable")
+    parser.add_argument("--check", action="store_true",
+                        help="Code de sortie 1 si des résultats coupés ne sont pas signalés au LLM")
+    args = parser.parse_args()
+
+    cursor = QueryCursor(get_graphdb_client(), args.query, args.page_size, stream=args.stream)
+    page = cursor.fetch_next()
+    bindings = page.get("results", {}).get("bindings", [])
+    context = ContextBuilder().format_results(bindings, truncated=cursor.truncated)
+    mode = "flux" if cursor.streamable else "LIMIT/OFFSET" if cursor.paginable else "requête entière"
+    print(f"{len(bindings)} résultat(s) ({mode}), tronqué: {cursor.truncated}, page suivante: {cursor.has_more}")
+
+    if args.check:
+        # One more row than the page: the cut must reach the context
+        total = len(list(get_graphdb_client().query_stream(args.query, max_rows=args.page_size + 1)))
+        reported = "résultats tronqués" in context
+        print(f"Troncature {'signalée' if reported else 'non signalée'} au LLM")
+        sys.exit(0 if reported == (total > args.page_size) else 1)
@@ -0,0 +1,263 @@
+# sparql_results.py
+"""
+SPARQL Results - Compact tabular result decoding (TSV / CSV)
+Rows are kept as tuples of raw cells; consumers still see the usual
+sparql-results+json binding interface through thin read-only views
+"""
+
+import csv
+import io
+import re
+from collections.abc import Mapping, Sequence
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+# Media types negotiated with GraphDB for each result format
+RESULT_FORMATS = {
+    "json": "application/sparql-results+json",
+    "tsv": "text/tab-separated-values",
+    "csv": "text/csv",
+}
+
+_TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+_TSV_ESCAPE = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+_INTEGER = re.compile(r'^[+-]?\d+$')
+_DECIMAL = re.compile(r'^[+-]?\d*\.\d+$')
+_DOUBLE = re.compile(r'^[+-]?(?:\d+\.?\d*|\.\d+)[eE][+-]?\d+$')
+_ABSOLUTE_IRI = re.compile(r'^[A-Za-z][A-Za-z0-9+.\-]*:[^\s]*$')
+
+
+def _unescape(text: str) -> str:
+    """Undo the string escapes used in TSV literals"""
+    if "\\" not in text:
+        return text
+
+    def _replace(match):
+        if match.group(1):
+            return chr(int(match.group(1), 16))
+        if match.group(2):
+            return chr(int(match.group(2), 16))
+        return _TSV_ESCAPES.get(match.group(3), match.group(3))
+
+    return _TSV_ESCAPE.sub(_replace, text)
+
+
+def parse_tsv_term(cell: str) -> Dict[str, str]:
+    """
+    Decode one TSV cell (an RDF term in Turtle syntax) into a JSON binding value
+
+    Args:
+        cell: Raw TSV cell, e.g. '<http://...>', '"Dakota"@fr', '4'
+
+    Returns:
+        Dict with type, value and optional datatype / xml:lang
+    """
+    if cell.startswith("<") and cell.endswith(">"):
+        return {"type": "uri", "value": cell[1:-1]}
+
+    if cell.startswith("_:"):
+        return {"type": "bnode", "value": cell[2:]}
+
+    if cell.startswith('"'):
+        end = cell.rfind('"')
+        term = {"type": "literal", "value": _unescape(cell[1:end])}
+        suffix = cell[end + 1:]
+        if suffix.startswith("@"):
+            term["xml:lang"] = suffix[1:]
+        elif suffix.startswith("^^<") and suffix.endswith(">"):
+            term["datatype"] = suffix[3:-1]
+        return term
+
+    # Turtle shorthand for numbers and booleans
+    if _INTEGER.match(cell):
+        return {"type": "literal", "value": cell, "datatype": XSD + "integer"}
+    if _DECIMAL.match(cell):
+        return {"type": "literal", "value": cell, "datatype": XSD + "decimal"}
+    if _DOUBLE.match(cell):
+        return {"type": "literal", "value": cell, "datatype": XSD + "double"}
+    if cell in ("true", "false"):
+        return {"type": "literal", "value": cell, "datatype": XSD + "boolean"}
+
+    return {"type": "literal", "value": cell}
+
+
+def parse_csv_term(cell: str) -> Dict[str, str]:
+    """
+    Decode one CSV cell into a JSON binding value
+
+    CSV results carry no term types, so IRIs and blank nodes are
+    recognised from their lexical form and everything else is a literal.
+    """
+    if cell.startswith("_:"):
+        return {"type": "bnode", "value": cell[2:]}
+    if _ABSOLUTE_IRI.match(cell) and ("://" in cell or cell.startswith("urn:")):
+        return {"type": "uri", "value": cell}
+    return {"type": "literal", "value": cell}
+
+
+class BindingView(Mapping):
+    """Read-only view of one result row with the sparql-results+json binding interface"""
+
+    __slots__ = ("_vars", "_row", "_parse")
+
+    def __init__(self, variables: Tuple[str, ...], row: Tuple[Optional[str], ...], parse: Callable):
+        self._vars = variables
+        self._row = row
+        self._parse = parse
+
+    def __getitem__(self, key: str) -> Dict[str, str]:
+        try:
+            cell = self._row[self._vars.index(key)]
+        except ValueError:
+            raise KeyError(key)
+        if cell is None:
+            raise KeyError(key)
+        return self._parse(cell)
+
+    def __iter__(self) -> Iterator[str]:
+        return (var for var, cell in zip(self._vars, self._row) if cell is not None)
+
+    def __len__(self) -> int:
+        return sum(1 for cell in self._row if cell is not None)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class BindingsView(Sequence):
+    """Read-only list of BindingView over a ResultTable"""
+
+    __slots__ = ("table",)
+
+    def __init__(self, table: "ResultTable"):
+        self.table = table
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return BindingView(self.table.vars, self.table.rows[index], self.table.parse_term)
+
+    def __len__(self) -> int:
+        return len(self.table.rows)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class ResultTable:
+    """Decoded tabular SPARQL result: a column header plus compact row tuples"""
+
+    __slots__ = ("vars", "rows", "parse_term")
+
+    def __init__(
+        self,
+        variables: Tuple[str, ...],
+        rows: List[Tuple[Optional[str], ...]],
+        parse_term: Callable = parse_tsv_term
+    ):
+        """
+        Args:
+            variables: Column names (without '?')
+            rows: One tuple of raw cells per solution (None = unbound)
+            parse_term: Function decoding a raw cell into a binding value
+        """
+        self.vars = variables
+        self.rows = rows
+        self.parse_term = parse_term
+
+    def bindings(self) -> BindingsView:
+        """Bindings as a lazy sequence of JSON-like binding mappings"""
+        return BindingsView(self)
+
+    def to_results(self) -> Dict[str, Any]:
+        """Wrap the table in the dict shape returned by GraphDBClient.query"""
+        return {"head": {"vars": list(self.vars)}, "results": {"bindings": self.bindings()}}
+
+    def rename(self, mapping: Dict[str, str]) -> "ResultTable":
+        """Same rows under renamed columns (rows are shared, not copied)"""
+        return ResultTable(
+            tuple(mapping.get(var, var) for var in self.vars),
+            self.rows,
+            self.parse_term
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        """Fully materialized sparql-results+json dict (for serialization)"""
+        return {
+            "head": {"vars": list(self.vars)},
+            "results": {"bindings": [dict(binding) for binding in self.bindings()]}
+        }
+
+
+def _tsv_header(line: str) -> Tuple[str, ...]:
+    return tuple(name.lstrip("?$") for name in line.rstrip("\r\n").split("\t"))
+
+
+def _tsv_row(line: str, width: int) -> Tuple[Optional[str], ...]:
+    cells = line.rstrip("\r\n").split("\t")
+    cells += [""] * (width - len(cells))
+    return tuple(cell or None for cell in cells)
+
+
+def decode_tsv(text: str) -> ResultTable:
+    """
+    Decode a text/tab-separated-values SPARQL result
+
+    Args:
+        text: Full TSV body
+
+    Returns:
+        ResultTable whose cells are raw Turtle terms
+    """
+    lines = text.split("\n")
+    if not lines or not lines[0].strip():
+        return ResultTable((), [])
+    variables = _tsv_header(lines[0])
+    width = len(variables)
+    rows = [_tsv_row(line, width) for line in lines[1:] if line.strip("\r")]
+    return ResultTable(variables, rows, parse_tsv_term)
+
+
+def decode_csv(text: str) -> ResultTable:
+    """
+    Decode a text/csv SPARQL result
+
+    Args:
+        text: Full CSV body
+
+    Returns:
+        ResultTable whose cells are plain values
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if not header:
+        return ResultTable((), [], parse_csv_term)
+    variables = tuple(header)
+    rows = [tuple(cell or None for cell in row) for row in reader if row]
+    return ResultTable(variables, rows, parse_csv_term)
+
+
+def iter_tsv_bindings(lines: Iterable[str]) -> Iterator[BindingView]:
+    """
+    Lazily decode a TSV result line by line (for streaming responses)
+
+    Args:
+        lines: Decoded text lines of the TSV body
+
+    Yields:
+        One BindingView per solution
+    """
+    variables = None
+    for line in lines:
+        if variables is None:
+            variables = _tsv_header(line)
+            continue
+        if line.strip("\r"):
+            yield BindingView(variables, _tsv_row(line, len(variables)), parse_tsv_term)
+
+
+DECODERS = {
+    "tsv": decode_tsv,
+    "csv": decode_csv,
+}
@@ -0,0 +1,235 @@
+# sparql_rewriter.py
+"""
+SPARQL Rewriter - Rule-based correction of generated queries on the AST
+Declarative rules (renamed properties, inverted directions, classes written
+where a property or an instance is expected) match triple patterns whatever
+the variable names, prefixes or layout, and report which ones fired
+"""
+
+from collections import namedtuple
+from typing import Dict, List, Optional, Set
+from config import ONTOLOGY_NAMESPACE
+from graph_scope import RDF_TYPE
+from sparql_ast import parse_query, iter_groups, Query, TriplePattern, Term
+from sparql_tokenizer import Token, IRI, PNAME, NAME, VAR, SPARQLSyntaxError
+
+H = ONTOLOGY_NAMESPACE
+
+RewriteResult = namedtuple("RewriteResult", ["sparql_query", "fired"])
+
+
+class RuleContext:
+    """What the rules may look up about the query being rewritten"""
+
+    def __init__(self, query: Query):
+        self.query = query
+        self.prefixes = query.prefix_map()
+        self.types: Dict[str, Set[str]] = {}  # Variable -> classes it is typed with
+        self.subjects: Set[str] = set()       # Variables used as the subject of a non-type pattern
+        for group in iter_groups(query.where):
+            for pattern in group.triples():
+                if pattern.subject[0].kind != VAR or pattern.is_path:
+                    continue
+                name = pattern.subject[0].value[1:]
+                if self.iri(pattern.predicate) == RDF_TYPE:
+                    cls = self.iri(pattern.object)
+                    if cls is not None:
+                        self.types.setdefault(name, set()).add(cls)
+                else:
+                    self.subjects.add(name)
+
+    def iri(self, term: Term) -> Optional[str]:
+        """Full IRI of a single-token term (None for variables, literals, paths)"""
+        if len(term) != 1:
+            return None
+        token = term[0]
+        if token.kind == IRI:
+            return token.value[1:-1]
+        if token.kind == PNAME:
+            prefix, _, local = token.value.partition(":")
+            namespace = self.prefixes.get(prefix + ":")
+            return namespace + local if namespace is not None else None
+        if token.kind == NAME and token.value == "a":
+            return RDF_TYPE
+        return None
+
+    def term(self, iri: str) -> Term:
+        """Term for an IRI, using the query's own prefix when it has one"""
+        if iri == RDF_TYPE:
+            return (Token(NAME, "a"),)
+        for pname, namespace in self.prefixes.items():
+            if iri.startswith(namespace) and iri[len(namespace):].replace("_", "").isalnum():
+                return (Token(PNAME, pname + iri[len(namespace):]),)
+        return (Token(IRI, f"<{iri}>"),)
+
+
+class Role:
+    """
+    Kind of resource expected at one end of a property: an instance of
+    class, or a term whose name contains one of the hints
+    """
+
+    def __init__(self, class_iri: str, *hints: str):
+        self.class_iri = class_iri
+        self.hints = tuple(hint.lower() for hint in hints)
+
+    def matches(self, term: Term, context: RuleContext) -> bool:
+        token = term[0]
+        if token.kind == VAR:
+            if self.class_iri in context.types.get(token.value[1:], ()):
+                return True
+            name = token.value[1:].lower()
+        elif token.kind in (IRI, PNAME):
+            name = (context.iri(term) or token.value).rsplit("#", 1)[-1].rsplit("/", 1)[-1].lower()
+        else:
+            return False
+        return any(hint in name for hint in self.hints)
+
+
+class Rule:
+    """Rewrites one triple pattern (returns None when it does not apply)"""
+
+    name = "rule"
+
+    def apply(self, pattern: TriplePattern, context: RuleContext) -> Optional[TriplePattern]:
+        raise NotImplementedError
+
+
+class RenameProperty(Rule):
+    """Property that does not exist (any more) -> its replacement"""
+
+    def __init__(self, old: str, new: str):
+        self.old = old
+        self.new = new
+        self.name = f"rename:{old.rsplit('#', 1)[-1]}->{new.rsplit('#', 1)[-1]}"
+
+    def apply(self, pattern, context):
+        if context.iri(pattern.predicate) != self.old:
+            return None
+        return TriplePattern(pattern.subject, context.term(self.new), pattern.object)
+
+
+class InvertDirection(Rule):
+    """
+    Property written with subject and object swapped: fires when an end
+    looks like the other end's role and neither end looks like its own
+    """
+
+    def __init__(self, predicate: str, subject: Role, obj: Role):
+        self.predicate = predicate
+        self.subject = subject
+        self.object = obj
+        self.name = f"invert:{predicate.rsplit('#', 1)[-1]}"
+
+    def apply(self, pattern, context):
+        if context.iri(pattern.predicate) != self.predicate:
+            return None
+        swapped = self.object.matches(pattern.subject, context) or self.subject.matches(pattern.object, context)
+        in_place = self.subject.matches(pattern.subject, context) or self.object.matches(pattern.object, context)
+        if not swapped or in_place:
+            return None
+        return TriplePattern(pattern.object, pattern.predicate, pattern.subject)
+
+
+class ClassAsPredicate(Rule):
+    """Class used as a predicate (?p horses:Horse ?h) -> the property linking to it"""
+
+    def __init__(self, class_iri: str, predicate: str):
+        self.class_iri = class_iri
+        self.predicate = predicate
+        self.name = f"class-as-predicate:{class_iri.rsplit('#', 1)[-1]}->{predicate.rsplit('#', 1)[-1]}"
+
+    def apply(self, pattern, context):
+        if context.iri(pattern.predicate) != self.class_iri:
+            return None
+        return TriplePattern(pattern.subject, context.term(self.predicate), pattern.object)
+
+
+class TypeSubjectObjectSwapped(Rule):
+    """
+    Class a ?x (class in subject position) -> ?x a Class, when ?x is used
+    elsewhere as an instance
+    """
+
+    name = "type-position"
+
+    def apply(self, pattern, context):
+        if context.iri(pattern.predicate) != RDF_TYPE:
+            return None
+        if pattern.subject[0].kind not in (IRI, PNAME) or pattern.object[0].kind != VAR:
+            return None
+        if pattern.object[0].value[1:] not in context.subjects:
+            return None
+        return TriplePattern(pattern.object, pattern.predicate, pattern.subject)
+
+
+_HORSE = Role(H + "Horse", "horse", "cheval", "chevaux")
+_RIDER = Role(H + "Rider", "rider", "cavalier")
+_SENSOR = Role(H + "InertialSensors", "sensor", "capteur", "imu")
+
+# Mistakes the SPARQL LLM keeps making against the V2 data
+DEFAULT_RULES: List[Rule] = [
+    RenameProperty(H + "hasDate", H + "eventDate"),
+    RenameProperty(H + "hasLocation", H + "eventLocation"),
+    RenameProperty(H + "hasRanking", H + "rank"),
+    ClassAsPredicate(H + "Horse", H + "hasHorse"),
+    ClassAsPredicate(H + "Rider", H + "hasRider"),
+    TypeSubjectObjectSwapped(),
+    InvertDirection(H + "AssociatedWith", subject=_RIDER, obj=_HORSE),
+    InvertDirection(H + "isAttachedTo", subject=_SENSOR, obj=_HORSE),
+]
+
+
+class SPARQLRewriter:
+    """Apply rewrite rules to every triple pattern of a query"""
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        """
+        Args:
+            rules: Rules tried in order on each pattern (default: DEFAULT_RULES)
+        """
+        self.rules = rules if rules is not None else DEFAULT_RULES
+
+    def rewrite(self, sparql_query: str) -> RewriteResult:
+        """
+        Rewrite a query
+
+        Args:
+            sparql_query: SPARQL query string
+
+        Returns:
+            RewriteResult(sparql_query, fired): the query (unchanged text if no
+            rule fired or it cannot be parsed) and the names of the rules
+            that fired, in order
+        """
+        try:
+            query = parse_query(sparql_query)
+        except SPARQLSyntaxError:
+            return RewriteResult(sparql_query, [])
+
+        fired: List[str] = []
+        context = RuleContext(query)
+        for group in iter_groups(query.where):
+            for i, element in enumerate(group.elements):
+                if not isinstance(element, TriplePattern):
+                    continue
+                for rule in self.rules:
+                    rewritten = rule.apply(element, context)
+                    if rewritten is None:
+                        continue
+                    element = group.elements[i] = rewritten
+                    fired.append(rule.name)
+                    context = RuleContext(query)  # Types may have changed
+
+        if not fired:
+            return RewriteResult(sparql_query, [])
+        return RewriteResult(query.to_string(), fired)
+
+
+if __name__ == "__main__":
+    import sys
+
+    text = open(sys.argv[1], encoding="utf-8").read() if len(sys.argv) > 1 else sys.stdin.read()
+    result = SPARQLRewriter().rewrite(text)
+    print(result.sparql_query)
+    print(f"\nRègles appliquées: {', '.join(result.fired) if result.fired else 'aucune'}")
@@ -0,0 +1,142 @@
+# sparql_tokenizer.py
+"""
+SPARQL Tokenizer - Lexical analysis of SPARQL queries
+Shared by the query cache, pagination and rewriting layers
+"""
+
+import re
+from collections import namedtuple
+from typing import Dict, List, Tuple
+
+# start = offset of the token in the original query text (-1 for synthesized tokens)
+Token = namedtuple("Token", ["kind", "value", "start"], defaults=(-1,))
+
+# Token kinds
+IRI = "IRI"
+PNAME = "PNAME"
+VAR = "VAR"
+STRING = "STRING"
+LANGTAG = "LANGTAG"
+NUMBER = "NUMBER"
+NAME = "NAME"
+PUNCT = "PUNCT"
+
+_TOKEN_SPEC = [
+    ("WS", r"\s+"),
+    ("COMMENT", r"#[^\n]*"),
+    (IRI, r"<[^<>\"{}|^`\\\s]*>"),
+    (STRING, r'"""(?:[^"\\]|\\.|"(?!""))*"""|\'\'\'(?:[^\'\\]|\\.|\'(?!\'\'))*\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\''),
+    (VAR, r"[?$][A-Za-z0-9_À-￿]+"),
+    (LANGTAG, r"@[A-Za-z]+(?:-[A-Za-z0-9]+)*"),
+    (NUMBER, r"[0-9]+(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|\.[0-9]+(?:[eE][+-]?[0-9]+)?"),
+    (PNAME, r"(?:[A-Za-zÀ-￿][\w\-.À-￿]*)?:(?:[\wÀ-￿%](?:[\w\-.:%À-￿]*[\w\-:%À-￿])?)?"),
+    ("BNODE", r"_:[\wÀ-￿][\w\-.À-￿]*"),
+    (NAME, r"[A-Za-z_][A-Za-z0-9_]*"),
+    (PUNCT, r"\^\^|&&|\|\||!=|<=|>=|[{}()\[\].,;=<>!+\-*/|^?]"),  # Lone "?" = zero-or-one path modifier
+]
+
+_TOKEN_RE = re.compile("|".join(f"(?P<{kind}>{pattern})" for kind, pattern in _TOKEN_SPEC))
+
+
+class SPARQLSyntaxError(ValueError):
+    """Raised when a query cannot be tokenized or parsed"""
+
+
+def tokenize(sparql_query: str) -> List[Token]:
+    """
+    Split a SPARQL query into tokens (whitespace and comments dropped)
+
+    Args:
+        sparql_query: SPARQL query string
+
+    Returns:
+        List of Token(kind, value, start)
+    """
+    tokens = []
+    pos = 0
+    length = len(sparql_query)
+    while pos < length:
+        match = _TOKEN_RE.match(sparql_query, pos)
+        if not match:
+            raise SPARQLSyntaxError(
+                f"Caractère inattendu à la position {pos}: {sparql_query[pos:pos + 20]!r}"
+            )
+        kind = match.lastgroup
+        if kind == "BNODE":
+            kind = PNAME
+        if kind not in ("WS", "COMMENT"):
+            tokens.append(Token(kind, match.group(), pos))
+        pos = match.end()
+    return tokens
+
+
+def is_keyword(token: Token, *keywords: str) -> bool:
+    """Case-insensitive keyword test"""
+    return token.kind == NAME and token.value.upper() in keywords
+
+
+def serialize(tokens: List[Token]) -> str:
+    """Join tokens back into a single-line query string"""
+    return " ".join(token.value for token in tokens)
+
+
+def split_prologue(tokens: List[Token]) -> Tuple[List[Tuple[str, str]], str, List[Token]]:
+    """
+    Separate PREFIX / BASE declarations from the query body
+
+    Args:
+        tokens: Tokens of a full query
+
+    Returns:
+        (prefixes as (pname, iri) pairs, base IRI or "", body tokens)
+    """
+    prefixes = []
+    base = ""
+    i = 0
+    while i < len(tokens):
+        if is_keyword(tokens[i], "PREFIX") and i + 2 < len(tokens):
+            prefixes.append((tokens[i + 1].value, tokens[i + 2].value))
+            i += 3
+        elif is_keyword(tokens[i], "BASE") and i + 1 < len(tokens):
+            base = tokens[i + 1].value
+            i += 2
+        else:
+            break
+    return prefixes, base, tokens[i:]
+
+
+def normalize_query(sparql_query: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Canonical form of a query, for use as a cache key
+
+    Whitespace and comments are dropped, keywords upper-cased, PREFIX
+    declarations sorted and variables renamed (?v0, ?v1, ...) in order of
+    first appearance.
+
+    Args:
+        sparql_query: SPARQL query string
+
+    Returns:
+        (normalized query, mapping original variable name -> canonical name)
+    """
+    prefixes, base, body = split_prologue(tokenize(sparql_query))
+
+    variables: Dict[str, str] = {}
+    parts = []
+    if base:
+        parts.append(f"BASE {base}")
+    for pname, iri in sorted(set(prefixes)):
+        parts.append(f"PREFIX {pname} {iri}")
+
+    for token in body:
+        if token.kind == VAR:
+            name = token.value[1:]
+            if name not in variables:
+                variables[name] = f"v{len(variables)}"
+            parts.append("?" + variables[name])
+        elif token.kind == NAME and token.value != "a":
+            parts.append(token.value.upper())
+        else:
+            parts.append(token.value)
+
+    return " ".join(parts), variables
@@ -0,0 +1,446 @@
+# template_router.py
+"""
+Template Router - Answer common question shapes without the SPARQL LLM
+A question is linked to one entity of the graph (an individual such as
+Dakota or Event_SJ_01, a subclass such as "garrot" / "phase de
+préparation", or a class such as "chevaux") and classified by keyword cues
+into a parameterized query; below the confidence threshold the LLM
+generates the query as before
+"""
+
+import difflib
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Tuple
+from config import ONTOLOGY_NAMESPACE, ROUTER_CONFIDENCE_THRESHOLD, ENABLE_AGGREGATION_PUSHDOWN
+from aggregation_rewrite import push_down_aggregation
+from graph_scope import OWL_NS
+from query_validator import get_vocabulary
+
+H = ONTOLOGY_NAMESPACE
+
+# Entity tiers, from the most to the least specific
+INSTANCE = "instance"  # Horse1 ("Dakota"), Event_SJ_01, Rider_Emma ("Emma")
+SUBCLASS = "subclass"  # Withers ("garrot"), PreparationStage ("phase de préparation")
+CLASS = "class"        # Horse ("chevaux"), InertialSensors ("capteurs")
+
+Link = namedtuple("Link", ["iri", "classes", "tier", "surface", "score"])
+Route = namedtuple("Route", ["template", "link", "confidence", "query_result"])
+
+# name, class of the subject, cues (all required, folded text), patterns ({s} = subject), projected variables
+Template = namedtuple("Template", ["name", "subject_class", "cues", "patterns", "projection"])
+
+_FUZZY_CUTOFF = 0.85
+# Questions that need several lookups combined: left to the LLM
+_COMPLEX_RE = re.compile(r"\b(compar\w*|difference\w*|analyse|complete|versus|vs|et (de|du|des|la|le|l)\b)")
+# Value constraints a class-level template cannot express: comparisons, negations and numbers
+_CONSTRAINT_RE = re.compile(
+    r"\b(superieur\w*|inferieur\w*|plus (de|d|que)|moins (de|d|que)|au dessus|en dessous|entre|avant|apres|"
+    r"depuis|jusqu\w*|ne|n|pas|sans|aucun\w*|jamais|sauf|hormis|excepte\w*|non)\b|\d"
+)
+_SUPERLATIVE_RE = re.compile(r"\b(le|la|les) (plus|moins) \w+|\b(max\w*|min\w*|meilleur\w*|pire)\b")
+# Words that do not restrict which instances are meant
+_FILLER = frozenset("""
+    a au aux avec c ce ces cet cette d dans de des du elle elles en est et il ils l la le les leur leurs
+    me moi on ont par pour qu que quel quelle quelles quels qui quoi s sa se ses son sont sur t un une y
+    tous toutes tout toute chaque differents differentes existe existent existants enregistre enregistres
+    enregistrees disponible disponibles systeme base graphe ontologie donnees liste donne dis connais
+    phase phases etape etapes pendant durant lors seance seances imu place places situe situes attache attaches
+    combien nombre humain humains sportif sportifs sportive sportives
+""".split())
+
+# Subclasses named by common words (their instances are the subject)
+SUBCLASS_ALIASES = {
+    "garrot": H + "Withers",
+    "sternum": H + "Sternum",
+    "canon anterieur": H + "CanonOfForelimb",
+    "canon posterieur": H + "CanonOfHindlimb",
+    "preparation": H + "PreparationStage",
+    "pre competition": H + "PreCompetitionStage",
+    "precompetition": H + "PreCompetitionStage",
+    "competition": H + "CompetitionStage",
+    "transition": H + "TransitionStage",
+    "saut d obstacles": H + "ShowJumping",
+    "dressage": H + "Dressage",
+}
+# Classes named by common words (every instance is the subject)
+CLASS_ALIASES = {
+    "cheval": H + "Horse", "chevaux": H + "Horse",
+    "cavalier": H + "Rider", "cavaliers": H + "Rider", "cavaliere": H + "Rider",
+    "capteur": H + "InertialSensors", "capteurs": H + "InertialSensors",
+    "evenement": H + "SportingEvent", "evenements": H + "SportingEvent",
+    "veterinaire": H + "Veterinarian", "veterinaires": H + "Veterinarian",
+    "soigneur": H + "Caretaker", "soigneurs": H + "Caretaker", "soigneuse": H + "Caretaker",
+    "entrainement": H + "Training", "entrainements": H + "Training",
+    "saison": H + "CompetitiveSeason", "saisons": H + "CompetitiveSeason",
+}
+
+_NOT_POSITION = f"FILTER(?position NOT IN (horses:InertialSensors, <{OWL_NS}NamedIndividual>))"
+
+
+def _attribute(name: str, cls: str, cue: str, prop: str) -> Template:
+    return Template(name, H + cls, (cue,), [f"{{s}} horses:{prop} ?value ."], ["?value"])
+
+
+TEMPLATES: List[Template] = [
+    # Attributes
+    _attribute("horse-race", "Horse", r"\brace\b", "hasRace"),
+    _attribute("horse-robe", "Horse", r"\b(robe|couleur)\b", "hasRobe"),
+    _attribute("horse-puce", "Horse", r"\bpuce\b", "hasPuce"),
+    _attribute("horse-height", "Horse", r"\b(taille|hauteur)\b", "hasHeight"),
+    _attribute("horse-name", "Horse", r"\b(nom|noms|appelle\w*)\b", "hasName"),
+    _attribute("event-date", "SportingEvent", r"\b(date|quand)\b", "eventDate"),
+    _attribute("event-location", "SportingEvent", r"\b(ou|lieu|deroule\w*)\b", "eventLocation"),
+    _attribute("event-category", "SportingEvent", r"\b(categorie|niveau)\b", "category"),
+    _attribute("training-frequency", "Training", r"\bfrequence\b", "Frequency"),
+    _attribute("training-intensity", "Training", r"\bintensite\b", "Intensity"),
+    _attribute("training-volume", "Training", r"\b(duree|volume)\b", "Volume"),
+    _attribute("sensor-frequency", "InertialSensors", r"\b(frequence|echantillonnage)\b", "hasSensorTime"),
+    _attribute("sensor-id", "InertialSensors", r"\b(identifiant\w*|id)\b", "hasSensorID"),
+    _attribute("sensor-format", "InertialSensors", r"\bformat\b", "hasFormat"),
+    Template(
+        "season-period", H + "CompetitiveSeason", (r"\b(periode|debut|fin|quand|dates?)\b",),
+        ["{s} horses:seasonStart ?start .", "{s} horses:seasonEnd ?end ."], ["?start", "?end"]
+    ),
+    # Relations
+    Template("horse-riders", H + "Horse", (r"\bcavalier\w*",), ["?rider horses:AssociatedWith {s} ."], ["?rider"]),
+    Template(
+        "horse-events", H + "Horse", (r"\b(evenement\w*|competition\w*|participe\w*)",),
+        ["{s} horses:CompetesIn ?event ."], ["?event"]
+    ),
+    Template(
+        "horse-trainings", H + "Horse", (r"\b(entrainement\w*|etapes?)\b",),
+        ["{s} horses:TrainsIn ?training ."], ["?training"]
+    ),
+    Template("horse-sensors", H + "Horse", (r"\bcapteur\w*",), ["?sensor horses:isAttachedTo {s} ."], ["?sensor"]),
+    Template(
+        "horse-sensor-positions", H + "Horse", (r"\bcapteur\w*", r"\bposition\w*"),
+        ["?sensor horses:isAttachedTo {s} .", "?sensor a ?position .", _NOT_POSITION], ["?sensor", "?position"]
+    ),
+    Template("rider-horses", H + "Rider", (r"\bcheva(l|ux)\b",), ["{s} horses:AssociatedWith ?horse ."], ["?horse"]),
+    Template(
+        "training-actors", H + "Training", (r"\b(acteurs?|qui|implique\w*|participe\w*)\b",),
+        ["{s} horses:involvesActor ?actor .", "OPTIONAL { ?actor a ?role . FILTER(?role != <" + OWL_NS + "NamedIndividual>) }"],
+        ["?actor", "?role"]
+    ),
+    Template(
+        "training-event", H + "Training", (r"\b(evenement\w*|depend\w*)",),
+        ["{s} horses:dependsOn ?event ."], ["?event"]
+    ),
+    Template("event-season", H + "SportingEvent", (r"\bsaison\b",), ["{s} horses:inSeason ?season ."], ["?season"]),
+    Template(
+        "season-events", H + "CompetitiveSeason", (r"\bevenement\w*",),
+        ["?event horses:inSeason {s} ."], ["?event"]
+    ),
+    Template(
+        "sensor-objective", H + "InertialSensors", (r"\bobjecti\w*|\butilise\w* pour\b",),
+        ["{s} horses:isUsedFor ?objective ."], ["?objective"]
+    ),
+    Template("sensor-horse", H + "InertialSensors", (r"\bcheva(l|ux)\b",), ["{s} horses:isAttachedTo ?horse ."], ["?horse"]),
+    Template(
+        "sensor-position", H + "InertialSensors", (r"\bposition\w*",),
+        ["{s} a ?position .", _NOT_POSITION], ["?position"]
+    ),
+]
+
+# Class / subclass subjects only: "Combien de cavaliers ..." lists the instances, aggregation_rewrite counts them
+COUNT_TEMPLATE = Template("count", None, (r"\b(combien|nombre)\b",), [], [])
+
+
+def fold(text: str) -> str:
+    """Lowercase, no accents, words separated by single spaces"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def _split_camel(name: str) -> str:
+    return re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name)
+
+
+def _aliases(local_name: str, labels: List[str]) -> List[str]:
+    """Ways a question may name an individual"""
+    aliases = {fold(local_name), fold(_split_camel(local_name))}
+    aliases.update(fold(label) for label in labels)
+    parts = local_name.split("_")
+    if len(parts) == 2 and parts[1].isalpha():
+        # Rider_Emma -> "emma", Vet_DrMartin -> "dr martin", "martin"
+        aliases.add(fold(_split_camel(parts[1])))
+        aliases.add(fold(_split_camel(parts[1])).split()[-1])
+    return [alias for alias in aliases if len(alias) >= 3]
+
+
+class EntityIndex:
+    """Individuals of the ontology namespace with their classes and aliases"""
+
+    def __init__(self, client):
+        """
+        Args:
+            client: GraphDB client (or embedded store) the individuals are read from
+        """
+        self.client = client
+        self.entities: Dict[str, Tuple[set, List[str]]] = {}  # IRI -> (classes, aliases)
+        self.aliases: Dict[str, str] = {}                    # alias -> IRI
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the individuals (one query)
+
+        Raises:
+            BackendUnavailableError: GraphDB unreachable
+        """
+        result = self.client.query(f"""
+            PREFIX horses: <{H}>
+            SELECT ?s ?type ?label WHERE {{
+                ?s a ?type .
+                FILTER(STRSTARTS(STR(?s), "{H}"))
+                FILTER(?type != <{OWL_NS}Class> && ?type != <{OWL_NS}ObjectProperty> && ?type != <{OWL_NS}DatatypeProperty>)
+                OPTIONAL {{ ?s horses:hasName|horses:seasonName ?label }}
+            }}
+        """)
+        entities: Dict[str, Tuple[set, set]] = {}
+        for binding in result.get("results", {}).get("bindings", []):
+            classes, labels = entities.setdefault(binding["s"]["value"], (set(), set()))
+            classes.add(binding["type"]["value"])
+            if "label" in binding:
+                labels.add(binding["label"]["value"])
+
+        vocabulary = get_vocabulary()
+        with self._lock:
+            self.entities = {}
+            self.aliases = {}
+            for iri, (classes, labels) in entities.items():
+                if iri in vocabulary.classes:
+                    continue
+                aliases = _aliases(iri[len(H):], sorted(labels))
+                self.entities[iri] = (classes, aliases)
+                for alias in aliases:
+                    # An alias shared by two individuals names neither
+                    self.aliases[alias] = None if alias in self.aliases and self.aliases[alias] != iri else iri
+            self.loaded = True
+
+    def link(self, text: str) -> List[Link]:
+        """
+        Individuals named in a folded question (longest aliases first, each
+        word used once; near misses such as "Dakotta" score below 1)
+        """
+        if not self.loaded:
+            self.load()
+        links: Dict[str, Link] = {}
+        padded = f" {text} "
+        for alias in sorted(self.aliases, key=len, reverse=True):
+            iri = self.aliases[alias]
+            if iri is not None and f" {alias} " in padded:
+                padded = padded.replace(f" {alias} ", " _ ")
+                links.setdefault(iri, Link(iri, self.entities[iri][0], INSTANCE, alias, 1.0))
+
+        if not links:
+            words = [word for word in padded.split() if len(word) >= 4]
+            for word in words:
+                match = difflib.get_close_matches(word, [a for a in self.aliases if " " not in a], n=1, cutoff=_FUZZY_CUTOFF)
+                if match and self.aliases[match[0]] is not None:
+                    iri = self.aliases[match[0]]
+                    score = difflib.SequenceMatcher(None, word, match[0]).ratio()
+                    links.setdefault(iri, Link(iri, self.entities[iri][0], INSTANCE, word, score))
+        return list(links.values())
+
+
+def _link_words(text: str, aliases: Dict[str, str], tier: str) -> List[Link]:
+    links: Dict[str, Link] = {}
+    padded = f" {text} "
+    for alias in sorted(aliases, key=len, reverse=True):
+        if f" {alias} " in padded:
+            padded = padded.replace(f" {alias} ", " _ ")
+            links.setdefault(aliases[alias], Link(aliases[alias], {aliases[alias]}, tier, alias, 1.0))
+    return list(links.values())
+
+
+def link_entities(index: EntityIndex, text: str) -> List[Link]:
+    """Every entity named in a folded question: individuals, subclasses and classes"""
+    return (
+        index.link(text)
+        + _link_words(text, SUBCLASS_ALIASES, SUBCLASS)
+        + _link_words(text, CLASS_ALIASES, CLASS)
+    )
+
+
+class TemplateRouter:
+    """Route questions to parameterized queries, or decline"""
+
+    def __init__(self, client, threshold: float = ROUTER_CONFIDENCE_THRESHOLD, templates: Optional[List[Template]] = None):
+        """
+        Args:
+            client: GraphDB client used to read the individuals
+            threshold: Minimum confidence to skip the LLM
+            templates: Templates (default: TEMPLATES)
+        """
+        self.index = EntityIndex(client)
+        self.threshold = threshold
+        self.templates = templates if templates is not None else TEMPLATES
+        self.vocabulary = get_vocabulary()
+        self._lock = threading.Lock()
+        self._stats = {"questions": 0, "hits": 0}
+        self._by_template: Dict[str, int] = {}
+
+    def classify(self, question: str) -> Optional[Route]:
+        """
+        Best template for a question, whatever its confidence
+
+        Args:
+            question: Question in natural language
+
+        Returns:
+            Route(template, link, confidence, query_result), or None when no
+            template applies
+        """
+        text = fold(question)
+
+        # The most specific tier naming exactly one entity is the subject
+        candidates = None
+        for links in (
+            self.index.link(text),
+            _link_words(text, SUBCLASS_ALIASES, SUBCLASS),
+            _link_words(text, CLASS_ALIASES, CLASS)
+        ):
+            if links:
+                candidates = links
+                break
+        if not candidates or len(candidates) > 1:
+            return None  # No entity, or several to combine
+        link = candidates[0]
+
+        matches = [
+            template for template in self.templates
+            if self._is_a(link, template.subject_class) and all(re.search(cue, text) for cue in template.cues)
+        ]
+        if not matches and link.tier != INSTANCE and re.search(COUNT_TEMPLATE.cues[0], text):
+            matches = [COUNT_TEMPLATE]
+        if not matches:
+            return None
+
+        # More cues = more specific; a tie between different shapes is ambiguous
+        best = max(len(template.cues) for template in matches)
+        matches = [template for template in matches if len(template.cues) == best]
+        confidence = link.score
+        if len(matches) > 1:
+            confidence *= 0.5
+        if _COMPLEX_RE.search(text):
+            confidence *= 0.5
+        template = matches[0]
+        query_result = self._build(question, template, link)
+        if link.tier != INSTANCE and self._constrained(text, link, template, query_result):
+            confidence = 0.0  # The template would return every instance of the class
+        return Route(template, link, round(confidence, 3), query_result)
+
+    def route(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Query for a question when a template matches confidently
+
+        Args:
+            question: Question in natural language
+
+        Returns:
+            Dict shaped like IntelligentSPARQLGenerator.generate_sparql (plus
+            template and confidence), or None to use the LLM
+        """
+        try:
+            routed = self.classify(question)
+        except Exception as e:
+            print(f"Routage par modèle ignoré: {e}")
+            routed = None
+
+        hit = routed is not None and routed.confidence >= self.threshold
+        with self._lock:
+            self._stats["questions"] += 1
+            if hit:
+                self._stats["hits"] += 1
+                self._by_template[routed.template.name] = self._by_template.get(routed.template.name, 0) + 1
+        return routed.query_result if hit else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate (questions answered without the SPARQL LLM) and hits per template"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["by_template"] = dict(self._by_template)
+        stats["hit_rate"] = round(stats["hits"] / stats["questions"], 3) if stats["questions"] else 0.0
+        return stats
+
+    @staticmethod
+    def _constrained(text: str, link: Link, template: Template, query_result: Dict[str, Any]) -> bool:
+        """
+        Does a class-level question restrict the instances beyond what the
+        template expresses ("chevaux de race Selle Français", "événements à
+        Fontainebleau", "taille supérieure à 165 cm", "n'ont pas ...")
+        """
+        if _CONSTRAINT_RE.search(text):
+            return True
+        if _SUPERLATIVE_RE.search(text) and query_result.get("aggregation_rewrite") is None:
+            return True  # Ranking asked for but not pushed down: the rows would be unranked
+        rest = f" {_SUPERLATIVE_RE.sub(' ', text)} ".replace(f" {link.surface} ", " ")
+        for cue in template.cues:
+            rest = re.sub(cue, " ", rest)
+        return any(word not in _FILLER and word not in CLASS_ALIASES for word in rest.split())
+
+    def _is_a(self, link: Link, cls: Optional[str]) -> bool:
+        return cls is not None and any(self.vocabulary.is_subclass(c, cls) for c in link.classes)
+
+    def _build(self, question: str, template: Template, link: Link) -> Dict[str, Any]:
+        if link.tier == INSTANCE:
+            subject = f"<{link.iri}>"
+            patterns = []
+            projection = list(template.projection)
+        else:
+            subject = "?subject"
+            # No reasoning assumed: instances of the subclasses are listed too
+            classes = sorted(c for c in self.vocabulary.classes if self.vocabulary.is_subclass(c, link.iri))
+            if len(classes) > 1:
+                patterns = ["?subject a ?class .", f"VALUES ?class {{ {' '.join(f'<{c}>' for c in classes)} }}"]
+            else:
+                patterns = [f"?subject a <{link.iri}> ."]
+            projection = ["?subject"] + list(template.projection)
+        patterns += [pattern.replace("{s}", subject) for pattern in template.patterns]
+
+        body = "\n  ".join(patterns)
+        sparql_query = f"PREFIX horses: <{H}>\n\nSELECT DISTINCT {' '.join(projection)}\nWHERE {{\n  {body}\n}}"
+        result = {
+            "sparql_query": sparql_query,
+            "entities_used": [link.iri[len(H):] if link.iri.startswith(H) else link.iri],
+            "relations_used": re.findall(r"horses:(\w+)", body),
+            "explanation": f"Modèle de requête '{template.name}' ({link.surface})",
+            "template": template.name
+        }
+        if ENABLE_AGGREGATION_PUSHDOWN:
+            sparql_query, rewrite = push_down_aggregation(question, sparql_query)
+            if rewrite:
+                result["sparql_query"] = sparql_query
+                result["aggregation_rewrite"] = rewrite
+        return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from graphdb_client import get_graphdb_client
+
+    parser = argparse.ArgumentParser(description="Teste le routage des questions vers les modèles de requêtes")
+    parser.add_argument('questions', nargs='*', help="Questions (défaut: jeu de test de l'évaluation)")
+    args = parser.parse_args()
+
+    questions = args.questions
+    if not questions:
+        with open("evaluation/test_dataset.json", encoding="utf-8") as f:
+            questions = [item["question"] for item in json.load(f)["test_questions"]]
+
+    router = TemplateRouter(get_graphdb_client())
+    for question in questions:
+        routed = router.classify(question)
+        if routed is None:
+            print(f"  LLM          {question}")
+        else:
+            hit = "modèle" if routed.confidence >= router.threshold else "LLM"
+            print(f"  {hit:<6} {routed.confidence:.2f}  {question}  -> {routed.template.name}")
+    print(f"\nTaux de routage: {sum(1 for q in questions if router.route(q))}/{len(questions)}")